@@ -1,9 +1,13 @@
 
 from langchain_ollama import OllamaLLM # importing the LLM
 from langchain_core.prompts import ChatPromptTemplate # importing prompt template
-from vector import retriever # importing the retriever we created
+from vector import retriever, reranker, review_filter # importing the retriever we created (and its re-ranking / filtering stages)
+from agent_utils.streaming import LatencyStats, stream_chain # (importable once vector.py has added Scripts/ to the path)
+from agent_utils.cassettes import with_cassette # LLM_CASSETTE_MODE=record / replay (see agent_utils/cassettes.py)
+import os
+import time
 
-model = OllamaLLM(model="llama3.2")
+model = with_cassette(OllamaLLM(model="llama3.2")) # unchanged unless LLM_CASSETTE_MODE is set
 
 template = """
     You are an expert in answering questions about a pizza restaurant.
@@ -14,11 +18,26 @@ template = """
 prompt = ChatPromptTemplate.from_template(template)
 chain = prompt | model # forming the chain (pipeline)
 
+# the answer is printed token by token as Ollama generates it; set STREAMING=0 to print it only once it is complete
+streaming = os.getenv("STREAMING", "1") != "0"
+latency = LatencyStats() # time-to-first-token and total latency of every answer
+
 while True:
     question = input("Ask a question about the pizza restaurant (q to quit): ")
     if question.lower() == 'q':
+        print(f"Retrieval cache: {retriever.stats()}") # hit rate and latency saved by the retrieval cache
+        print(f"Latency: {latency.summary()}")
+        print(f"Metadata filter: {review_filter.stats()}") # questions with rating / date constraints and their latency
+        if reranker is not None:
+            print(f"Re-ranking: {reranker.stats()}") # reviews / tokens per question and re-ranking latency
         break
     reviews = retriever.invoke(question) # passing the question to the retriever to get relevant reviews for the LLM to use
 
-    result = chain.invoke({"reviews": reviews, "question": question}) # passing the reviews retrieved and question to the LLM
-    print("\n" + result)
+    if streaming:
+        result = stream_chain(chain, {"reviews": reviews, "question": question}, latency) # passing the reviews retrieved and question to the LLM
+    else:
+        start = time.perf_counter()
+        result = chain.invoke({"reviews": reviews, "question": question}) # passing the reviews retrieved and question to the LLM
+        print("\n" + result)
+        elapsed = time.perf_counter() - start
+        latency.record(elapsed, elapsed) # nothing is shown before the whole answer has arrived
@@ -1,40 +1,167 @@
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma # importing Chroma vector store
 from langchain_core.documents import Document
+from concurrent.futures import ThreadPoolExecutor # for embedding several batches at once
+from collections import deque
+import hashlib
+import json
 import os
+import sys
+import time
 import pandas as pd
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.bm25 import BM25Index, HybridRetriever
+from agent_utils.embedding_cache import CachedEmbeddings
+from agent_utils.ingestion import RowManifest
+from agent_utils.metadata_filter import FilteredRetriever, MetadataIndex, parse_constraints
+from agent_utils.rerank import RerankingRetriever
+from agent_utils.retrieval_cache import CachedRetriever, file_version
+from agent_utils.vector_backends import open_dense_store
+
 csv_path = os.path.join(script_dir, "realistic_restaurant_reviews.csv")
-df = pd.read_csv(csv_path) # loading the dataset
-embeddings = OllamaEmbeddings(model="mxbai-embed-large") # loading the embedding model
+embedding_model = "mxbai-embed-large"
+# loading the embedding model, wrapped in an on-disk cache so that text embedded before is never sent to Ollama again
+embeddings = CachedEmbeddings(OllamaEmbeddings(model=embedding_model), model_name=embedding_model)
 
 db_location = os.path.join(script_dir, "chroma_langchain_db") # location to store the vector database
-add_documents = not os.path.exists(db_location) # checking if the DB already exists
-
-if add_documents: # if it doesn't exist, we need to add the documents from the dataframe we made
-    documents = []
-    ids = []
-    for i, row in df.iterrows(): # iterating through the dataframe rows
-        document = Document(
-            page_content = row["Title"] + "" + row["Review"], # format of the data in the document we're making
-            metadata = {"rating": row["Rating"], "date": row["Date"]},
-            id = str(i) # unique id for each document
-        )
-        ids.append(str(i)) # adding the id to the list of ids
-        documents.append(document)
+manifest_path = os.path.join(db_location, "review_rows.sqlite") # per-row content hashes of what is already embedded
+keyword_index_path = os.path.join(db_location, "restaurant_reviews_bm25.pkl") # BM25 keyword index over the same reviews
+
+# streaming ingestion settings
+csv_chunk_rows = 10_000 # rows read from the CSV at a time (the whole file is never held in memory)
+batch_size = 64 # documents embedded and written to Chroma per batch
+max_workers = 4 # concurrent embedding requests sent to Ollama
+
+# store used for the dense search: "chroma" (default) or "ivf" (in-process ANN index, no Chroma call per query)
+vector_backend = os.getenv("VECTOR_BACKEND", "chroma")
+# "int8" or "float16": the dense search runs over compressed vectors in RAM, re-scored exactly from the full vectors on disk
+compressed_vectors = os.getenv("COMPRESSED_VECTORS", "")
+# re-ranking: 20 candidates are re-scored by a cross-encoder and only the relevant, non-redundant ones (at most 5) are kept.
+# Set RERANK=0 to always return the top 5 of the hybrid search instead.
+rerank = os.getenv("RERANK", "1") != "0"
 
 vector_store = Chroma(
     collection_name="restaurant_reviews",
     persist_directory=db_location,
     embedding_function=embeddings
 )
+keyword_index = BM25Index.load_or_build(keyword_index_path, vector_store) # loads in milliseconds once it has been saved
 
-if add_documents:
-    vector_store.add_documents(documents=documents, ids=ids) 
-    # if it doesn't exist already, add the documents to the vector store, passing the related docs and ids
 
-retriever = vector_store.as_retriever(
-    search_kwargs={"k": 5} # setting the number of documents to retrieve
+def review_key(row) -> str:
+    """ Stable ID of a review, derived from its title, date and text: inserting or deleting rows elsewhere in the CSV
+    does not change it (unlike the row number), so unrelated rows are never re-embedded. """
+    return hashlib.sha256(f"{row['Title']}\0{row['Date']}\0{row['Review']}".encode("utf-8")).hexdigest()[:24]
+
+
+def row_to_document(row_id: str, row) -> tuple[Document, str]:
+    """ Turns one CSV row into a Document and the hash of everything stored for it. """
+    document = Document(
+        page_content = row["Title"] + "" + row["Review"], # format of the data in the document we're making
+        metadata = {"rating": row["Rating"], "date": row["Date"]},
+        id = row_id # unique id for each document
     )
-    
\ No newline at end of file
+    digest = hashlib.sha256(f"{document.page_content}\0{row['Rating']}\0{row['Date']}".encode("utf-8")).hexdigest()
+    return document, digest
+
+
+def sync_reviews():
+    """ Streams the CSV into the vector store, only embedding rows that were added or changed since the last run,
+    and deleting rows that disappeared from the CSV. """
+    manifest = RowManifest(manifest_path, {"embedding_model": embedding_model})
+    start = time.perf_counter()
+    counts = {"rows": 0, "upserted": 0, "unchanged": 0, "deleted": 0}
+    in_flight = deque() # (future, documents, ids, hashes) of batches being embedded and written
+
+    def finish_oldest():
+        future, documents, ids, hashes = in_flight.popleft()
+        future.result() # re-raises any error from the worker thread
+        keyword_index.add_documents(documents, ids)
+        manifest.mark(ids, hashes) # rows count as ingested only once Chroma has them
+        counts["upserted"] += len(ids)
+
+    occurrences = {} # review key -> times seen so far, so exact duplicate rows get IDs of their own ("<key>:1", ...)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for df in pd.read_csv(csv_path, chunksize=csv_chunk_rows): # loading the dataset chunk by chunk
+            documents, hashes = [], []
+            for _, row in df.iterrows(): # iterating through the rows of this chunk
+                key = review_key(row)
+                seen = occurrences.get(key, 0)
+                occurrences[key] = seen + 1
+                document, digest = row_to_document(f"{key}:{seen}" if seen else key, row)
+                documents.append(document)
+                hashes.append(digest)
+            counts["rows"] += len(df)
+
+            ids = [d.id for d in documents]
+            changed = manifest.changed(ids, hashes) # positions of new / edited rows
+            counts["unchanged"] += len(ids) - len(changed)
+
+            for start_pos in range(0, len(changed), batch_size):
+                batch = changed[start_pos:start_pos + batch_size]
+                batch_docs = [documents[p] for p in batch]
+                batch_ids = [ids[p] for p in batch]
+                # each worker embeds one batch and upserts it into Chroma (existing ids are overwritten, not duplicated)
+                future = pool.submit(vector_store.add_documents, documents=batch_docs, ids=batch_ids)
+                in_flight.append((future, batch_docs, batch_ids, [hashes[p] for p in batch]))
+                if len(in_flight) >= 2 * max_workers: # bounding the number of batches held in memory at once
+                    finish_oldest()
+
+        while in_flight:
+            finish_oldest()
+
+    deleted = manifest.unseen() # rows that are no longer in the CSV
+    for start_pos in range(0, len(deleted), batch_size * 16):
+        part = deleted[start_pos:start_pos + batch_size * 16]
+        vector_store.delete(ids=part)
+        keyword_index.remove(part)
+        manifest.forget(part)
+    counts["deleted"] = len(deleted)
+    embeddings.flush() # the last batches' new embeddings (fewer than flush_every) are journaled too
+    manifest.close()
+    counts["generation"] = manifest.generation # only changes when rows were written or deleted
+    if keyword_index.dirty:
+        keyword_index.save(keyword_index_path)
+
+    elapsed = time.perf_counter() - start
+    if counts["upserted"] or counts["deleted"]:
+        print(f"Review ingestion: {counts} in {elapsed:.1f}s ({counts['upserted'] / max(elapsed, 1e-9):.1f} rows embedded/s)")
+    return counts
+
+
+review_counts = sync_reviews() # cheap when nothing changed: the CSV is only hashed row by row
+
+# Chroma itself, or a snapshot of it (ANN index / compressed vectors) which is rebuilt only after the reviews actually changed
+dense_store = open_dense_store(vector_store, embeddings, os.path.join(db_location, "restaurant_reviews"),
+                               version=review_counts["generation"], backend=vector_backend, compressed=compressed_vectors)
+
+# dense + keyword (BM25) search fused together, so exact terms like dish names and dates are found as well
+search = HybridRetriever(
+    vector_store=dense_store,
+    keyword_index=keyword_index,
+    k=20 if rerank else 5 # setting the number of documents to retrieve (over-fetching candidates for the re-ranker)
+)
+# questions with a rating or date constraint ("what did 1-star reviewers say in March 2024") only search the matching reviews
+review_filter = FilteredRetriever(
+    retriever=search,
+    vector_store=dense_store, # the filtered dense search runs in the same backend as the unfiltered one
+    keyword_index=keyword_index,
+    metadata_index=MetadataIndex.from_keyword_index(keyword_index), # rating -> IDs and IDs sorted by date, built in memory
+    k=search.k
+)
+search = review_filter
+reranker = None
+if rerank:
+    reranker = RerankingRetriever(retriever=search, embeddings=embeddings, max_k=5)
+    search = reranker
+
+# repeated (or nearly identical) questions are answered from a cache, which is cleared whenever the reviews are re-ingested
+retriever = CachedRetriever(
+    retriever=search,
+    embeddings=embeddings,
+    version_fn=file_version(manifest_path),
+    # "1-star reviews about the pasta" and "5-star reviews about the pasta" embed almost identically but must not share results
+    partition_fn=lambda query: json.dumps(parse_constraints(query)[0], sort_keys=True)
+)
@@ -4,18 +4,26 @@
 from typing import TypedDict, List
 from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import os
+import sys
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.llm_client import make_groq_llm, shared_limiter
+from agent_utils.streaming import LatencyStats, stream_graph
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
+
 load_dotenv() # for storing API key
 
+# tokens are printed as they are generated; set STREAMING=0 to print whole responses (as before)
+streaming = os.getenv("STREAMING", "1") != "0"
+latency = LatencyStats() # time-to-first-token and total latency of every turn
+
 # Initialize Groq with fast inference
-llm = ChatGroq(
+llm = make_groq_llm( # shared connection pool, rate limiter and retries (see agent_utils/llm_client.py)
     model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    api_key=os.getenv("GROQ_API_KEY")
+    temperature=0.7
 )
 
 class AgentState(TypedDict):
@@ -23,7 +31,8 @@ class AgentState(TypedDict):
 
 def process(state: AgentState) -> AgentState: # defining the agent process
     response = llm.invoke(state["messages"])
-    print(f"\n Agent response: {response.content}")
+    if not streaming: # when streaming, the tokens were already printed as they arrived
+        print(f"\n Agent response: {response.content}")
     return state
 
 graph = StateGraph(AgentState)
@@ -36,7 +45,14 @@ agent = graph.compile()
 
 user_input = input("Enter your message: ")
 while user_input != "exit":
-    result = agent.invoke({"messages": [HumanMessage(content=user_input)]})
-    print(result["messages"][-1].content)
-    time.sleep(2)  # Add delay to prevent token exhaustion
-    user_input = input("Enter your message: ")
\ No newline at end of file
+    if streaming:
+        result = stream_graph(agent, {"messages": [HumanMessage(content=user_input)]}, {"process_node": "Agent response"}, latency, config=trace_config("Agent1"))
+    else:
+        start = time.perf_counter()
+        result = agent.invoke({"messages": [HumanMessage(content=user_input)]}, config=trace_config("Agent1"))
+        print(result["messages"][-1].content)
+        elapsed = time.perf_counter() - start
+        latency.record(elapsed, elapsed) # nothing is shown before the whole response has arrived
+    user_input = input("Enter your message: ")
+print(f"Latency: {latency.summary()}")
+print(f"Rate limiter: {shared_limiter().summary()}")
\ No newline at end of file
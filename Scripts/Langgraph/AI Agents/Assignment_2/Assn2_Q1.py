@@ -4,17 +4,26 @@
 from typing import TypedDict, List
 from langgraph.graph import StateGraph
 from langchain_core.messages import HumanMessage, AIMessage # for message types
-from langchain_groq import ChatGroq # LLM model
 from dotenv import load_dotenv
 import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.llm_client import make_groq_llm # LLM model (ChatGroq with pooled connections, rate limiting and retries)
+from agent_utils.streaming import LatencyStats, stream_graph
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 load_dotenv() # for storing API key
 
+# tokens are printed as they are generated; set STREAMING=0 to print whole responses (as before)
+streaming = os.getenv("STREAMING", "1") != "0"
+latency = LatencyStats() # time-to-first-token and total latency of every turn
+
 # Initialize Groq LLM
-llm = ChatGroq(
+llm = make_groq_llm(
     model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    api_key=os.getenv("GROQ_API_KEY")
+    temperature=0.7
 )
 
 class AgentState(TypedDict):
@@ -25,7 +34,8 @@ def process(state: AgentState) -> AgentState: # defining the agent process
     """ You are an expert in maths, coding and general knowledge. Answer the user queries to the best of your ability."""
 
     response = llm.invoke(state["messages"]) # invoking the LLM with the messages passed through state.
-    print(f"\nAgent response: {response.content}")
+    if not streaming: # when streaming, the tokens were already printed as they arrived
+        print(f"\nAgent response: {response.content}")
     
     state["messages"].append(AIMessage(content=response.content)) # Append AI response to messages (for context)
     return state
@@ -47,9 +57,17 @@ while user_input not in ["quit", "stop", "exit"]:
     history.append(HumanMessage(content=user_input))
     
     # Invoke agent with all messages (human + AI) to get its response
-    result = agent.invoke({"messages": history}) # passed 'messages' through state, which also contains the history of the chat.
+    if streaming: # the answer is printed token by token while it is generated
+        result = stream_graph(agent, {"messages": history}, {"LLM": "Agent response"}, latency, config=trace_config("Assn2_Q1"))
+    else:
+        start = time.perf_counter()
+        result = agent.invoke({"messages": history}, config=trace_config("Assn2_Q1")) # passed 'messages' through state, which also contains the history of the chat.
+        elapsed = time.perf_counter() - start
+        latency.record(elapsed, elapsed) # nothing is shown before the whole response has arrived
     
     # Update history with the result (includes AI response)
     history = result["messages"]
     
-    user_input = input("\nEnter your message ('quit' to exit): ")
\ No newline at end of file
+    user_input = input("\nEnter your message ('quit' to exit): ")
+
+print(f"Latency: {latency.summary()}")
\ No newline at end of file
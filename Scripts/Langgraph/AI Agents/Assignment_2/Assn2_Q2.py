@@ -4,37 +4,60 @@
 from typing import TypedDict, List
 from langgraph.graph import StateGraph
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage # for message types
-from langchain_groq import ChatGroq # LLM model
 from dotenv import load_dotenv
 import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.llm_client import make_groq_llm # LLM model (ChatGroq with pooled connections, rate limiting and retries)
+from agent_utils.speculation import SpeculationStats, SpeculativeCall, text_similarity
+from agent_utils.streaming import LatencyStats, stream_graph
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 load_dotenv() # for storing API key
 
+# tokens are printed as they are generated; set STREAMING=0 to print whole responses (as before)
+streaming = os.getenv("STREAMING", "1") != "0"
+latency = LatencyStats() # time-to-first-token and total latency of every turn
+
+# Speculative mode (SPECULATIVE=1): the original question is answered at the same time as it is rewritten. If the rewrite
+# is similar enough to the original (SPECULATION_THRESHOLD), that answer is kept and one LLM round trip is saved;
+# otherwise it is cancelled and the rewrite is answered as usual. Answers are printed once they are chosen (no streaming).
+speculative = os.getenv("SPECULATIVE", "0") == "1"
+speculation_threshold = float(os.getenv("SPECULATION_THRESHOLD", "0.5"))
+speculation = SpeculationStats()
+if speculative:
+    streaming = False
+
 # Initialize Groq LLM
-llm = ChatGroq(
+llm = make_groq_llm(
     model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    api_key=os.getenv("GROQ_API_KEY")
+    temperature=0.7
 )
 
 class AgentState(TypedDict):
     messages: List # to store all messages (human + AI) (will be useful when the output of the first agent is passed to the second one)
 
+# Create system messages with the analyzer / generator instructions (docstring alone won't work, system message is the cleaner and better option)
+analyzer_prompt = SystemMessage(content="""You will be given a question. Your job is to analyze it, and then rewrite it in a simpler manner.
+Make sure the rewritten question retains the original meaning but is easier to understand. 
+IMPORTANT: You are NOT supposed to answer the question, just rewrite it in simpler form. Only output the simplified question, nothing else.""")
+
+generator_prompt = SystemMessage(content="""You are an expert in general knowledge. You will be given a simplified question. 
+Your job is to provide a detailed and accurate answer to that question.""")
+
 def analyzer(state: AgentState) -> AgentState:
     """ You will be given a question. Your job is to analyze it, and then rewrite it in a simpler manner.
     Make sure the rewritten question retains the original meaning but is easier to understand. You are NOT supposed to answer the question, just rewrite it.
     """
     
-    # Create a system message with the analyzer instructions (docstring alone won't work, system message is the cleaner and better option)
-    system_prompt = SystemMessage(content="""You will be given a question. Your job is to analyze it, and then rewrite it in a simpler manner.
-Make sure the rewritten question retains the original meaning but is easier to understand. 
-IMPORTANT: You are NOT supposed to answer the question, just rewrite it in simpler form. Only output the simplified question, nothing else.""")
-    
     # Combine system message with the user's question (only the original question, not previous AI responses) and pass to the LLM.
-    messages_for_analyzer = [system_prompt, state["messages"][0]] # VERY IMPORTANT: only the first message (user question) is passed to the analyzer.
+    messages_for_analyzer = [analyzer_prompt, state["messages"][0]] # VERY IMPORTANT: only the first message (user question) is passed to the analyzer.
     
     response = llm.invoke(messages_for_analyzer) # invoking the LLM with the "messages_for_analyzer" (system + user question). 
-    print(f"\nAnalyzer response: {response.content}") # printing the simplified/rewritten question
+    if not streaming: # when streaming, the tokens were already printed as they arrived
+        print(f"\nAnalyzer response: {response.content}") # printing the simplified/rewritten question
     
     state["messages"].append(AIMessage(content=response.content)) # Append AI response to messages, so that the next agent can use the simplified question for answering.
     return state # returning the state
@@ -43,31 +66,68 @@ def generator(state:AgentState) -> AgentState:
     """ You are an expert in general knowledge. You will be given a simplified question by the 1st analyzer agent. 
     Your job is to provide a detailed and accurate answer to that question."""
     
-    # Create a system message with the generator instructions (docstring alone won't work, system message is the cleaner and better option)
-    system_prompt = SystemMessage(content="""You are an expert in general knowledge. You will be given a simplified question. 
-Your job is to provide a detailed and accurate answer to that question.""")
-    
     # Get the simplified question from the last AI message (from analyzer)
     simplified_question = state["messages"][-1].content
     
     # Create messages for generator: system instruction + simplified question
-    messages_for_generator = [system_prompt, HumanMessage(content=simplified_question)] 
+    messages_for_generator = [generator_prompt, HumanMessage(content=simplified_question)] 
     # system prompt and the AI-simplified question is stored in this, to be passed on to the generator agent.
     
     result = llm.invoke(messages_for_generator) # invoking the LLM with "messages for generator" (system prompt + simplified question)
-    print(f"\nGenerator response: {result.content}") # printing the answer to the simplified question
+    if not streaming:
+        print(f"\nGenerator response: {result.content}") # printing the answer to the simplified question
 
     return state 
 
+def speculative_pipeline(state: AgentState) -> AgentState:
+    """ The analyzer and the generator in one node: the original question is answered while it is being rewritten. """
+    start = time.perf_counter()
+    question = state["messages"][0]
+
+    guess = SpeculativeCall(llm, [generator_prompt, HumanMessage(content=question.content)]) # answering the original question in the background
+    rewrite = llm.invoke([analyzer_prompt, question]).content # meanwhile: the rewrite, exactly as in analyzer()
+    rewrite_seconds = time.perf_counter() - start
+    print(f"\nAnalyzer response: {rewrite}")
+
+    similarity = text_similarity(question.content, rewrite) # does the rewrite still ask the same thing?
+    if similarity >= speculation_threshold:
+        answer = guess.result() # already running (or finished) for rewrite_seconds; None if it failed
+        won = answer is not None
+    else:
+        won = False
+    if not won: # the rewrite changed the question (or the speculative call failed): the rewrite is answered instead
+        guess.cancel()
+        answer = llm.invoke([generator_prompt, HumanMessage(content=rewrite)]).content
+    elapsed = time.perf_counter() - start
+    guess.join() # the cancelled call stops at its next chunk; only then are its counters final
+    if guess.error is not None:
+        print(f"\n(speculative answer failed: {guess.error!r})")
+
+    # one after the other, the rewrite would have been followed by a generator call taking (about) as long as the
+    # speculative one; when speculation loses, the serial pipeline is exactly what ran
+    serial_estimate = rewrite_seconds + (guess.seconds or 0) if won else elapsed
+    speculation.record(won, similarity, elapsed, serial_estimate, 0 if won else guess.generated_chars)
+    print(f"\nGenerator response: {answer}")
+    print(f"(speculation {'kept' if won else 'cancelled'}: similarity {similarity:.2f}, {elapsed:.2f}s)")
+
+    state["messages"].append(AIMessage(content=rewrite))
+    state["messages"].append(AIMessage(content=answer))
+    return state
+
 graph = StateGraph(AgentState)
 
-graph.add_node("Question Analyzer", analyzer)
-graph.add_node("Answer Generator", generator)
+if speculative:
+    graph.add_node("Speculative Pipeline", speculative_pipeline)
+    graph.set_entry_point("Speculative Pipeline")
+    graph.set_finish_point("Speculative Pipeline")
+else:
+    graph.add_node("Question Analyzer", analyzer)
+    graph.add_node("Answer Generator", generator)
                
-graph.set_entry_point("Question Analyzer")
-graph.add_edge("Question Analyzer", "Answer Generator")
+    graph.set_entry_point("Question Analyzer")
+    graph.add_edge("Question Analyzer", "Answer Generator")
 
-graph.set_finish_point("Answer Generator")
+    graph.set_finish_point("Answer Generator")
                
 agent = graph.compile()
 
@@ -78,6 +138,18 @@ while user_input not in ["quit", "stop", "exit"]:
     message = HumanMessage(content=user_input) 
     state = {"messages": [message]} # adding user question to messages in state
 
-    answer = agent.invoke({"messages": [message]}) # invoking the agent with the messages in state, including the human question. 
+    if streaming: # the rewritten question and then the answer are printed token by token
+        answer = stream_graph(agent, {"messages": [message]},
+                              {"Question Analyzer": "Analyzer response", "Answer Generator": "Generator response"}, latency,
+                              config=trace_config("Assn2_Q2"))
+    else:
+        start = time.perf_counter()
+        answer = agent.invoke({"messages": [message]}, config=trace_config("Assn2_Q2")) # invoking the agent with the messages in state, including the human question. 
+        elapsed = time.perf_counter() - start
+        latency.record(elapsed, elapsed) # nothing is shown before the whole response has arrived
+
+    user_input = input("\nEnter your question ('quit' to exit): ")
 
-    user_input = input("\nEnter your question ('quit' to exit): ")
\ No newline at end of file
+print(f"Latency: {latency.summary()}")
+if speculative:
+    print(f"Speculation: {speculation.summary()}") # how often the speculative answer was kept, and the time saved
\ No newline at end of file
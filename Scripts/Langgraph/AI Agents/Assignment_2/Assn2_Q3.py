@@ -5,17 +5,35 @@
 from typing import TypedDict, List
 from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage, SystemMessage # for message types
-from langchain_groq import ChatGroq # LLM model
 from dotenv import load_dotenv  
 import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.fast_router import FastPathRouter, HashedLogisticRouter, load_examples
+from agent_utils.llm_cache import shared_response_cache
+from agent_utils.llm_client import answer_source, make_groq_llm # LLM model (ChatGroq with pooled connections, rate limiting and retries)
+from agent_utils.streaming import LatencyStats, stream_graph
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 load_dotenv() # for storing API key
 
+# tokens are printed as they are generated; set STREAMING=0 to print whole responses (as before)
+streaming = os.getenv("STREAMING", "1") != "0"
+latency = LatencyStats() # time-to-first-token and total latency of every turn
+
 # Initialize Groq LLM 
-llm = ChatGroq(
+llm = make_groq_llm(
+    model="llama-3.3-70b-versatile",
+    temperature=0.7
+)
+
+# the router only has to pick one of two words, so it runs at temperature 0: the same question always gets the
+# same label, which lets repeated questions be answered from the persistent response cache (agent_utils/llm_cache.py)
+classifier_llm = make_groq_llm(
     model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    api_key=os.getenv("GROQ_API_KEY")
+    temperature=0
 )
 
 class AgentState(TypedDict):
@@ -30,7 +48,8 @@ def python_expert(state: AgentState) -> AgentState:
     state["messages"].append(SystemMessage(content=system_prompt.content))  # Append system prompt to messages for context
 
     response = llm.invoke(state["messages"]) # invoking the LLM with the messages passed through state.
-    print(f"\nPython Expert response: {response.content}")
+    if not streaming: # when streaming, the tokens were already printed as they arrived
+        print(f"\nPython Expert response: {response.content}")
     
     return state
 
@@ -43,15 +62,14 @@ def general_expert(state: AgentState) -> AgentState:
     state["messages"].append(SystemMessage(content=system_prompt.content))  # Append system prompt to messages for context
 
     result = llm.invoke(state["messages"]) # invoking the LLM with the messages passed through state.
-    print(f"\nGeneral Expert response: {result.content}")
+    if not streaming:
+        print(f"\nGeneral Expert response: {result.content}")
     
     return state
 
-def decide_expert(state: AgentState) -> str:
+def classify_with_llm(question: str) -> str:
     """ Use LLM to intelligently decide whether the question is related to Python programming or general knowledge."""
 
-    question = state["messages"][-1].content  # Get the latest user question
-
     # Create a classification prompt for the LLM
     decider_prompt = SystemMessage(content="""You are a question classifier. Analyze the user's question and determine if it's about:
 - Python programming (code, syntax, libraries, debugging, algorithms in Python context, etc.) -> respond with only the word "python"
@@ -64,16 +82,41 @@ Output ONLY one word: either "python" or "general". Nothing else.""")
     
     # Ask the LLM to classify (even if I use python keywords in a general sense, it will be able to classify correctly)
 
-    classification = llm.invoke(classification_prompt) # passed the prompt to the LLM; will return either "python" or "general"
+    classification = classifier_llm.invoke(classification_prompt) # passed the prompt to the LLM; will return either "python" or "general"
     decision = classification.content.strip().lower() # returns a list with either "python" or "general"
     
-    print(f"\nRouter decision: {decision}")
-    
     # Return the classification
     if "python" in decision:
         return "python"
     else:
         return "general"
+
+# Local fast path: a small classifier trained on labelled questions (router_examples.json, plus the questions the LLM
+# classified in earlier runs) routes the question in well under a millisecond. Only when it is less confident than
+# ROUTER_THRESHOLD is the LLM asked. Every decision is logged to ROUTER_LOG (default router_decisions.jsonl, empty = no log);
+# only the decisions of the real Groq model are trained on. FAST_ROUTER=0 always uses the LLM.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+router_log_path = os.getenv("ROUTER_LOG", os.path.join(script_dir, "router_decisions.jsonl")) or None
+fast_router = None
+if os.getenv("FAST_ROUTER", "1") != "0":
+    router_questions, router_labels = load_examples(os.path.join(script_dir, "router_examples.json"), router_log_path)
+    fast_router = FastPathRouter(HashedLogisticRouter().fit(router_questions, router_labels), classify_with_llm,
+                                 threshold=float(os.getenv("ROUTER_THRESHOLD", "0.8")), log_path=router_log_path,
+                                 llm_model=answer_source("llama-3.3-70b-versatile"))
+
+def decide_expert(state: AgentState) -> str:
+    """ Decide whether the question is related to Python programming or general knowledge (locally if possible). """
+
+    question = state["messages"][-1].content  # Get the latest user question
+
+    if fast_router is None:
+        decision = classify_with_llm(question)
+        print(f"\nRouter decision: {decision}")
+        return decision
+
+    decision, record = fast_router.route(question)
+    print(f"\nRouter decision: {decision} ({record['source']}, confidence {record['confidence']:.2f})")
+    return decision
     
 graph = StateGraph(AgentState)
 
@@ -97,13 +140,27 @@ graph.add_edge("General Expert", END)
 
 agent = graph.compile()
 
-user_input = input("Enter your question ('quit' to exit): ")
+if __name__ == "__main__": # the graph can also be imported (e.g. by the HTTP server in Scripts/server) without starting the loop
+    user_input = input("Enter your question ('quit' to exit): ")
 
-while user_input not in ["quit", "exit", "stop"]:
+    while user_input not in ["quit", "exit", "stop"]:
 
-    question = HumanMessage(content=user_input) # storing the user question in a variable which will be passed to the state, and then the agent.
-    state = {"messages": [question]} # adding user question to messages in state
+        question = HumanMessage(content=user_input) # storing the user question in a variable which will be passed to the state, and then the agent.
+        state = {"messages": [question]} # adding user question to messages in state
 
-    answer = agent.invoke({"messages": [question]}) # invoking the agent with the messages in state, including the human question.
+        if streaming: # only the expert's answer is streamed (the router's one-word classification is not printed as tokens)
+            answer = stream_graph(agent, {"messages": [question]},
+                                  {"Python Expert": "Python Expert response", "General Expert": "General Expert response"}, latency,
+                                  config=trace_config("Assn2_Q3"))
+        else:
+            start = time.perf_counter()
+            answer = agent.invoke({"messages": [question]}, config=trace_config("Assn2_Q3")) # invoking the agent with the messages in state, including the human question.
+            elapsed = time.perf_counter() - start
+            latency.record(elapsed, elapsed) # nothing is shown before the whole response has arrived
     
-    user_input = input("\nEnter your question ('quit' to exit): ")
\ No newline at end of file
+        user_input = input("\nEnter your question ('quit' to exit): ")
+
+    print(f"Latency: {latency.summary()}")
+    print(f"Response cache: {shared_response_cache().stats()}") # router classifications answered from the cache
+    if fast_router is not None:
+        print(f"Router: {fast_router.stats()}") # LLM call rate and routing latency
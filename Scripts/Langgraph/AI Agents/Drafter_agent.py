@@ -7,15 +7,22 @@ from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages # reducer function
-from langchain_groq import ChatGroq 
 from langgraph.prebuilt import ToolNode # node which stores tools used by the agent
 from dotenv import load_dotenv
+import contextvars
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.llm_client import make_groq_llm
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 load_dotenv() # for storing API key
 
-# We require a global variable to hold the document content being drafted. 
-document_content = ""
+# We require a global variable to hold the document content being drafted. It is a dict inside a context variable,
+# so that every session of the HTTP server (Scripts/server/agent_server.py) can work on its own document;
+# the command-line loop below just uses the default one.
+current_document = contextvars.ContextVar("current_document", default={"content": ""})
 
 
 class AgentState(TypedDict): # making the state class.
@@ -25,9 +32,9 @@ class AgentState(TypedDict): # making the state class.
 @tool
 def update(content: str) -> str:
     """Updates the document by replacing it with the user-given content."""
-    global document_content # specifying that we are using the global variable
-    document_content = content
-    return f"Document has been updated. The current content is: \n{document_content}"
+    document = current_document.get() # the document of this session
+    document["content"] = content
+    return f"Document has been updated. The current content is: \n{document['content']}"
 
 @tool
 def save(filename: str) -> str:
@@ -36,22 +43,23 @@ def save(filename: str) -> str:
     Argument
     filename: the name of the textfile where the content will be stored and saved."""
 
-    global document_content
+    document = current_document.get()
 
     if not filename.endswith('.txt'): # ensure the file has a .txt extension
         filename += '.txt'
+    if document.get("save_dir"): # set by the HTTP server: files only go into the session's own folder
+        filename = os.path.join(document["save_dir"], os.path.basename(filename))
     with open(filename, 'w') as file:
-        file.write(document_content)
+        file.write(document["content"])
     print("\n Document has been saved to the file: ", filename)
     return f"Document has been saved to the file: {filename}. Task is now complete." # task completion message.
 
 tools = [update, save] # stored the tools in a list for the agent to use.
 
 # Initialize Groq LLM
-llm_ = ChatGroq(
+llm_ = make_groq_llm( # shared connection pool, rate limiter and retries (see agent_utils/llm_client.py)
     model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    api_key=os.getenv("GROQ_API_KEY")
+    temperature=0.7
 )
 
 # Bind tools to the LLM
@@ -65,10 +73,15 @@ def agent(state: AgentState) -> AgentState: # defining the agent and its tasks.
     - If the user wants to save and FINISH, you need to use the 'save' tool.
     - Make sure to always show the current document state after modifications.
     
-    The current document content is:{document_content}
+    The current document content is:{current_document.get()["content"]}
     """)
 
-    if not state["messages"]:
+    if state["messages"] and isinstance(state["messages"][-1], HumanMessage):
+        # the user's message was passed in with the state (by the HTTP server), so there is nothing to ask
+        user_message = state["messages"][-1]
+        state = {"messages": list(state["messages"])[:-1]}
+
+    elif not state["messages"]:
         # First interaction - just greet the user
         print("\nHello! I'm Drafter, your assistant for drafting documents. How can I help you today?")
 
@@ -137,12 +150,21 @@ graph.add_edge("drafter_agent", "tools")
 
 app = graph.compile()
 
+# One turn per call (the user's message comes in with the state): the agent answers, its tool calls are run, and the
+# graph stops instead of asking for the next message with input(). Used by the HTTP server.
+turn_graph = StateGraph(AgentState)
+turn_graph.add_node("drafter_agent", agent)
+turn_graph.add_node("tools", ToolNode(tools=tools))
+turn_graph.add_edge(START, "drafter_agent")
+turn_graph.add_edge("drafter_agent", "tools")
+turn_graph.add_edge("tools", END)
+
 def run_doc_agent(): # function to run the drafter agent.
     print("\n ===== DRAFTER =====")
     
     state = {"messages": []}
     
-    for step in app.stream(state, stream_mode="values"):
+    for step in app.stream(state, stream_mode="values", config=trace_config("Drafter_agent")):
         if "messages" in step:
             print_messages(step["messages"])
     
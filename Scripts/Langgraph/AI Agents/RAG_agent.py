@@ -2,82 +2,168 @@
 
 # importing the dependencies
 
+import time
+startup_time = time.perf_counter() # for measuring time-to-first-prompt (includes the imports below)
+
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor # for running the tool calls of one turn at the same time
+import contextvars # the tool calls run with the turn's context, so callbacks (e.g. tracing) see them
 import os
+import sys
+import threading
 from langgraph.graph import StateGraph, END
 from typing import TypedDict, Annotated, Sequence, Any
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
 from operator import add as add_messages # reducer function
-from langchain_groq import ChatGroq # LLM model
-from langchain_huggingface import HuggingFaceEmbeddings # embedding model
-from langchain_community.document_loaders import PyPDFLoader # for loading the pdf
 from langchain_text_splitters import RecursiveCharacterTextSplitter # for splitting the text into chunks
-from langchain_chroma import Chroma # for vector store
 from langchain_core.tools import tool
+# HuggingFaceEmbeddings and Chroma are slow to import, so they are imported in warm_up() instead (see below)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.bm25 import BM25Index, HybridRetriever
+from agent_utils.context import assemble_context, count_message_tokens, format_chunks
+from agent_utils.embedding_cache import CachedEmbeddings
+from agent_utils.ingestion import IngestionManifest, sync_pdf
+from agent_utils.llm_cache import shared_response_cache
+from agent_utils.llm_client import make_groq_llm # LLM model (ChatGroq with pooled connections, rate limiting and retries)
+from agent_utils.rerank import RerankingRetriever
+from agent_utils.retrieval_cache import CachedRetriever, file_version
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
+from agent_utils.vector_backends import open_dense_store
 
 load_dotenv()  # for storing API key
 
-llm_ = ChatGroq(
-    model="llama-3.3-70b-versatile", temperature=0, 
-    api_key=os.getenv("GROQ_API_KEY")) # setting temp = 0 to minimize hallucinations.
+llm_ = make_groq_llm(
+    model="llama-3.3-70b-versatile", temperature=0) # setting temp = 0 to minimize hallucinations.
 
 # our embedding model - and it is compatible with our LLM as well
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+embedding_model = "sentence-transformers/all-MiniLM-L6-v2"
 
 # Build path relative to the script's location
 script_dir = os.path.dirname(os.path.abspath(__file__))
 pdf_path = os.path.join(script_dir, "SkillX_Quant_Finance_Session1.pdf") # our vector store document.
 
-pdf = PyPDFLoader(pdf_path) # loading the PDF document
-
-# using a try and except block to handle any errors during page splitting
-try:
-    pages = pdf.load() # splitting the pdf into pages
-    print(f"Successfully loaded {len(pages)} pages from the PDF document.")
-
-except Exception as e:
-    print(f"Error loading PDF document: {e}")
-    raise
-
 # Chunking process (splitting pages into smaller 'chunks' for better embedding)
+chunk_size = 800
+chunk_overlap = 150
 text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=150
+    chunk_size=chunk_size,
+    chunk_overlap=chunk_overlap
 )
 
-pages_split = text_splitter.split_documents(pages) # Now we apply this to the pages of our document (to break into chunks).
-
+ingest_window_pages = 16 # pages read, split, embedded and written at a time (keeps memory bounded for long PDFs)
 
 persist_directory = "chroma_rag_db" # location to store the vector database
 collection_name = "skillx_session_info" # name of the collection in the vector DB
 
-
-vector_store = Chroma.from_documents( # creating the vector store with relevant parameters
-    documents=pages_split, # obtains the chunks of the document
-    embedding=embeddings, # embeds the chunks
-    persist_directory=persist_directory, # directory to persist the vector store
-    collection_name=collection_name # name of the collection in the vector store
-)
-print("Successfully created the vector store!")
-
-# now have to create our retriever 
-retriever = vector_store.as_retriever(
-    search_kwargs={"k": 4} # setting number of chunks to retrieve
-)
+# Lazy startup: loading the embedding model and opening / syncing the index happens on a background thread,
+# so the prompt is shown immediately. Set RAG_LAZY_STARTUP=0 to do it all before the prompt instead.
+lazy_startup = os.getenv("RAG_LAZY_STARTUP", "1") != "0"
+retriever = None # set by warm_up()
+reranker = None # set by warm_up() when re-ranking is enabled
+warm_up_done = threading.Event()
+warm_up_error = None
+warm_up_seconds = None
+
+# store used for the dense search: "chroma" (default) or "ivf" (in-process ANN index, no Chroma call per query)
+vector_backend = os.getenv("VECTOR_BACKEND", "chroma")
+# "int8" or "float16": the dense search runs over compressed vectors in RAM, re-scored exactly from the full vectors on disk
+compressed_vectors = os.getenv("COMPRESSED_VECTORS", "")
+# re-ranking: 20 candidate chunks are re-scored by a cross-encoder and only the relevant, non-redundant ones (at most 4)
+# are returned by the tool. Set RERANK=0 to always return the top 4 of the hybrid search instead.
+rerank = os.getenv("RERANK", "1") != "0"
+
+# settings stored in the manifest: if any of them change, the affected pages are re-embedded
+ingestion_params = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "embedding_model": embedding_model}
+manifest_path = os.path.join(persist_directory, f"{collection_name}_manifest.json")
+keyword_index_path = os.path.join(persist_directory, f"{collection_name}_bm25.pkl")
+
+def open_index():
+    """ Loads the embedding model and opens the vector store, its manifest and its keyword index (also used by ingest_corpus.py). """
+    from langchain_huggingface import HuggingFaceEmbeddings # embedding model
+    from langchain_chroma import Chroma # for vector store
+
+    # wrapped in an on-disk cache (shared with vector.py), so chunks and queries embedded before are not recomputed
+    embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=embedding_model), model_name=embedding_model)
+
+    vector_store = Chroma( # opening the (possibly already filled) vector store with relevant parameters
+        embedding_function=embeddings, # embeds the chunks and queries
+        persist_directory=persist_directory, # directory to persist the vector store
+        collection_name=collection_name # name of the collection in the vector store
+    )
+
+    # the manifest remembers which files / pages / settings are already embedded, so restarts don't re-embed (or duplicate) anything
+    manifest = IngestionManifest(manifest_path)
+
+    # keyword (BM25) index over the same chunks, kept in sync by the ingestion and saved next to the vector store
+    keyword_index = BM25Index.load_or_build(keyword_index_path, vector_store)
+    return embeddings, vector_store, manifest, keyword_index
+
+def warm_up():
+    """ Opens the index, syncs it with the PDF and builds the retriever. """
+    global retriever, reranker, warm_up_error, warm_up_seconds
+    start = time.perf_counter()
+    try:
+        embeddings, vector_store, manifest, keyword_index = open_index()
+
+        # using a try and except block to handle any errors during loading and embedding of the pages
+        try:
+            stats = sync_pdf(pdf_path, vector_store, manifest, text_splitter, ingestion_params, keyword_index=keyword_index,
+                             window_pages=ingest_window_pages, keyword_index_path=keyword_index_path) # BM25 saved before the manifest
+        except Exception as e:
+            print(f"Error loading PDF document: {e}")
+            raise
+
+        if not stats.get("up_to_date"):
+            embeddings.flush() # the last window's new embeddings (fewer than flush_every) are journaled too
+            print(f"\nSuccessfully updated the vector store: {stats}")
+            print(f"Embedding cache: {embeddings.stats()}")
+
+        # Chroma itself, or a snapshot of it (ANN index / compressed vectors) which is rebuilt only when the
+        # manifest's generation changes (i.e. something was re-ingested)
+        dense_store = open_dense_store(vector_store, embeddings, os.path.join(persist_directory, collection_name),
+                                       version=manifest.generation, backend=vector_backend, compressed=compressed_vectors)
+
+        # now have to create our retriever: dense + keyword search fused together (hybrid),
+        search = HybridRetriever(
+            vector_store=dense_store,
+            keyword_index=keyword_index,
+            k=20 if rerank else 4 # setting number of chunks to retrieve (over-fetching candidates for the re-ranker)
+        )
+        if rerank:
+            reranker = RerankingRetriever(retriever=search, embeddings=embeddings, max_k=4)
+            reranker.load() # loading the cross-encoder here, so the first question doesn't wait for it
+            search = reranker
+
+        # with a cache in front, which is cleared whenever the PDF is re-ingested
+        retriever = CachedRetriever(
+            retriever=search,
+            embeddings=embeddings,
+            version_fn=file_version(manifest.path)
+        )
+    except Exception as e:
+        warm_up_error = e
+    finally:
+        warm_up_seconds = time.perf_counter() - start
+        warm_up_done.set()
+
+def get_retriever():
+    """ Returns the retriever, blocking only if the warm-up has not finished yet. """
+    warm_up_done.wait()
+    if warm_up_error is not None:
+        raise RuntimeError(f"The vector store could not be loaded: {warm_up_error}") from warm_up_error
+    return retriever
 
 @tool
 def retriever_tool(query: str) -> str: # creating the retriever tool to be used by the agent
     """ Tool to retrieve and return relevant information from the vector store based on the query. """
-    docs = retriever.invoke(query) # retrieving the relevant info
+    docs = get_retriever().invoke(query) # retrieving the relevant info (waits for the warm-up on the first call)
 
     if not docs:
         return "No relevant information found in the document." # no similarities found
     
-    results = []
-    for i, doc in enumerate(docs):
-        results.append(f"Chunk {i+1}:\n{doc.page_content}\n") # if relevant info is found, return it in a formatted manner for the agent to use.
-    
-    return "\n\n".join(results) # joining the results
+    # if relevant info is found, return it in a formatted manner ("Chunk 1: ...") for the agent to use.
+    return format_chunks([doc.page_content for doc in docs])
 
 tools = [retriever_tool] # storing the tool in a list for the agent to use.
 
@@ -103,36 +189,60 @@ PLEASE always cite the specific parts of the documents you use in your answers.
 
 tools_dict = {our_tool.name: our_tool for our_tool in tools} # Creating a dictionary of our tools
 
+# token budgets for the retrieved chunks sent to the LLM (estimated at ~4 characters per token)
+tool_result_budget = 1200 # per tool result
+total_tool_budget = 4000 # all tool results in one prompt together
+
 # now time to define the LLM agent.
 def LLM_agent(state: AgentState) -> AgentState:
     messages = state["messages"] # getting the messages from the state
-    system_message = SystemMessage(content=system_prompt) # adding the system prompt
-    messages += [system_message] # getting the complete message by combining previous messages and system prompt
-    response = llm.invoke(messages) # obtaining the LLM's response by using the invoke method
+    # building the prompt: exactly one system prompt first, chunks that are already in the conversation dropped,
+    # and tool results cut to the budgets (the state itself is left untouched)
+    prompt = assemble_context(system_prompt, messages, tool_result_budget, total_tool_budget)
+    response = llm.invoke(prompt) # obtaining the LLM's response by using the invoke method
+
+    reported = (response.usage_metadata or {}).get("input_tokens", "n/a") # the token count reported by the API
+    print(f"[context] prompt ~{count_message_tokens(prompt)} tokens (~{count_message_tokens(messages)} before assembly), "
+          f"LLM reported {reported} input tokens")
     return {"messages": [response]} # returning the response as the new state
 
+# the tool calls of one LLM turn are independent lookups, so they run concurrently on a small, bounded pool
+max_tool_workers = 4
+tool_executor = ThreadPoolExecutor(max_workers=max_tool_workers)
+
+def normalize_query(query: str) -> str:
+    """ Lower-cases the query and collapses whitespace / trailing punctuation, so equivalent lookups are only run once. """
+    return " ".join(query.lower().split()).rstrip("?.!")
+
 # now time to create the retriever agent as well
 def take_action(state: AgentState) -> AgentState:
     """Execute tool calls from the LLM's response."""
 
     tool_calls = state['messages'][-1].tool_calls # Getting the tool calls from the latest message in state.
-    results = []
+    start = time.perf_counter()
+
+    jobs = {} # (tool name, normalized query) -> future; identical queries share a single retrieval
     for t in tool_calls:
-        print(f"Calling Tool: {t['name']} with query: {t['args'].get('query', 'No query provided')}") # storing tool execution results by iterating through "tool_calls"
-        
+        print(f"Calling Tool: {t['name']} with query: {t['args'].get('query', 'No query provided')}")
+        if t['name'] in tools_dict:
+            key = (t['name'], normalize_query(t['args'].get('query', '')))
+            if key not in jobs:
+                jobs[key] = tool_executor.submit(contextvars.copy_context().run, tools_dict[t['name']].invoke, t['args'].get('query', '')) # if tool is present, we invoke it with the user-given query.
+
+    results = []
+    for t in tool_calls: # collecting the results in the original tool call order
         if not t['name'] in tools_dict: # Checks if a valid tool is present
             print(f"\nTool: {t['name']} does not exist.")
             result = "Incorrect Tool Name, Please Retry and Select tool from List of Available tools." # tells us to use a tool which is actually present in the set of given tools
         
         else:
-            result = tools_dict[t['name']].invoke(t['args'].get('query', '')) # if tool is present, we invoke it with the user-given query.
+            result = jobs[(t['name'], normalize_query(t['args'].get('query', '')))].result()
             print(f"Result length: {len(str(result))}") # print the length of the result.
-            
 
         # Appends the Tool Message, including tool call ID, name, and content
         results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
 
-    print("Tools Execution Complete. Back to the model!")
+    print(f"Tools Execution Complete ({len(tool_calls)} calls, {len(jobs)} distinct lookups, {time.perf_counter() - start:.2f}s). Back to the model!")
     return {'messages': results} # returns the state with the tool execution results.
 
 graph = StateGraph(AgentState)
@@ -155,19 +265,40 @@ graph.add_conditional_edges( # adding conditional edges based on whether to cont
 rag_agent = graph.compile()
 
 def running_agent(): # function to run the RAG agent and accept multiple input queries
+    if lazy_startup:
+        threading.Thread(target=warm_up, daemon=True).start() # the index is loaded while the user types the first question
+    else:
+        warm_up()
+
     print("\n=== RAG AGENT===")
+    print(f"(time-to-first-prompt: {time.perf_counter() - startup_time:.2f}s, lazy startup: {'on' if lazy_startup else 'off'})")
+    first_answer = True
     
     while True:
         user_input = input("\nWhat is your question?: ")
         if user_input.lower() in ['exit', 'quit']:
+            if retriever is not None:
+                print(f"Retrieval cache: {retriever.stats()}") # hit rate and latency saved by the retrieval cache
+            if reranker is not None:
+                print(f"Re-ranking: {reranker.stats()}") # chunks / tokens per tool result and re-ranking latency
+            if llm_.cache is not None:
+                print(f"Response cache: {shared_response_cache().stats()}") # repeated questions answered without calling Groq
             break
             
         messages = [HumanMessage(content=user_input)] # converts back to a HumanMessage type
 
-        result = rag_agent.invoke({"messages": messages}) # invoking the RAG agent with the user input
+        question_time = time.perf_counter()
+        result = rag_agent.invoke({"messages": messages}, config=trace_config("RAG_agent")) # invoking the RAG agent with the user input
         
         print("\n=== ANSWER ===")
         print(result['messages'][-1].content) # printing only the relevant content of the final message.
 
+        if first_answer: # the first answer is the one which may have had to wait for the warm-up
+            # the answer may not have needed the retriever, so the warm-up can still be running in the background
+            warm_up_note = f"warm-up took {warm_up_seconds:.2f}s in total" if warm_up_done.is_set() else "warm-up still running"
+            print(f"\n(time-to-first-answer: {time.perf_counter() - question_time:.2f}s after the question; {warm_up_note})")
+            first_answer = False
+
 
-running_agent()
\ No newline at end of file
+if __name__ == "__main__":
+    running_agent()
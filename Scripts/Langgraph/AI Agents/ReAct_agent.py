@@ -7,33 +7,43 @@ from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool 
 from langgraph.graph.message import add_messages # reducer function
-from langchain_groq import ChatGroq
 from langgraph.prebuilt import ToolNode # node which stores tools used by the agent
 from dotenv import load_dotenv
-import time
 import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.arithmetic import ArithmeticFastPath # answers questions which are only arithmetic without the LLM
+from agent_utils.llm_client import make_groq_llm, shared_limiter
+from agent_utils.tool_executor import PureToolExecutor, pure # memoized, parallel execution of the (pure) math tools
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 load_dotenv() # for storing API key
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
 
-# defining the tools to be used by the agent
+# defining the tools to be used by the agent (pure functions: the same arguments always give the same result)
+@pure
 @tool
 def add(a,b):
     """ Adds 2 numbers together."""
     return a+b
 
+@pure
 @tool
 def subtract(a,b):
     """ Subtracts b from a."""
     return a-b
 
+@pure
 @tool
 def multiply(a,b):
     """ Multiplies 2 numbers together."""
     return a*b
 
+@pure
 @tool
 def exponentiate(a,b):
     """ Raises a to the power b."""
@@ -45,10 +55,9 @@ tools = [add, subtract, multiply, exponentiate]
 
 
 # Initialize Groq LLM
-llm_ = ChatGroq(
+llm_ = make_groq_llm( # shared connection pool, rate limiter and retries (see agent_utils/llm_client.py)
     model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    api_key=os.getenv("GROQ_API_KEY")
+    temperature=0.7
 )
 
 # Bind tools to the LLM
@@ -73,7 +82,8 @@ graph = StateGraph(AgentState)
 graph.add_node("agent", model_call)
 graph.set_entry_point("agent")
 
-tool_node = ToolNode(tools=tools)
+# the tool calls of a turn run in parallel and repeated calls are answered from a memo; PURE_TOOLS=0 uses ToolNode instead
+tool_node = PureToolExecutor(tools) if os.getenv("PURE_TOOLS", "1") != "0" else ToolNode(tools=tools)
 graph.add_node("tools", tool_node)
 
 # Adding conditional edges based on whether the agent should continue or end
@@ -93,18 +103,35 @@ app = graph.compile()
 
 # function to print the output in a proper manner, including tool calls, ai messages, etc.
 def print_stream(stream):
+    s = None
     for s in stream:
         message =  s["messages"][-1]
         if isinstance(message, tuple):
             print(message)
         else:
             message.pretty_print()
+    return s # the final state
 
-query = input("Enter your question here: ")
-
-# adding a while loop so that the user can ask as many questions as they want.
-while query != "exit":
-    inputs = {"messages": [("user", query)]}
-    print_stream(app.stream(inputs, stream_mode="values"))
-    time.sleep(2)  # slight delay before next input
+if __name__ == "__main__": # the graph can also be imported (e.g. by the HTTP server in Scripts/server) without starting the loop
+    # questions which are only arithmetic ("what is (3+4)*2^5?") are answered locally, without the LLM / tool loop;
+    # everything else goes to the graph unchanged. ARITHMETIC_FAST_PATH=0 sends every question to the graph.
+    fast_path = ArithmeticFastPath() if os.getenv("ARITHMETIC_FAST_PATH", "1") != "0" else None
     query = input("Enter your question here: ")
+
+    # adding a while loop so that the user can ask as many questions as they want.
+    while query != "exit":
+        answer = fast_path.answer(query) if fast_path is not None else None
+        if answer is not None:
+            AIMessage(content=answer).pretty_print()
+        else:
+            inputs = {"messages": [("user", query)]}
+            start = time.perf_counter()
+            state = print_stream(app.stream(inputs, stream_mode="values", config=trace_config("ReAct_agent")))
+            if fast_path is not None: # the graph's time per LLM call, to estimate the time the fast path saves
+                fast_path.record_llm_turn(time.perf_counter() - start, sum(isinstance(m, AIMessage) for m in state["messages"]))
+        query = input("Enter your question here: ")
+    print(f"Rate limiter: {shared_limiter().summary()}") # waits only happen when the request / token budget is nearly used up
+    if isinstance(tool_node, PureToolExecutor):
+        print(f"Tool executor: {tool_node.stats()}") # memo hits and the latency of every tool
+    if fast_path is not None:
+        print(f"Arithmetic fast path: {fast_path.stats()}") # questions answered locally, LLM calls and seconds saved
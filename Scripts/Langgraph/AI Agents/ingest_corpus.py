@@ -0,0 +1,39 @@
+# Indexes a whole folder of PDFs (e.g. every session deck) into the RAG agent's collection.
+# PDFs are parsed in a pool of worker processes, so throughput scales with the number of cores;
+# unchanged files are skipped, and a corrupt PDF is reported without aborting the rest of the run.
+#
+# Usage (from this folder, like RAG_agent.py):
+#     python ingest_corpus.py path/to/decks [--workers 8] [--prune]
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.ingestion import ingest_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a folder of PDFs into the RAG agent's vector store.")
+    parser.add_argument("folder", help="folder which is searched (recursively) for PDF files")
+    parser.add_argument("--workers", type=int, default=None, help="number of parsing processes (default: number of cores)")
+    parser.add_argument("--prune", action="store_true", help="remove files from the index that are no longer in the folder")
+    args = parser.parse_args()
+
+    # imported here and not at the top: worker processes re-import this file, and they only need the parsing code
+    import RAG_agent
+
+    embeddings, vector_store, manifest, keyword_index = RAG_agent.open_index()
+    totals = ingest_directory(args.folder, vector_store, manifest, RAG_agent.text_splitter, RAG_agent.ingestion_params,
+                              keyword_index=keyword_index, workers=args.workers, prune=args.prune,
+                              window_pages=RAG_agent.ingest_window_pages, keyword_index_path=RAG_agent.keyword_index_path)
+
+    print(f"\nCorpus ingestion finished: {totals}")
+    embeddings.flush()
+    print(f"Embedding cache: {embeddings.stats()}")
+    if totals["failed"]:
+        sys.exit(1) # non-zero exit code, so scripts / CI notice the files that could not be read
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@
 
 from typing import List, Dict, TypedDict
 from langgraph.graph import StateGraph
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 class AgentState(TypedDict):
     name: str
@@ -34,7 +39,7 @@ graph.set_finish_point("processor")
 
 app = graph.compile()
    
-result = app.invoke({"name": "Vedanga", "values": [1, 2, 3, 4], "operation": '+'})
+result = app.invoke({"name": "Vedanga", "values": [1, 2, 3, 4], "operation": '+'}, config=trace_config("lang_graph2"))
 
 print(result["result"])
 
@@ -2,6 +2,11 @@
 
 from typing import TypedDict, List
 from langgraph.graph import StateGraph
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 class AgentState(TypedDict): # making the agent state
     name: str
@@ -46,5 +51,5 @@ graph.set_finish_point("skills_node")
 
 app = graph.compile()
 
-result = app.invoke({"name": "Bob", "age": "30", "skills": ["Python", "Machine Learning", "Data Analysis"]})
+result = app.invoke({"name": "Bob", "age": "30", "skills": ["Python", "Machine Learning", "Data Analysis"]}, config=trace_config("lang_graph3"))
 print(result["result"])
\ No newline at end of file
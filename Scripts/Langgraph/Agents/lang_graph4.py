@@ -2,6 +2,11 @@
 
 from typing import TypedDict
 from langgraph.graph import StateGraph, START, END
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 class AgentState(TypedDict):
     number1: int
@@ -104,7 +109,7 @@ initial_state = AgentState(
     final_number2=0
 )
 
-result = app.invoke(initial_state)
+result = app.invoke(initial_state, config=trace_config("lang_graph4"))
 
 print("Final Result after first operation:", result["final_number"])
 print("\nFinal Result after second operation:", result["final_number2"])
\ No newline at end of file
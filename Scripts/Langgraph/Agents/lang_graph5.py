@@ -3,6 +3,11 @@
 from typing import TypedDict, List, Dict
 import random
 from langgraph.graph import StateGraph, START, END
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.tracing import trace_config # per-node tracing, only when TRACING=1
 
 class AgentState(TypedDict): # setting up the state
     player_name: str
@@ -98,5 +103,5 @@ graph.add_conditional_edges(
 app = graph.compile()
 input = AgentState(player_name="Student")
 
-result = app.invoke(input)
+result = app.invoke(input, config=trace_config("lang_graph5"))
 print(result)
\ No newline at end of file
@@ -0,0 +1,3 @@
+# shared helpers used by the Langchain and Langgraph scripts (ingestion, caching, retrieval, etc.)
+# the scripts add the Scripts/ folder to sys.path and then import from this package, e.g.
+#     from agent_utils.ingestion import IngestionManifest
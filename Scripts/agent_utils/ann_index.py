@@ -0,0 +1,247 @@
+# In-process approximate nearest neighbour (ANN) search: an IVF ("inverted file") index over contiguous NumPy arrays.
+# The vectors are clustered with k-means; each cluster's vectors are stored next to each other in one float32 array,
+# so a query only scans the nprobe clusters whose centroids are closest to it. Queries can be batched: every probed
+# cluster is scored against all the queries that probe it with a single matrix product.
+#
+# IVFVectorStore wraps the index (plus the documents' text and metadata) as a read-only langchain vector store,
+# so it can replace Chroma for the dense search of a HybridRetriever. No Chroma / SQLite call happens per query.
+# The whole index is saved to (and loaded from) a single .npz file.
+
+import json
+import os
+import uuid
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from agent_utils.quantized_store import normalize, reject_kwargs, top_k
+
+
+def _json_array(value) -> np.ndarray:
+    """ Stores JSON as a uint8 array, so it fits in the .npz file without pickling. """
+    return np.frombuffer(json.dumps(value).encode("utf-8"), dtype=np.uint8)
+
+
+def _from_json_array(array: np.ndarray):
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+class IVFIndex:
+    """ Inverted-file index with cosine similarity (vectors are normalized when added). """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, offsets: np.ndarray, nprobe: int = 8):
+        self.centroids = centroids # (nlist, dim)
+        self.vectors = vectors # (n, dim), grouped by cluster
+        self.offsets = offsets # cluster c holds vectors[offsets[c]:offsets[c + 1]]
+        self.nprobe = min(nprobe, len(centroids))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int = None, nprobe: int = 8, iterations: int = 10, seed: int = 0) -> tuple["IVFIndex", np.ndarray]:
+        """ Clusters the vectors with (spherical) k-means. Returns the index and the permutation that was applied
+        to the rows (index row i is input row order[i]), so callers can reorder their IDs / documents the same way. """
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        n = len(vectors)
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+
+        # training on a sample is enough for good centroids and keeps building fast for large collections
+        sample = vectors[rng.choice(n, size=min(n, 256 * nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members): # empty clusters keep their old centroid
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize(centroids)
+
+        assignment = np.concatenate([np.argmax(vectors[start:start + 65_536] @ centroids.T, axis=1)
+                                     for start in range(0, n, 65_536)])
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        return cls(centroids, np.ascontiguousarray(vectors[order]), offsets, nprobe), order
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """ Batched search. queries: (b, dim). Returns (positions, scores), both (b, k); missing results are -1 / -inf. """
+        queries = normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+
+        candidate_positions = [[] for _ in queries]
+        candidate_scores = [[] for _ in queries]
+        for cluster in np.unique(probes):
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == end:
+                continue
+            probing = np.nonzero((probes == cluster).any(axis=1))[0] # the queries which probe this cluster
+            block = self.vectors[start:end] @ queries[probing].T # one matrix product for all of them
+            for column, q in enumerate(probing):
+                candidate_positions[q].append(np.arange(start, end))
+                candidate_scores[q].append(block[:, column])
+
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q in range(len(queries)):
+            if not candidate_scores[q]:
+                continue
+            all_positions = np.concatenate(candidate_positions[q])
+            all_scores = np.concatenate(candidate_scores[q])
+            best = top_k(all_scores, k)
+            positions[q, :len(best)] = all_positions[best]
+            scores[q, :len(best)] = all_scores[best]
+        return positions, scores
+
+    def exact_search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """ Brute-force search over every vector (the ground truth for recall measurements). """
+        queries = normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        all_scores = queries @ self.vectors.T
+        positions = np.stack([top_k(row, k) for row in all_scores])
+        return positions, np.take_along_axis(all_scores, positions, axis=1)
+
+
+class IVFVectorStore(VectorStore):
+    """ Read-only vector store backed by an IVFIndex; documents are kept in memory next to the index. """
+
+    def __init__(self, embedding: Embeddings, index: IVFIndex, ids: list, texts: list, metadatas: list, info: dict = None):
+        self._embedding = embedding
+        self.index = index
+        self.ids = ids # in index row order
+        self.texts = texts
+        self.metadatas = metadatas
+        self.info = info or {}
+        self.positions = {doc_id: i for i, doc_id in enumerate(ids)} # document ID -> index row
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---- building / persistence ----
+
+    @classmethod
+    def from_collection(cls, source_store, embedding: Embeddings, nlist: int = None, nprobe: int = 8,
+                        batch_size: int = 5000, info: dict = None) -> "IVFVectorStore":
+        """ Builds the index from everything in a Chroma collection (vectors, texts and metadata). """
+        ids, texts, metadatas, pages = [], [], [], []
+        offset = 0
+        while True:
+            page = source_store.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+            if not len(page["ids"]):
+                break
+            ids.extend(page["ids"])
+            texts.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+            offset += len(page["ids"])
+        if not ids:
+            raise ValueError("The collection is empty; ingest documents before building an ANN index.")
+
+        index, order = IVFIndex.train(np.vstack(pages), nlist=nlist, nprobe=nprobe)
+        return cls(embedding, index, [ids[i] for i in order], [texts[i] for i in order], [metadatas[i] for i in order], info)
+
+    def save(self, path: str):
+        """ Writes everything to one .npz file (a temporary file first, then renamed). """
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.index.centroids, vectors=self.index.vectors, offsets=self.index.offsets,
+                 documents=_json_array({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}),
+                 info=_json_array({**self.info, "nprobe": self.index.nprobe}))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "IVFVectorStore":
+        with np.load(path, allow_pickle=False) as data:
+            info = _from_json_array(data["info"])
+            documents = _from_json_array(data["documents"])
+            index = IVFIndex(data["centroids"], data["vectors"], data["offsets"], info["nprobe"])
+        return cls(embedding, index, documents["ids"], documents["texts"], documents["metadatas"], info)
+
+    @classmethod
+    def load_or_build(cls, source_store, embedding: Embeddings, path: str, version: Any = None,
+                      nlist: int = None, nprobe: int = 8) -> "IVFVectorStore":
+        """ Loads the saved index if it was built from the same collection version, otherwise rebuilds it from Chroma. """
+        if os.path.exists(path):
+            try:
+                store = cls.load(path, embedding)
+                if store.info.get("version") == version:
+                    store.index.nprobe = min(nprobe, len(store.index.centroids))
+                    return store
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load the ANN index ({e}), rebuilding it.")
+        print("Building the IVF index of the collection...")
+        store = cls.from_collection(source_store, embedding, nlist=nlist, nprobe=nprobe, info={"version": version})
+        store.save(path)
+        print(f"IVF recall against brute-force search: {store.recall_at_k()}") # measured once per rebuild
+        return store
+
+    # ---- search ----
+
+    def _document(self, position: int) -> Document:
+        return Document(page_content=self.texts[position], metadata=dict(self.metadatas[position]), id=self.ids[position])
+
+    def search_vectors(self, vectors, k: int = 4) -> list[list[tuple[Document, float]]]:
+        """ Batched search: one list of (document, cosine similarity) pairs per query vector. """
+        positions, scores = self.index.search(np.asarray(vectors), k)
+        return [[(self._document(p), float(s)) for p, s in zip(row_positions, row_scores) if p >= 0]
+                for row_positions, row_scores in zip(positions, scores)]
+
+    def search_among(self, embedding: list[float], k: int, allowed_ids) -> list[Document]:
+        """ Exact search restricted to the given document IDs (e.g. the reviews matching a rating / date filter). """
+        positions = np.array(sorted(self.positions[i] for i in allowed_ids if i in self.positions), dtype=np.int64)
+        if not len(positions):
+            return []
+        scores = self.index.vectors[positions] @ normalize(np.asarray(embedding, dtype=np.float32))
+        return [self._document(positions[p]) for p in top_k(scores, k)]
+
+    def batch_similarity_search(self, queries: list[str], k: int = 4) -> list[list[Document]]:
+        """ Embeds and searches several queries at once. """
+        vectors = [self._embedding.embed_query(query) for query in queries]
+        return [[doc for doc, _ in results] for results in self.search_vectors(vectors, k)]
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float], k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        reject_kwargs(type(self).__name__, kwargs)
+        return self.search_vectors([embedding], k)[0]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        reject_kwargs(type(self).__name__, kwargs) # before the query is embedded
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score # scores already are cosine similarities
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, nlist: int = None, nprobe: int = 8, **kwargs) -> "IVFVectorStore":
+        """ Embeds the texts and builds the index over them (the store is read-only afterwards, like one built from Chroma). """
+        reject_kwargs(cls.__name__, kwargs)
+        texts = list(texts)
+        if not texts:
+            raise ValueError("No texts given; an IVF index needs at least one vector.")
+        ids = [str(i) for i in ids] if ids is not None else [uuid.uuid4().hex for _ in texts]
+        metadatas = [dict(m or {}) for m in metadatas] if metadatas is not None else [{} for _ in texts]
+        index, order = IVFIndex.train(np.asarray(embedding.embed_documents(texts), dtype=np.float32), nlist=nlist, nprobe=nprobe)
+        return cls(embedding, index, [ids[i] for i in order], [texts[i] for i in order], [metadatas[i] for i in order])
+
+    def recall_at_k(self, queries: np.ndarray = None, k: int = 10, n_queries: int = 100, seed: int = 0) -> dict:
+        """ Recall@k of the IVF search against brute-force search (pseudo-queries as in QuantizedVectorStore). """
+        if queries is None:
+            rng = np.random.default_rng(seed)
+            pairs = rng.integers(0, len(self.ids), size=(n_queries, 2))
+            queries = self.index.vectors[pairs[:, 0]] + self.index.vectors[pairs[:, 1]]
+        approximate, _ = self.index.search(queries, k)
+        exact, _ = self.index.exact_search(queries, k)
+        hits = sum(len(set(a[a >= 0].tolist()) & set(e.tolist())) for a, e in zip(approximate, exact))
+        return {"k": k, "queries": len(queries), "nprobe": self.index.nprobe, "nlist": len(self.index.centroids),
+                "recall": round(hits / exact.size, 4)}
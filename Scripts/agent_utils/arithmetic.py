@@ -0,0 +1,147 @@
+# Local fast path for questions which are nothing but arithmetic ("what is (3+4)*2^5?"), answered before the ReAct
+# graph runs. The expression is parsed with Python's ast module and evaluated by walking the tree, allowing only
+# numbers and the operations the ReAct agent has tools for: + (add), - (subtract), * (multiply) and ^ / ** (exponentiate).
+# Nothing is ever eval()'d, and huge powers are refused. Any question which is not entirely such an expression
+# (words left over, division, function calls, ...) is left to the LLM.
+#
+# Without the fast path, the agent needs one LLM round trip per level of the expression (the independent operations
+# of a level are asked for together), plus one for the final answer; that is the number of LLM calls avoided.
+
+import ast
+import math
+import operator
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Pow: operator.pow}
+
+# phrasings around the expression which do not change the question
+PREFIX = re.compile(r"^\s*(?:please\s+)?(?:what\s+is|what's|whats|calculate|compute|evaluate|solve|how\s+much\s+is)\s*(?:the\s+value\s+of\s+)?(?:[:,]\s*)?", re.IGNORECASE)
+SUFFIX = re.compile(r"\s*(?:=\s*)?[?.!]*\s*$")
+WORD_OPERATORS = [ # spelled-out operators, longest first
+    (r"\bto\s+the\s+power\s+of\b", "^"), (r"\braised\s+to(?:\s+the\s+power\s+of)?\b", "^"), (r"\bto\s+the\s+power\b", "^"),
+    (r"\bmultiplied\s+by\b", "*"), (r"\btimes\b", "*"), (r"\bplus\b", "+"), (r"\bminus\b", "-"),
+]
+EXPRESSION_CHARS = re.compile(r"^[\d\s.+\-*^()]+$")
+MAX_RESULT_DIGITS = 1000 # an expression with a bigger (intermediate) result is refused (left to the LLM)
+MAX_RESULT_BITS = int(MAX_RESULT_DIGITS * math.log2(10)) + 1
+
+
+class NotArithmetic(ValueError):
+    pass
+
+
+def extract_expression(question: str) -> str:
+    """ The arithmetic expression the whole question consists of, in Python syntax; raises NotArithmetic otherwise. """
+    text = SUFFIX.sub("", PREFIX.sub("", question))
+    for pattern, symbol in WORD_OPERATORS:
+        text = re.sub(pattern, f" {symbol} ", text, flags=re.IGNORECASE)
+    if not text.strip() or not EXPRESSION_CHARS.match(text) or not re.search(r"\d", text):
+        raise NotArithmetic(question)
+    return text.replace("^", "**").strip()
+
+
+def _evaluate(node):
+    """ (value, depth): depth is the number of dependent operation levels below this node. """
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value, 0
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value, depth = _evaluate(node.operand)
+        return (-value if isinstance(node.op, ast.USub) else value), depth
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        (left, left_depth), (right, right_depth) = _evaluate(node.left), _evaluate(node.right)
+        try:
+            if isinstance(node.op, ast.Pow):
+                # digits of the result ~ right * log10(|left|), compared in log space so that huge ints never become floats
+                if abs(left) > 1 and right > 0 and math.log10(right) + math.log10(math.log10(abs(left))) > math.log10(MAX_RESULT_DIGITS):
+                    raise NotArithmetic("power too large")
+                if left < 0 and not float(right).is_integer():
+                    raise NotArithmetic("complex result")
+            value = OPERATORS[type(node.op)](left, right)
+        except (OverflowError, ValueError, ZeroDivisionError) as e: # e.g. 0 ** -1, or 10 ** -(10 ** 400)
+            raise NotArithmetic(str(e))
+        _check_size(value)
+        return value, max(left_depth, right_depth) + 1
+    raise NotArithmetic(ast.dump(node))
+
+
+def _check_size(value):
+    """ Every intermediate result is bounded, so a long product of big numbers is refused as well as a big power. """
+    if isinstance(value, int) and value.bit_length() > MAX_RESULT_BITS:
+        raise NotArithmetic("result too large")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise NotArithmetic("result too large")
+
+
+def evaluate(question: str) -> tuple[str, float, int]:
+    """ (expression, value, operation levels) for a question which is only arithmetic; raises NotArithmetic otherwise
+    (a question without any operation, like "what is 5?", is not answered either). """
+    expression = extract_expression(question)
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except (SyntaxError, RecursionError): # e.g. "3 +", or thousands of nested parentheses
+        raise NotArithmetic(question)
+    value, levels = _evaluate(tree.body)
+    if levels == 0:
+        raise NotArithmetic(question)
+    return ast.unparse(tree), value, levels # unparse: the expression with regular spacing
+
+
+def format_number(value) -> str:
+    try:
+        if isinstance(value, float):
+            return str(int(value)) if value.is_integer() and abs(value) < 1e15 else f"{value:.10g}"
+        return str(value)
+    except (OverflowError, ValueError) as e: # e.g. an int beyond Python's int -> str digit limit
+        raise NotArithmetic(str(e))
+
+
+class ArithmeticFastPath:
+    """ Answers pure-arithmetic questions locally and keeps track of the LLM calls and time this saves. The ReAct loop
+    reports its LLM turns with record_llm_turn(), which gives the average latency of an LLM call. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local_ms = deque(maxlen=10_000)
+        self.questions = 0
+        self.answered = 0
+        self.llm_calls_avoided = 0
+        self.llm_seconds = 0.0 # time of the questions which went to the graph, and their number of LLM calls
+        self.llm_calls = 0
+
+    def answer(self, question: str):
+        """ The answer, or None if the question is not only arithmetic (then it should go to the LLM unchanged). """
+        start = time.perf_counter()
+        try:
+            expression, value, levels = evaluate(question)
+            result = format_number(value)
+        except NotArithmetic:
+            with self._lock:
+                self.questions += 1
+            return None
+        with self._lock:
+            self.questions += 1
+            self.answered += 1
+            self.llm_calls_avoided += levels + 1 # one round trip per level of tool calls, plus the final answer
+            self._local_ms.append(1000 * (time.perf_counter() - start))
+        return f"{expression.replace('**', '^')} = {result}"
+
+    def record_llm_turn(self, seconds: float, llm_calls: int):
+        with self._lock:
+            self.llm_seconds += seconds
+            self.llm_calls += llm_calls
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = {"questions": self.questions, "answered_locally": self.answered, "llm_calls_avoided": self.llm_calls_avoided}
+            local_ms = list(self._local_ms)
+            if local_ms:
+                s["local_p50_ms"] = round(float(np.percentile(local_ms, 50)), 3)
+            if self.llm_calls: # at the average latency of the agent's LLM calls so far
+                s["avg_llm_call_s"] = round(self.llm_seconds / self.llm_calls, 3)
+                s["saved_seconds"] = round(self.llm_calls_avoided * self.llm_seconds / self.llm_calls - sum(local_ms) / 1000, 2)
+        return s
@@ -0,0 +1,169 @@
+# In-process BM25 keyword index and a hybrid (BM25 + vector) retriever.
+# Dense retrieval is weak on exact terms (dish names, dates, formula names), keyword retrieval is weak on paraphrases;
+# the hybrid retriever fuses both rankings with reciprocal rank fusion (RRF).
+# The index is updated by the same ingestion code that writes to Chroma and is pickled next to the Chroma collection.
+
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """ Lower-cased alphanumeric tokens (numbers are kept, so dates and amounts can be matched exactly). """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """ Inverted index (term -> {doc id: term frequency}) with BM25 scoring. """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {} # term -> {doc id: term frequency}
+        self.lengths = {} # doc id -> number of tokens
+        self.docs = {} # doc id -> (text, metadata), so results can be returned as Documents
+        self.total_length = 0
+        self.dirty = False # True when there are changes which are not saved yet
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, ids: list, texts: list, metadatas: list = None):
+        """ Adds (or replaces) documents. """
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            self.remove([i for i in ids if i in self.docs])
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                tokens = tokenize(text)
+                for term, tf in Counter(tokens).items():
+                    self.postings.setdefault(term, {})[doc_id] = tf
+                self.lengths[doc_id] = len(tokens)
+                self.total_length += len(tokens)
+                self.docs[doc_id] = (text, dict(metadata or {}))
+            self.dirty = True
+
+    def add_documents(self, documents: list, ids: list):
+        self.add(ids, [d.page_content for d in documents], [d.metadata for d in documents])
+
+    def remove(self, ids: list):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id not in self.docs:
+                    continue
+                text, _ = self.docs.pop(doc_id)
+                for term in set(tokenize(text)):
+                    posting = self.postings.get(term)
+                    if posting is not None:
+                        posting.pop(doc_id, None)
+                        if not posting:
+                            del self.postings[term]
+                self.total_length -= self.lengths.pop(doc_id)
+                self.dirty = True
+
+    def search(self, query: str, k: int = 10, allowed_ids=None) -> list[tuple[str, float]]:
+        """ Returns the k best (doc id, BM25 score) pairs for the query, optionally only among allowed_ids (a set). """
+        with self._lock:
+            n_docs = len(self.docs)
+            if not n_docs:
+                return []
+            avg_length = self.total_length / n_docs
+            scores = Counter()
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    if allowed_ids is not None and doc_id not in allowed_ids:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return scores.most_common(k)
+
+    def document(self, doc_id: str) -> Document:
+        text, metadata = self.docs[doc_id]
+        return Document(page_content=text, metadata=dict(metadata), id=doc_id)
+
+    # ---- persistence ----
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["dirty"] # locks can't be pickled
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self.dirty = False
+
+    def save(self, path: str):
+        """ Pickles the index (written to a temporary file first, then renamed). """
+        with self._lock:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.dirty = False
+
+    @classmethod
+    def load_or_build(cls, path: str, vector_store, batch_size: int = 5000) -> "BM25Index":
+        """ Loads the saved index, or builds it once from the documents already in the vector store. """
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+                print(f"Could not load the keyword index ({e}), rebuilding it from the vector store.")
+
+        index = cls()
+        offset = 0
+        while True: # paging through the collection, so large collections are not loaded at once
+            page = vector_store.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                break
+            index.add(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+        index.save(path)
+        return index
+
+
+class HybridRetriever(BaseRetriever):
+    """ Fuses dense (vector store) and keyword (BM25) results with reciprocal rank fusion. """
+
+    vector_store: Any
+    keyword_index: Any # a BM25Index over the same documents (same IDs) as the vector store
+    k: int = 4 # number of documents returned
+    fetch_k: int = 20 # candidates taken from each of the two rankings
+    rrf_k: int = 60 # RRF constant: score = sum over rankings of 1 / (rrf_k + rank)
+    search_kwargs: dict = {} # extra arguments for the dense search (e.g. a metadata filter)
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        dense = self.vector_store.similarity_search(query, k=self.fetch_k, **self.search_kwargs)
+        keyword = self.keyword_index.search(query, k=self.fetch_k)
+        return fuse_rankings(dense, keyword, self.keyword_index, self.k, self.rrf_k)
+
+
+def fuse_rankings(dense: list, keyword: list, keyword_index: BM25Index, k: int, rrf_k: int = 60) -> list[Document]:
+    """ Reciprocal rank fusion of dense results (Documents) and keyword results ((doc id, score) pairs). """
+    scores = Counter()
+    documents = {}
+    for rank, doc in enumerate(dense):
+        doc_id = doc.id or doc.page_content # documents without an ID are matched by their content
+        scores[doc_id] += 1 / (rrf_k + rank + 1)
+        documents[doc_id] = doc
+    for rank, (doc_id, _) in enumerate(keyword):
+        scores[doc_id] += 1 / (rrf_k + rank + 1)
+        if doc_id not in documents:
+            documents[doc_id] = keyword_index.document(doc_id)
+
+    return [documents[doc_id] for doc_id, _ in scores.most_common(k)]
@@ -0,0 +1,326 @@
+# Record / replay of LLM calls ("cassettes") and a scripted fake chat model, so the agents can run offline:
+# for benchmarking the graphs and their tools repeatably, in CI or on a machine without network access.
+#
+#   LLM_CASSETTE_MODE=record    the real model is called and every request / response pair (with the tool calls) is
+#                               appended to the cassette, a JSONL file (LLM_CASSETTE, default Scripts/cassettes/<script>.jsonl)
+#   LLM_CASSETTE_MODE=replay    no model is built at all: the responses are served from the cassette. A request which
+#                               was not recorded raises LookupError. LLM_REPLAY_LATENCY adds a delay per call: a number
+#                               of seconds, or "recorded" for the latency measured while recording (default 0).
+#   LLM_CASSETTE_MODE=scripted  a fake chat model answers with the responses of a script (LLM_SCRIPT, a JSON file
+#                               {"responses": [{"content": ..., "tool_calls": [{"name": ..., "args": {...}}]}, ...]}),
+#                               in order and starting over at the end; used by benchmarks/graph_overhead_benchmark.py.
+#
+# A request is identified by the model name, the messages (type, content and tool calls; not their ids, which are
+# random), the stop words and the bound tools. The same request recorded several times is replayed in the same order.
+# Works for chat models (ChatGroq, ChatOllama, ...) and text LLMs (OllamaLLM).
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Iterator
+
+from langchain_core.language_models import BaseChatModel, LLM
+from langchain_core.messages import AIMessage, AIMessageChunk, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult, GenerationChunk
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+DEFAULT_CASSETTE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cassettes") # Scripts/cassettes/
+
+
+def cassette_mode() -> str:
+    return os.getenv("LLM_CASSETTE_MODE", "").lower() # "", "record", "replay" or "scripted"
+
+
+def _default_cassette_path() -> str:
+    script = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "session"
+    return os.path.join(DEFAULT_CASSETTE_DIR, f"{script}.jsonl")
+
+
+def _replay_latency():
+    value = os.getenv("LLM_REPLAY_LATENCY", "0")
+    return value if value == "recorded" else float(value)
+
+
+def _canonical_message(message) -> dict:
+    """ What identifies a message in a request (ids are left out: they differ from one run to the next). """
+    canonical = {"type": message.type, "content": message.content}
+    if getattr(message, "tool_calls", None):
+        canonical["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in message.tool_calls]
+    return canonical
+
+
+def request_key(model_name: str, prompt, stop=None, **kwargs) -> tuple[str, dict]:
+    """ (hash, request) for a chat request (prompt = list of messages) or a text request (prompt = str). """
+    request = {"model": model_name, "prompt": prompt if isinstance(prompt, str) else [_canonical_message(m) for m in prompt],
+               "stop": stop, "tools": kwargs.get("tools"), "tool_choice": kwargs.get("tool_choice")}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest(), request
+
+
+def _model_name(model) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+class Cassette:
+    """ The recorded interactions of one JSONL file. Recording appends to the file as it goes, so nothing is lost if
+    the script is interrupted. Thread-safe. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.interactions = defaultdict(list) # key -> recorded interactions, in the order they were recorded
+        self.served = defaultdict(int) # key -> how many of them were replayed
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        interaction = json.loads(line)
+                    except ValueError:
+                        continue # a line cut short by an interrupted recording
+                    self.interactions[interaction["key"]].append(interaction)
+
+    def record(self, key: str, request: dict, response: dict, seconds: float):
+        interaction = {"key": key, "request": request, "response": response, "seconds": round(seconds, 4)}
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction) + "\n")
+            self.interactions[key].append(interaction)
+            self.stats["recorded"] += 1
+
+    def play(self, key: str, request: dict) -> dict:
+        """ The next recorded interaction for this request (the last one again once they have all been served). """
+        with self.lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                self.stats["misses"] += 1
+                raise LookupError(f"No recorded response for this {request['model']} request in {self.path} "
+                                  f"(record it first with LLM_CASSETTE_MODE=record)")
+            interaction = recorded[min(self.served[key], len(recorded) - 1)]
+            self.served[key] += 1
+            self.stats["replayed"] += 1
+        return interaction
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def open_cassette(path: str = None) -> Cassette:
+    """ The cassette for this path (LLM_CASSETTE, or one per script), shared by all the models of the process. """
+    path = os.path.abspath(path or os.getenv("LLM_CASSETTE") or _default_cassette_path())
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def _wait(latency, recorded_seconds: float):
+    delay = recorded_seconds if latency == "recorded" else latency
+    if delay:
+        time.sleep(delay)
+
+
+def _message_chunks(message: AIMessage) -> Iterator[ChatGenerationChunk]:
+    """ A whole message as a stream: its words one by one, then a last chunk with the tool calls and token usage. """
+    words = message.content.split(" ") if isinstance(message.content, str) and message.content else []
+    for i, word in enumerate(words):
+        yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word, id=message.id))
+    tool_call_chunks = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                        for i, call in enumerate(message.tool_calls)]
+    yield ChatGenerationChunk(message=AIMessageChunk(content="", id=message.id, tool_call_chunks=tool_call_chunks,
+                                                     usage_metadata=message.usage_metadata))
+
+
+class _ToolBindingMixin:
+    """ bind_tools() the way the hosted models do it: the tools are sent as OpenAI-style schemas. """
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+
+class RecordingChatModel(_ToolBindingMixin, BaseChatModel):
+    """ Calls the wrapped chat model and appends every request / response pair to the cassette. """
+
+    inner: Any
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key, request = request_key(_model_name(self.inner), messages, stop, **kwargs)
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self.cassette.record(key, request, message_to_dict(result.generations[0].message), time.perf_counter() - start)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        key, request = request_key(_model_name(self.inner), messages, stop, **kwargs)
+        start = time.perf_counter()
+        message = None
+        for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+            message = chunk.message if message is None else message + chunk.message
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        if message is not None: # recorded as one whole message (replay streams it again word by word)
+            message = AIMessage(content=message.content, tool_calls=message.tool_calls, id=message.id,
+                                usage_metadata=message.usage_metadata, response_metadata=message.response_metadata)
+            self.cassette.record(key, request, message_to_dict(message), time.perf_counter() - start)
+
+
+class ReplayChatModel(_ToolBindingMixin, BaseChatModel):
+    """ Serves recorded responses from the cassette, after the injected latency. """
+
+    cassette: Any
+    model_name: str
+    latency: Any = 0.0 # seconds per call, or "recorded"
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    def _replay(self, messages, stop, kwargs) -> AIMessage:
+        key, request = request_key(self.model_name, messages, stop, **kwargs)
+        interaction = self.cassette.play(key, request)
+        _wait(self.latency, interaction["seconds"])
+        return messages_from_dict([interaction["response"]])[0]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._replay(messages, stop, kwargs))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for chunk in _message_chunks(self._replay(messages, stop, kwargs)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class ScriptedChatModel(_ToolBindingMixin, BaseChatModel):
+    """ A fake chat model answering with the script's responses in order (starting over at the end), whatever the
+    request. Tool calls get fresh ids, so a script can be repeated any number of times. """
+
+    responses: list
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def _next_message(self) -> AIMessage:
+        index = self.calls # models are called from several threads only by the server, where the order is arbitrary anyway
+        self.calls += 1
+        response = self.responses[index % len(self.responses)]
+        if self.latency:
+            time.sleep(self.latency)
+        tool_calls = [{"name": call["name"], "args": call.get("args", {}), "id": f"call_{index}_{i}"}
+                      for i, call in enumerate(response.get("tool_calls", []))]
+        return AIMessage(content=response.get("content", ""), tool_calls=tool_calls, id=f"scripted-{index}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_message())])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for chunk in _message_chunks(self._next_message()):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class RecordingLLM(LLM):
+    """ Text-completion counterpart of RecordingChatModel (e.g. for OllamaLLM). """
+
+    inner: Any
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-llm"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs) -> str:
+        key, request = request_key(_model_name(self.inner), prompt, stop, **kwargs)
+        start = time.perf_counter()
+        text = self.inner.invoke(prompt, stop=stop, **kwargs)
+        self.cassette.record(key, request, {"text": text}, time.perf_counter() - start)
+        return text
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs) -> Iterator[GenerationChunk]:
+        key, request = request_key(_model_name(self.inner), prompt, stop, **kwargs)
+        start = time.perf_counter()
+        parts = []
+        for token in self.inner.stream(prompt, stop=stop, **kwargs):
+            parts.append(token)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+        self.cassette.record(key, request, {"text": "".join(parts)}, time.perf_counter() - start)
+
+
+class ReplayLLM(LLM):
+    """ Text-completion counterpart of ReplayChatModel. """
+
+    cassette: Any
+    model_name: str
+    latency: Any = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-llm"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs) -> str:
+        key, request = request_key(self.model_name, prompt, stop, **kwargs)
+        interaction = self.cassette.play(key, request)
+        _wait(self.latency, interaction["seconds"])
+        return interaction["response"]["text"]
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs) -> Iterator[GenerationChunk]:
+        words = self._call(prompt, stop, **kwargs).split(" ")
+        for i, word in enumerate(words):
+            token = word if i == 0 else " " + word
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+
+
+def load_script(path: str = None) -> list:
+    path = path or os.getenv("LLM_SCRIPT")
+    if not path:
+        raise ValueError("LLM_CASSETTE_MODE=scripted needs LLM_SCRIPT, the path of a JSON script")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["responses"]
+
+
+def offline_model(model_name: str, chat: bool = True):
+    """ The model to use instead of the real one in replay / scripted mode (None otherwise): building it needs no
+    API key and no server. """
+    mode = cassette_mode()
+    if mode == "replay":
+        model_class = ReplayChatModel if chat else ReplayLLM
+        return model_class(cassette=open_cassette(), model_name=model_name, latency=_replay_latency())
+    if mode == "scripted":
+        if not chat:
+            raise ValueError("LLM_CASSETTE_MODE=scripted only works with chat models")
+        latency = _replay_latency()
+        return ScriptedChatModel(responses=load_script(), latency=0.0 if latency == "recorded" else latency)
+    return None
+
+
+def with_cassette(model):
+    """ The model, recording to the cassette / replaced by a replay or scripted model depending on LLM_CASSETTE_MODE
+    (unchanged when it is not set). Works for any langchain chat model / LLM. """
+    mode = cassette_mode()
+    if not mode:
+        return model
+    chat = isinstance(model, BaseChatModel)
+    if mode == "record":
+        return (RecordingChatModel if chat else RecordingLLM)(inner=model, cassette=open_cassette())
+    if mode in ("replay", "scripted"):
+        return offline_model(_model_name(model), chat)
+    raise ValueError(f"Unknown LLM_CASSETTE_MODE {mode!r}, expected record, replay or scripted")
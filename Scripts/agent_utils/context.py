@@ -0,0 +1,86 @@
+# Context assembly for tool-using agents: builds the exact list of messages sent to the LLM on each call.
+# - exactly one system prompt, always first (the state never has to store it)
+# - retrieved chunks which are already present earlier in the conversation are dropped
+# - every tool result is cut to a token budget, and all tool results together to a total budget (newest kept first)
+
+import re
+
+from langchain_core.messages import SystemMessage, ToolMessage
+
+CHUNK_HEADER = re.compile(r"(?m)^Chunk \d+:\n") # the format written by format_chunks()
+
+
+def estimate_tokens(text: str) -> int:
+    """ Rough token count (about 4 characters per token for English text); good enough for budgets and logging. """
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages) -> int:
+    return sum(estimate_tokens(str(m.content)) for m in messages)
+
+
+def format_chunks(texts: list[str]) -> str:
+    """ Formats retrieved chunks for a tool result ("Chunk 1:\\n...", "Chunk 2:\\n...", ...). """
+    return "\n\n".join(f"Chunk {i + 1}:\n{text}\n" for i, text in enumerate(texts))
+
+
+def split_chunks(content: str) -> list[str]:
+    """ Inverse of format_chunks(). Returns [] if the content is not in that format (e.g. an error message). """
+    parts = CHUNK_HEADER.split(content)
+    if len(parts) < 2:
+        return []
+    return [part.strip() for part in parts[1:]]
+
+
+def _fit_to_budget(texts: list[str], budget: int) -> list[str]:
+    """ Keeps whole chunks while they fit in the budget; the first chunk that doesn't fit is truncated. """
+    kept, used = [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if used + tokens <= budget:
+            kept.append(text)
+            used += tokens
+        else:
+            remaining_chars = (budget - used) * 4
+            if remaining_chars > 200: # only worth keeping if a meaningful part of the chunk fits
+                kept.append(text[:remaining_chars] + " [...]")
+            break
+    return kept
+
+
+def assemble_context(system_prompt: str, messages, tool_result_budget: int = 1200, total_tool_budget: int = 4000) -> list:
+    """ Returns the messages to send to the LLM: one system prompt first, de-duplicated and budgeted tool results. """
+    seen = set() # normalized texts of the chunks already in the context
+    assembled = []
+
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            continue # the single system prompt is added at the front below
+
+        if isinstance(message, ToolMessage):
+            chunks = split_chunks(str(message.content))
+            if chunks:
+                new_chunks = []
+                for text in chunks:
+                    key = " ".join(text.split())
+                    if key not in seen:
+                        seen.add(key)
+                        new_chunks.append(text)
+                new_chunks = _fit_to_budget(new_chunks, tool_result_budget)
+                content = format_chunks(new_chunks) if new_chunks else "(The retrieved chunks are already shown earlier in the conversation.)"
+                message = ToolMessage(tool_call_id=message.tool_call_id, name=message.name, content=content)
+        assembled.append(message)
+
+    # total budget for all tool results: the newest results are kept, older ones are replaced by a short note
+    used = 0
+    for i in range(len(assembled) - 1, -1, -1):
+        message = assembled[i]
+        if isinstance(message, ToolMessage):
+            tokens = estimate_tokens(str(message.content))
+            if used + tokens > total_tool_budget:
+                assembled[i] = ToolMessage(tool_call_id=message.tool_call_id, name=message.name,
+                                           content="(Older retrieval results were omitted to stay within the context budget.)")
+            else:
+                used += tokens
+
+    return [SystemMessage(content=system_prompt)] + assembled
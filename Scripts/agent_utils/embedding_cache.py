@@ -0,0 +1,227 @@
+# Persistent embedding cache that can wrap any langchain Embeddings object (OllamaEmbeddings, HuggingFaceEmbeddings, ...).
+# Vectors are stored in one memory-mapped float32 file per model (one fixed-size slot per text) and a small JSON index
+# maps (model name, normalized text hash) -> slot. When the cache is full, the least recently used slot is reused,
+# so the files never grow beyond max_entries vectors.
+# New entries are appended to a journal (index.log, one [key, slot] line each), so a flush costs as much as the entries
+# added since the last one; the whole index (with the LRU order) is only rewritten once the journal has grown as long
+# as the index itself, and at exit.
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "embedding_cache") # Scripts/embedding_cache
+
+
+def normalize_text(text: str) -> str:
+    """ Collapses whitespace, so the same text with different spacing / line breaks hits the same cache entry. """
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """ Embeddings wrapper which only calls the wrapped model for texts it has never embedded before. """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = 200_000, flush_every: int = 64):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.flush_every = flush_every # how many new embeddings to collect before they are written to the journal
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.RLock()
+        self._dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9._-]+", "_", model_name))
+        self._index_path = os.path.join(self._dir, "index.json")
+        self._journal_path = os.path.join(self._dir, "index.log")
+        self._vectors_path = os.path.join(self._dir, "vectors.f32")
+        self._index = OrderedDict() # key -> slot, ordered from least to most recently used
+        self._dim = None
+        self._free_slot = 0 # next never-used slot (slots are only reused once the cache is full)
+        self._vectors = None # the np.memmap, opened lazily
+        self._pending = [] # [key, slot] entries not written to the journal yet
+        self._journal_entries = 0 # entries in the journal since the index was last rewritten
+
+        os.makedirs(self._dir, exist_ok=True)
+        self._load_index()
+        atexit.register(self.close)
+
+    # ---- disk layout ----
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._dim = data["dim"]
+            self._free_slot = data["free_slot"]
+            self._index = OrderedDict(data["entries"]) # saved as a list of [key, slot] pairs in LRU order
+            self._replay_journal()
+            self._open_vectors(max(self._free_slot, 1))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Embedding cache index for {self.model_name} is unreadable ({e}), starting with an empty cache.")
+            self._index, self._dim, self._free_slot = OrderedDict(), None, 0
+
+    def _replay_journal(self):
+        """ Applies the entries appended since the index was last rewritten (a reused slot drops the key it held). """
+        if not os.path.exists(self._journal_path):
+            return
+        key_of_slot = {slot: key for key, slot in self._index.items()}
+        with open(self._journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    key, slot = json.loads(line)
+                except ValueError: # a line cut short by a crash: the entries after it were never completed either
+                    break
+                old_key = key_of_slot.get(slot)
+                if old_key is not None and old_key != key:
+                    self._index.pop(old_key, None)
+                self._index.pop(key, None)
+                self._index[key] = slot # most recently used
+                key_of_slot[slot] = key
+                self._free_slot = max(self._free_slot, slot + 1)
+                self._journal_entries += 1
+
+    def _open_vectors(self, min_slots: int):
+        """ (Re)opens the memory map so that it has room for at least min_slots vectors. The file grows in doubling steps. """
+        row_bytes = self._dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        slots = size // row_bytes
+        if slots < min_slots:
+            slots = min(max(min_slots, 2 * slots, 1024), self.max_entries)
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(slots * row_bytes)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(slots, self._dim))
+
+    def flush(self):
+        """ Writes the new vectors, then appends their entries to the journal (so it never points at unwritten vectors). """
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if not self._pending:
+                return
+            if self._journal_entries + len(self._pending) > max(len(self._index), 1024):
+                self.compact() # the journal would be longer than the index: rewriting the index is cheaper from now on
+                return
+            with open(self._journal_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in self._pending)
+            self._journal_entries += len(self._pending)
+            self._pending = []
+
+    def compact(self):
+        """ Rewrites the whole index (in LRU order) and empties the journal. """
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._dim is None:
+                return
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self._dim, "free_slot": self._free_slot,
+                           "entries": list(self._index.items())}, f)
+            os.replace(tmp_path, self._index_path) # the new index already holds the journal's entries...
+            open(self._journal_path, "w").close() # ... so the journal can be emptied
+            self._journal_entries = 0
+            self._pending = []
+
+    def close(self):
+        """ Called at exit: the index is rewritten once, so the LRU order of this run's hits is kept as well. """
+        if self._pending or self._journal_entries or self.hits:
+            self.compact()
+
+    # ---- cache operations ----
+
+    def _key(self, text: str, kind: str = "doc") -> str:
+        # queries and documents are kept apart, since some models embed them differently
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{normalize_text(text)}".encode("utf-8")).hexdigest()[:32]
+
+    def _get(self, key: str):
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        self._index.move_to_end(key) # mark as most recently used
+        return self._vectors[slot].tolist()
+
+    def _put(self, key: str, vector):
+        if self._dim is None:
+            self._dim = len(vector)
+            self._open_vectors(1)
+            self.compact() # the index file holds the dimension, so it has to exist before the journal is replayed
+        if key in self._index:
+            slot = self._index[key]
+        elif self._free_slot < self.max_entries:
+            slot = self._free_slot
+            self._free_slot += 1
+            if slot >= self._vectors.shape[0]:
+                self._open_vectors(slot + 1)
+        else:
+            _, slot = self._index.popitem(last=False) # evicting the least recently used entry and reusing its slot
+            self.evictions += 1
+        self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+        self._index[key] = slot
+        self._pending.append([key, slot])
+        return self._vectors[slot].tolist() # returning the stored float32 copy, so hits and misses give identical vectors
+
+    # ---- Embeddings interface ----
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(t) for t in texts]
+        results = [None] * len(texts)
+        missing = {} # key -> positions of the texts that need it (the same text can appear more than once)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._get(key)
+                if vector is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    results[i] = vector
+            self.hits += len(texts) - sum(len(p) for p in missing.values())
+            self.misses += sum(len(p) for p in missing.values())
+
+        if missing:
+            # only the texts that are not cached go to the model (outside the lock, so other threads can still read)
+            new_vectors = self.embeddings.embed_documents([texts[p[0]] for p in missing.values()])
+            with self._lock:
+                for (key, positions), vector in zip(missing.items(), new_vectors):
+                    stored = self._put(key, vector)
+                    for i in positions:
+                        results[i] = stored
+                if len(self._pending) >= self.flush_every:
+                    self.flush()
+        return results
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, kind="query")
+        with self._lock:
+            vector = self._get(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            stored = self._put(key, vector)
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+        return stored
+
+    def stats(self) -> dict:
+        """ Hit / miss counters of this cache (since the process started). """
+        total = self.hits + self.misses
+        return {"model": self.model_name, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "entries": len(self._index),
+                "max_entries": self.max_entries, "evictions": self.evictions}
@@ -0,0 +1,144 @@
+# Local fast path for routing a question to an expert ("python" or "general") before asking the LLM.
+# A small logistic regression over hashed word / word-pair / character features (see hashing.py) is trained in a few
+# milliseconds from labelled examples. It answers in well under a millisecond; only when it is not confident enough
+# is the question sent to the LLM classifier. Every decision can be appended to a JSONL log, and the decisions a real
+# Groq model made in that log are used as extra training examples the next time the router is trained (so it improves
+# with use). Decisions of stand-in models (stub server, replayed / scripted cassettes) are logged but never trained on.
+
+import json
+import os
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from agent_utils.hashing import hashed_features
+
+
+def router_features(text: str, dim: int = 2048) -> np.ndarray:
+    """ Dense feature vector: hashed words and word pairs in the first half, hashed character 4-grams of the words
+    (so "dictionary" and "dictionaries" share features) in the second half. """
+    half = dim // 2
+    vector = np.zeros(dim, dtype=np.float32)
+    for bucket, value in hashed_features(text, half).items():
+        vector[bucket] = value
+    grams = {}
+    for word in text.lower().split():
+        padded = f" {word} "
+        for i in range(max(1, len(padded) - 3)):
+            h = zlib.crc32(padded[i:i + 4].encode("utf-8"))
+            grams[half + h % half] = grams.get(half + h % half, 0.0) + 1.0
+    if grams:
+        norm = np.sqrt(sum(v * v for v in grams.values()))
+        for bucket, value in grams.items():
+            vector[bucket] += value / norm
+    return vector
+
+
+class HashedLogisticRouter:
+    """ Binary logistic regression over router_features(); labels[1] is the positive class. """
+
+    def __init__(self, labels: tuple = ("general", "python"), dim: int = 2048):
+        self.labels = labels
+        self.dim = dim
+        self.weights = np.zeros(dim, dtype=np.float32)
+        self.bias = 0.0
+
+    def fit(self, questions: list, labels: list, epochs: int = 200, learning_rate: float = 1.0, l2: float = 1e-3) -> "HashedLogisticRouter":
+        """ Full-batch gradient descent; the L2 penalty keeps the probabilities from becoming overconfident. """
+        x = np.stack([router_features(q, self.dim) for q in questions])
+        y = np.array([self.labels.index(label) for label in labels], dtype=np.float32)
+        for _ in range(epochs):
+            p = 1 / (1 + np.exp(-(x @ self.weights + self.bias)))
+            error = p - y
+            self.weights -= learning_rate * (x.T @ error / len(y) + l2 * self.weights)
+            self.bias -= learning_rate * float(error.mean())
+        return self
+
+    def predict(self, question: str) -> tuple[str, float]:
+        """ (label, confidence), confidence being the probability of the predicted label (0.5 - 1). """
+        p = float(1 / (1 + np.exp(-(router_features(question, self.dim) @ self.weights + self.bias))))
+        return (self.labels[1], p) if p >= 0.5 else (self.labels[0], 1 - p)
+
+
+def load_examples(examples_path: str, log_path: str = None) -> tuple[list, list]:
+    """ The labelled examples, plus the questions a real Groq model classified in earlier runs (from the decision log;
+    entries without an llm_model, or from a stub / cassette, are skipped). """
+    with open(examples_path, "r", encoding="utf-8") as f:
+        examples = json.load(f)["examples"]
+    questions = [e["question"] for e in examples]
+    labels = [e["label"] for e in examples]
+    if log_path and os.path.exists(log_path):
+        seen = set(questions)
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    decision = json.loads(line)
+                except ValueError:
+                    continue # a line cut short by a crash
+                if decision.get("source") != "llm" or not str(decision.get("llm_model", "")).startswith("groq:"):
+                    continue
+                if decision["question"] not in seen:
+                    seen.add(decision["question"])
+                    questions.append(decision["question"])
+                    labels.append(decision["label"])
+    return questions, labels
+
+
+class FastPathRouter:
+    """ Routes with the local classifier when it is confident enough, otherwise with llm_classify(question). """
+
+    def __init__(self, classifier: HashedLogisticRouter, llm_classify, threshold: float = 0.8, log_path: str = None,
+                 llm_model: str = None):
+        self.classifier = classifier
+        self.llm_classify = llm_classify # question -> label
+        self.threshold = threshold
+        self.log_path = log_path # None: decisions are not logged
+        self.llm_model = llm_model # where llm_classify's answers come from (llm_client.answer_source), logged with them
+        self._lock = threading.Lock()
+        self._local_ms = deque(maxlen=10_000)
+        self._llm_ms = deque(maxlen=10_000)
+        self.decisions = 0
+        self.llm_calls = 0
+
+    def route(self, question: str) -> tuple[str, dict]:
+        """ Returns the label and the decision record (also written to the log). """
+        start = time.perf_counter()
+        label, confidence = self.classifier.predict(question)
+        local_ms = 1000 * (time.perf_counter() - start)
+        decision = {"time": time.time(), "question": question, "local_label": label, "confidence": round(confidence, 4),
+                    "local_ms": round(local_ms, 3)}
+
+        if confidence >= self.threshold:
+            decision.update(label=label, source="local")
+        else: # not sure enough: ask the LLM
+            start = time.perf_counter()
+            decision.update(label=self.llm_classify(question), source="llm", llm_model=self.llm_model)
+            decision["llm_ms"] = round(1000 * (time.perf_counter() - start), 1)
+
+        with self._lock:
+            self.decisions += 1
+            self._local_ms.append(local_ms)
+            if decision["source"] == "llm":
+                self.llm_calls += 1
+                self._llm_ms.append(decision["llm_ms"])
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(decision) + "\n")
+        return decision["label"], decision
+
+    def stats(self) -> dict:
+        """ How often the LLM was needed, and the routing latency of both paths. """
+        with self._lock:
+            local_ms, llm_ms = list(self._local_ms), list(self._llm_ms)
+            s = {"decisions": self.decisions, "llm_calls": self.llm_calls,
+                 "llm_call_rate": round(self.llm_calls / self.decisions, 3) if self.decisions else None}
+        if local_ms:
+            s["local_p50_ms"] = round(float(np.percentile(local_ms, 50)), 3)
+            s["local_p95_ms"] = round(float(np.percentile(local_ms, 95)), 3)
+        if llm_ms:
+            s["llm_avg_ms"] = round(float(np.mean(llm_ms)), 1)
+            s["saved_seconds"] = round((self.decisions - self.llm_calls) * s["llm_avg_ms"] / 1000, 2) # at the LLM's average latency
+        return s
@@ -0,0 +1,49 @@
+# Feature hashing for text: a fast, deterministic, dependency-free stand-in for a learned embedding model.
+# Words and word pairs are hashed into a fixed number of buckets (with a random-looking sign, so collisions cancel out
+# instead of adding up). Texts that share words get similar vectors, which is enough for offline benchmarks and tests;
+# it is not a replacement for a real embedding model.
+
+import math
+import zlib
+from collections import Counter
+
+from langchain_core.embeddings import Embeddings
+
+from agent_utils.bm25 import tokenize
+
+
+def hashed_features(text: str, dim: int = 384, bigrams: bool = True) -> dict[int, float]:
+    """ Sparse {bucket: weight} features of a text (log-scaled counts of words and word pairs), L2-normalized. """
+    tokens = tokenize(text)
+    terms = Counter(tokens)
+    if bigrams:
+        terms.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+
+    features = {}
+    for term, count in terms.items():
+        h = zlib.crc32(term.encode("utf-8")) # crc32 instead of hash(): Python's hash() changes from process to process
+        bucket = h % dim
+        sign = 1.0 if (h >> 31) & 1 else -1.0
+        features[bucket] = features.get(bucket, 0.0) + sign * (1 + math.log(count))
+
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {bucket: value / norm for bucket, value in features.items()}
+
+
+class HashingEmbeddings(Embeddings):
+    """ Deterministic local embeddings based on hashed_features(); no model download and no network. """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        for bucket, value in hashed_features(text, self.dim).items():
+            vector[bucket] = value
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
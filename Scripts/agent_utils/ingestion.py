@@ -0,0 +1,386 @@
+# Incremental (idempotent), streaming ingestion into a Chroma collection.
+# A small JSON manifest remembers the hash of every file and every page that was embedded, along with the
+# splitter / embedding settings used. On the next run, unchanged files cost only a hash check, unchanged pages are
+# skipped, changed pages are upserted under stable chunk IDs, and removed pages are deleted from the collection.
+# For tabular sources (e.g. the review CSV) a SQLite row manifest does the same per row, so it scales to millions of rows.
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import resource # only available on Unix; used to report the peak memory of the ingestion
+except ImportError:
+    resource = None
+
+MANIFEST_VERSION = 1 # bump this if the layout of the manifest ever changes (old manifests are then ignored)
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """ Returns the sha256 hash of a file, read in blocks so that large files are not loaded into memory at once. """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """ Returns the sha256 hash of a piece of text (used for page contents). """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source_key: str, page_no: int, chunk_no: int) -> str:
+    """ Stable ID of a chunk: the same page of the same file always maps to the same IDs, so re-ingesting upserts instead of duplicating. """
+    return f"{source_key}:p{page_no}:c{chunk_no}"
+
+
+class IngestionManifest:
+    """ JSON manifest of what has already been embedded into one collection.
+
+    Layout:
+        {"version": 1, "generation": 3, "files": {source_key: {"file_hash": ..., "params": {...}, "pages": {"0": {"hash": ..., "chunk_ids": [...]}}}}}
+    The generation is bumped on every save, so derived indexes (e.g. compressed snapshots) can tell when they are stale.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        self.generation = 0
+        self.is_new = True # True when no (valid) manifest existed on disk yet
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.files = data.get("files", {})
+                    self.generation = data.get("generation", 0)
+                    self.is_new = False
+            except (OSError, ValueError) as e:
+                print(f"Could not read the ingestion manifest ({e}), starting from scratch.")
+
+    def is_fresh(self, source_key: str, digest: str, params: dict) -> bool:
+        """ True if this exact file was already ingested with these exact parameters. """
+        entry = self.files.get(source_key)
+        return entry is not None and entry["file_hash"] == digest and entry["params"] == params
+
+    def tracked_ids(self) -> set:
+        """ All chunk IDs that the manifest knows about (across every file). """
+        ids = set()
+        for entry in self.files.values():
+            for page in entry["pages"].values():
+                ids.update(page["chunk_ids"])
+        return ids
+
+    def save(self):
+        """ Writes the manifest atomically (temporary file + rename), so a crash never leaves a half-written manifest. """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.generation += 1
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "generation": self.generation, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+        self.is_new = False
+
+
+def write_chunks(vector_store, documents: list, ids: list, keyword_index=None):
+    """ Upserts chunks into the vector store (Chroma upserts when the IDs already exist) and the keyword index, if any. """
+    vector_store.add_documents(documents=documents, ids=ids)
+    if keyword_index is not None:
+        keyword_index.add_documents(documents, ids)
+
+
+def delete_chunks(vector_store, ids: list, keyword_index=None):
+    """ Deletes chunks from the vector store and the keyword index, if any. """
+    if not ids:
+        return
+    vector_store.delete(ids=ids)
+    if keyword_index is not None:
+        keyword_index.remove(ids)
+
+
+def save_progress(manifest: IngestionManifest, keyword_index=None, keyword_index_path: str = None):
+    """ Saves the keyword index (if it changed) and then the manifest. The manifest goes last, so it never lists chunks
+    the saved keyword index is missing: after a crash in between, the pages are just ingested again on the next run. """
+    if keyword_index is not None and keyword_index_path and keyword_index.dirty:
+        keyword_index.save(keyword_index_path)
+    manifest.save()
+
+
+def peak_rss_mb():
+    """ Peak resident memory of this process in MB (None where the resource module is not available). """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KB on Linux
+
+
+def remove_untracked(vector_store, manifest: IngestionManifest, keyword_index=None) -> int:
+    """ Deletes chunks which are in the collection but not in the manifest.
+
+    Collections built before the manifest existed were filled with random IDs (and a new copy on every run),
+    so they are cleaned up once, the first time a manifest is created for them.
+    """
+    tracked = manifest.tracked_ids()
+    untracked = [i for i in vector_store.get(include=[])["ids"] if i not in tracked]
+    delete_chunks(vector_store, untracked, keyword_index)
+    return len(untracked)
+
+
+def sync_pages(vector_store, manifest: IngestionManifest, source_key: str, digest: str, pages, splitter, params: dict,
+               keyword_index=None, window_pages: int = 16, progress_every: int = 200) -> dict:
+    """ Brings the collection in line with the given pages of one source file and updates its manifest entry.
+
+    pages: iterable of langchain Documents, one per page, in page order. It is consumed lazily: the chunks of at most
+           window_pages changed pages are held (and embedded and written) at a time, so memory stays bounded
+           no matter how long the document is.
+    keyword_index: optional BM25Index which is kept in sync with the collection.
+    Returns a dictionary of counters describing what was done, along with the throughput.
+    """
+    old_entry = manifest.files.get(source_key, {"pages": {}, "params": None})
+    old_pages = old_entry["pages"]
+    reuse = old_entry["params"] == params # if the splitter / embedding settings changed, every page has to be redone
+
+    stats = {"pages_skipped": 0, "pages_upserted": 0, "pages_deleted": 0, "chunks_upserted": 0, "chunks_deleted": 0}
+    new_pages = {}
+    window_docs, window_ids, window_page_count = [], [], 0 # chunks waiting to be embedded and written
+    start = time.perf_counter()
+
+    def flush_window():
+        nonlocal window_docs, window_ids, window_page_count
+        if window_docs:
+            write_chunks(vector_store, window_docs, window_ids, keyword_index)
+        window_docs, window_ids, window_page_count = [], [], 0 # releasing the window before reading further pages
+
+    for page_no, page in enumerate(pages):
+        key = str(page_no)
+        page_digest = text_hash(page.page_content)
+        old_page = old_pages.get(key)
+
+        if reuse and old_page is not None and old_page["hash"] == page_digest:
+            new_pages[key] = old_page # unchanged page: nothing to embed
+            stats["pages_skipped"] += 1
+        else:
+            page.metadata["source_key"] = source_key
+            chunks = splitter.split_documents([page]) # splitting only this page into chunks
+            ids = [chunk_id(source_key, page_no, i) for i in range(len(chunks))]
+            window_docs.extend(chunks)
+            window_ids.extend(ids)
+            window_page_count += 1
+
+            new_ids = set(ids)
+            stale = [i for i in (old_page or {}).get("chunk_ids", []) if i not in new_ids] # page got shorter -> fewer chunks than before
+            delete_chunks(vector_store, stale, keyword_index)
+
+            new_pages[key] = {"hash": page_digest, "chunk_ids": ids}
+            stats["pages_upserted"] += 1
+            stats["chunks_upserted"] += len(ids)
+            stats["chunks_deleted"] += len(stale)
+
+            if window_page_count >= window_pages:
+                flush_window()
+
+        if progress_every and (page_no + 1) % progress_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"  {source_key}: {page_no + 1} pages read, {stats['chunks_upserted']} chunks written "
+                  f"({(page_no + 1) / elapsed:.1f} pages/s, {stats['chunks_upserted'] / elapsed:.1f} chunks/s)")
+
+    flush_window()
+
+    # pages that no longer exist in the file (the document got shorter)
+    removed = [i for key, page in old_pages.items() if key not in new_pages for i in page["chunk_ids"]]
+    delete_chunks(vector_store, removed, keyword_index)
+    stats["pages_deleted"] = sum(1 for key in old_pages if key not in new_pages)
+    stats["chunks_deleted"] += len(removed)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    stats["pages_per_s"] = round(len(new_pages) / elapsed, 1)
+    stats["chunks_per_s"] = round(stats["chunks_upserted"] / elapsed, 1)
+    stats["peak_rss_mb"] = peak_rss_mb()
+
+    manifest.files[source_key] = {"file_hash": digest, "params": params, "pages": new_pages}
+    return stats
+
+
+def sync_pdf(pdf_path: str, vector_store, manifest: IngestionManifest, splitter, params: dict, source_key: str = None,
+             keyword_index=None, window_pages: int = 16, keyword_index_path: str = None) -> dict:
+    """ Incrementally ingests one PDF. If neither the file nor the parameters changed, only the file hash is computed.
+    Pages are read lazily and embedded window_pages at a time (see sync_pages). With keyword_index_path, the keyword
+    index is saved together with the manifest (see save_progress). """
+    from langchain_community.document_loaders import PyPDFLoader # imported here so that the manifest helpers don't need it
+
+    source_key = source_key or os.path.basename(pdf_path)
+    digest = file_hash(pdf_path)
+
+    if manifest.is_fresh(source_key, digest, params):
+        return {"up_to_date": True}
+
+    if manifest.is_new:
+        removed = remove_untracked(vector_store, manifest, keyword_index)
+        if removed:
+            print(f"Removed {removed} untracked chunks left over from earlier runs.")
+
+    pages = PyPDFLoader(pdf_path).lazy_load() # a generator: pages are parsed one at a time, never all at once
+    stats = sync_pages(vector_store, manifest, source_key, digest, pages, splitter, params, keyword_index, window_pages)
+    save_progress(manifest, keyword_index, keyword_index_path)
+    return stats
+
+
+def extract_pdf_pages(pdf_path: str) -> list[tuple[str, dict]]:
+    """ Parses a PDF into (page text, page metadata) pairs. Runs in a worker process (PyPDF text extraction is CPU-bound). """
+    from langchain_community.document_loaders import PyPDFLoader
+    return [(page.page_content, page.metadata) for page in PyPDFLoader(pdf_path).lazy_load()]
+
+
+def ingest_directory(folder: str, vector_store, manifest: IngestionManifest, splitter, params: dict, keyword_index=None,
+                     workers: int = None, prune: bool = False, window_pages: int = 16, keyword_index_path: str = None) -> dict:
+    """ Incrementally ingests every PDF under a folder into one collection.
+
+    Unchanged files are skipped after a hash check. The others are parsed in a process pool (at most 2 * workers files
+    in flight, so parsed text doesn't pile up while the main process embeds), and every document's pages are tagged
+    with per-document metadata. A file that fails to parse is reported and skipped; it never aborts the run.
+    With prune=True, files that were ingested before but are no longer in the folder are removed from the collection.
+    With keyword_index_path, the keyword index is saved together with the manifest after every file (see save_progress).
+    """
+    from langchain_core.documents import Document
+
+    workers = workers or os.cpu_count() or 1
+    pdf_paths = sorted(
+        os.path.join(root, name) for root, _, names in os.walk(folder) for name in names if name.lower().endswith(".pdf")
+    )
+    keys = {path: os.path.relpath(path, folder).replace(os.sep, "/") for path in pdf_paths} # source key = path relative to the folder
+
+    totals = {"files": len(pdf_paths), "up_to_date": 0, "ingested": 0, "failed": {}, "pruned": 0, "pages": 0, "chunks_upserted": 0}
+    start = time.perf_counter()
+
+    if manifest.is_new:
+        removed = remove_untracked(vector_store, manifest, keyword_index)
+        if removed:
+            print(f"Removed {removed} untracked chunks left over from earlier runs.")
+
+    # the hash check is cheap, so it is done up front: only new / changed files are parsed at all
+    todo = []
+    for path in pdf_paths:
+        try:
+            digest = file_hash(path)
+        except OSError as e:
+            totals["failed"][keys[path]] = str(e)
+            continue
+        if manifest.is_fresh(keys[path], digest, params):
+            totals["up_to_date"] += 1
+        else:
+            todo.append((path, digest))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queue = list(reversed(todo))
+        while queue or pending:
+            while queue and len(pending) < 2 * workers:
+                path, digest = queue.pop()
+                pending[pool.submit(extract_pdf_pages, path)] = (path, digest)
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, digest = pending.pop(future)
+                key = keys[path]
+                try:
+                    pages = future.result()
+                except Exception as e: # corrupt / encrypted / unreadable PDF
+                    totals["failed"][key] = f"{type(e).__name__}: {e}"
+                    print(f"  skipped {key}: {totals['failed'][key]}")
+                    continue
+
+                documents = []
+                for page_no, (text, metadata) in enumerate(pages):
+                    metadata = {k: v for k, v in metadata.items() if isinstance(v, (str, int, float, bool))} # Chroma only stores scalars
+                    metadata.update({"source": path, "file_name": os.path.basename(path), "page": page_no, "total_pages": len(pages)})
+                    documents.append(Document(page_content=text, metadata=metadata))
+
+                stats = sync_pages(vector_store, manifest, key, digest, documents, splitter, params, keyword_index,
+                                   window_pages=window_pages, progress_every=0)
+                save_progress(manifest, keyword_index, keyword_index_path) # after every file, so an interrupted run keeps its progress
+                totals["ingested"] += 1
+                totals["pages"] += len(pages)
+                totals["chunks_upserted"] += stats["chunks_upserted"]
+                print(f"  {key}: {len(pages)} pages, {stats['chunks_upserted']} chunks upserted, {stats['pages_skipped']} pages unchanged")
+
+    if prune:
+        present = set(keys.values())
+        for key in [k for k in manifest.files if k not in present]:
+            entry = manifest.files.pop(key)
+            delete_chunks(vector_store, [i for page in entry["pages"].values() for i in page["chunk_ids"]], keyword_index)
+            totals["pruned"] += 1
+        save_progress(manifest, keyword_index, keyword_index_path)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    totals["seconds"] = round(elapsed, 2)
+    totals["pages_per_s"] = round(totals["pages"] / elapsed, 1)
+    totals["workers"] = workers
+    return totals
+
+
+class RowManifest:
+    """ SQLite manifest of the rows (id -> content hash) already embedded into one collection.
+
+    Every ingestion run gets a new run number; rows seen during the run are stamped with it, so rows that were
+    not seen at all (deleted from the source) can be found at the end with a single query.
+    The generation only changes when rows were actually written or deleted (see IngestionManifest).
+    """
+
+    def __init__(self, path: str, params: dict):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rows (id TEXT PRIMARY KEY, hash TEXT NOT NULL, run INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        # if the embedding settings changed, every stored hash is meaningless -> forget them all (rows get re-embedded)
+        params_json = json.dumps(params, sort_keys=True)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+        if row is None or row[0] != params_json:
+            self.conn.execute("UPDATE rows SET hash = ''")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('params', ?)", (params_json,))
+
+        self.run = (self.conn.execute("SELECT MAX(run) FROM rows").fetchone()[0] or 0) + 1
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self.generation = int(row[0]) if row else 0
+        self._changed = False
+        self.conn.commit()
+
+    def changed(self, ids: list, hashes: list) -> list:
+        """ Returns the positions of the rows which are new or whose content changed; unchanged rows are stamped as seen. """
+        known = {}
+        for start in range(0, len(ids), 500): # SQLite limits the number of parameters per query
+            part = ids[start:start + 500]
+            marks = ",".join("?" * len(part))
+            known.update(self.conn.execute(f"SELECT id, hash FROM rows WHERE id IN ({marks})", part).fetchall())
+
+        unchanged = [i for i, h in zip(ids, hashes) if known.get(i) == h]
+        self.conn.executemany("UPDATE rows SET run = ? WHERE id = ?", [(self.run, i) for i in unchanged])
+        return [pos for pos, (i, h) in enumerate(zip(ids, hashes)) if known.get(i) != h]
+
+    def mark(self, ids: list, hashes: list):
+        """ Records rows as embedded (call this only after they were written to the vector store). """
+        self.conn.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?)", [(i, h, self.run) for i, h in zip(ids, hashes)])
+        self.conn.commit()
+        self._changed = True
+
+    def unseen(self) -> list:
+        """ IDs of the rows that were not seen during this run, i.e. rows deleted from the source. """
+        return [r[0] for r in self.conn.execute("SELECT id FROM rows WHERE run < ?", (self.run,))]
+
+    def forget(self, ids: list):
+        self.conn.executemany("DELETE FROM rows WHERE id = ?", [(i,) for i in ids])
+        self.conn.commit()
+        self._changed = True
+
+    def close(self):
+        if self._changed:
+            self.generation += 1
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(self.generation),))
+        self.conn.commit()
+        self.conn.close()
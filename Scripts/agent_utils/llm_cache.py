@@ -0,0 +1,146 @@
+# Persistent response cache for chat models, stored in SQLite. It plugs into langchain's standard cache hook
+# (the `cache=` field every chat model / LLM has), so it can be used with ChatGroq, ChatOllama, OllamaLLM, ...
+# langchain passes the cache the serialized messages and an "llm string" holding the model, its parameters and the
+# bound tools' schemas; an entry is keyed by the model name, a hash of the llm string and a hash of the messages.
+# Only deterministic models (temperature 0) should use it: with_response_cache() leaves sampling models uncached.
+# Entries expire after a time-to-live; when the file grows beyond max_bytes, the least recently used entries go.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.sqlite") # Scripts/llm_cache.sqlite
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _model_name(llm_string: str) -> str:
+    """ The model name from langchain's llm string (only stored for the statistics, the hash holds everything). """
+    match = re.search(r"\('(?:model_name|model)', '([^']*)'\)", llm_string)
+    return match.group(1) if match else "unknown"
+
+
+class SQLiteLLMCache(BaseCache):
+    """ langchain BaseCache backed by one SQLite file, with a time-to-live, size-based LRU eviction and statistics. """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: float = 7 * 24 * 3600, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds # 0 = entries never expire
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock() # one connection shared by the threads of a script / server
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+            llm_hash TEXT NOT NULL, messages_hash TEXT NOT NULL, model TEXT NOT NULL, value TEXT NOT NULL,
+            size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (llm_hash, messages_hash))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = (_sha256(llm_string), _sha256(prompt))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created, size FROM responses WHERE llm_hash = ? AND messages_hash = ?", key).fetchone()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE llm_hash = ? AND messages_hash = ?", key)
+                self._conn.commit()
+                self._total_bytes -= row[2]
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE llm_hash = ? AND messages_hash = ?", (now, *key))
+            self._conn.commit()
+            self.hits += 1
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore") # loads() is marked as beta
+                return loads(row[0], allowed_objects="core") # only langchain's own message / generation classes
+        except Exception: # written by an incompatible langchain version: treat as a miss
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        value = dumps(list(return_val))
+        key = (_sha256(llm_string), _sha256(prompt))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE llm_hash = ? AND messages_hash = ?", key).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO responses (llm_hash, messages_hash, model, value, size, created, last_used) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)", (*key, _model_name(llm_string), value, len(value), now, now))
+            self._total_bytes += len(value) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """ Deletes the least recently used entries until the cache is back under 90% of max_bytes. """
+        target = self.max_bytes * 0.9
+        for llm_hash, messages_hash, size in self._conn.execute(
+                "SELECT llm_hash, messages_hash, size FROM responses ORDER BY last_used").fetchall():
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE llm_hash = ? AND messages_hash = ?", (llm_hash, messages_hash))
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """ Hit / miss counts of this process, and the size of the cache file's contents. """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "expired": self.expired, "evictions": self.evictions, "entries": entries,
+                "mb": round(self._total_bytes / 1024 ** 2, 2)}
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_response_cache() -> SQLiteLLMCache:
+    """ The cache used by every model in this process (LLM_CACHE_PATH, LLM_CACHE_TTL seconds, LLM_CACHE_MB). """
+    with _shared_lock:
+        if "cache" not in _shared:
+            _shared["cache"] = SQLiteLLMCache(os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                                              ttl_seconds=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+                                              max_bytes=int(float(os.getenv("LLM_CACHE_MB", "50")) * 1024 * 1024))
+        return _shared["cache"]
+
+
+def is_deterministic(model) -> bool:
+    """ Only models with temperature 0 give the same answer to the same prompt, so only their answers are cached. """
+    temperature = getattr(model, "temperature", None) # None: the provider's default, which samples
+    return temperature is not None and temperature <= 1e-6 # ChatGroq stores 0 as 1e-8
+
+
+def with_response_cache(model, cache: BaseCache = None):
+    """ Returns a copy of the model which uses the response cache, or the model unchanged if it samples
+    (temperature > 0) or LLM_CACHE=0 is set. Works for any langchain chat model / LLM. """
+    if os.getenv("LLM_CACHE", "1") == "0" or not is_deterministic(model):
+        return model
+    return model.model_copy(update={"cache": cache or shared_response_cache()})
@@ -0,0 +1,247 @@
+# One shared way of building the Groq chat models used by the scripts.
+# Every model built here shares pooled HTTP connections (one httpx client for sync calls, one for async calls), and
+# every request goes through a token-bucket limiter for requests and tokens per minute. Requests that fail with 429
+# or 5xx are retried with exponential backoff and jitter, using the server's Retry-After header when it sends one.
+# The limiter only sleeps when a bucket is actually (nearly) empty, so it replaces the fixed time.sleep(2) per turn.
+#
+# Configuration (environment / .env):
+#   GROQ_RPM, GROQ_TPM   - requests / tokens per minute allowed (defaults: Groq's free tier for llama-3.3-70b)
+#   GROQ_MAX_RETRIES     - retries of a 429/5xx response (default 5)
+#   GROQ_API_BASE        - the API URL (read by ChatGroq itself), e.g. http://127.0.0.1:8008 for the stub server
+# Models with temperature 0 also get the persistent response cache (llm_cache.py; LLM_CACHE=0 turns it off).
+# LLM_CASSETTE_MODE records the calls, or replays them / answers from a script without Groq (cassettes.py).
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from langchain_groq import ChatGroq
+
+from agent_utils.cassettes import cassette_mode, offline_model, with_cassette
+from agent_utils.llm_cache import with_response_cache
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value) -> float:
+    """ Seconds of a reset header like "2m59.56s", "7.66s" or "450ms" (None if it cannot be read). """
+    parts = DURATION_PART.findall(str(value or ""))
+    if not parts:
+        return None
+    return sum(float(number) * {"h": 3600, "m": 60, "s": 1, "ms": 0.001}[unit] for number, unit in parts)
+
+
+class TokenBucketLimiter:
+    """ Two token buckets (requests and LLM tokens per minute), refilled continuously, plus the daily request budget
+    the server reports (it is not refilled locally: it is only known from the response headers). Thread-safe. """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.requests = self.request_capacity # both buckets start full
+        self.tokens = self.token_capacity
+        self.updated = time.monotonic()
+        self.daily_requests = None # requests left today according to the server (None until a response said so)
+        self.daily_reset_at = None # monotonic time at which the daily budget is replenished, if the server said
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "waits": 0, "waited_seconds": 0.0, "retries": 0, "retry_seconds": 0.0, "failures": 0}
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60)
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60)
+        self.updated = now
+
+    def reserve(self, tokens: int) -> float:
+        """ Takes one request and `tokens` tokens from the buckets and returns how long the caller has to wait first
+        (0 when there is enough left). The buckets may go negative, which makes the following callers wait longer. """
+        tokens = min(tokens, self.token_capacity) # a request bigger than the bucket would otherwise wait forever
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.requests -= 1
+            self.tokens -= tokens
+            wait = max(0.0, -self.requests * 60 / self.request_capacity, -self.tokens * 60 / self.token_capacity)
+            if self.daily_requests is not None:
+                if self.daily_requests <= 0 and self.daily_reset_at is not None and self.daily_reset_at > now:
+                    wait = max(wait, self.daily_reset_at - now) # the day's budget is used up: wait for its reset
+                self.daily_requests -= 1
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["waits"] += 1
+                self.stats["waited_seconds"] += wait
+            return wait
+
+    def sync_with_headers(self, headers):
+        """ Follows what the server reports as remaining, so other clients using the same API key are accounted for too.
+        Groq's x-ratelimit-remaining-tokens is per minute: it lowers the token bucket. x-ratelimit-remaining-requests is
+        per day, so it only sets the daily budget (with x-ratelimit-reset-requests), never the per-minute bucket. """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            try:
+                self.tokens = min(self.tokens, float(headers["x-ratelimit-remaining-tokens"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+            try:
+                self.daily_requests = float(headers["x-ratelimit-remaining-requests"])
+            except (KeyError, TypeError, ValueError):
+                return
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            self.daily_reset_at = now + reset if reset is not None else None
+
+    def record_retry(self, delay: float):
+        with self.lock:
+            self.stats["retries"] += 1
+            self.stats["retry_seconds"] += delay
+
+    def record_failure(self):
+        with self.lock:
+            self.stats["failures"] += 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            s = dict(self.stats)
+            if self.daily_requests is not None:
+                s["daily_requests_left"] = max(0, int(self.daily_requests))
+        s["waited_seconds"] = round(s["waited_seconds"], 2)
+        s["retry_seconds"] = round(s["retry_seconds"], 2)
+        return s
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """ Rough token cost of a chat completion request: ~4 characters per token of the messages and tools, plus the
+    completion budget (max_tokens, or 256 when unset). Only used for the limiter, so it does not need to be exact. """
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return 1
+    prompt_chars = len(json.dumps(body.get("messages", []))) + len(json.dumps(body.get("tools", [])))
+    return prompt_chars // 4 + int(body.get("max_tokens") or body.get("max_completion_tokens") or 256)
+
+
+def backoff_delay(attempt: int, response: httpx.Response, base: float = 0.5, cap: float = 30.0) -> float:
+    """ The server's Retry-After when it is given, otherwise exponential backoff with full jitter. """
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(cap, float(retry_after)) + random.uniform(0, base)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """ Wraps the pooled HTTP transport: waits for the limiter before every request and retries 429/5xx responses. """
+
+    def __init__(self, limiter: TokenBucketLimiter, max_retries: int = 5, transport: httpx.BaseTransport = None, sleep=time.sleep):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.transport = transport or httpx.HTTPTransport(limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+        self.sleep = sleep
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(tokens)
+            if wait:
+                self.sleep(wait)
+            response = self.transport.handle_request(request)
+            self.limiter.sync_with_headers(response.headers)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.max_retries:
+                self.limiter.record_failure()
+                return response # the groq client raises the matching error
+            delay = backoff_delay(attempt, response)
+            response.close()
+            self.limiter.record_retry(delay)
+            self.sleep(delay)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """ The same as RateLimitedTransport for ainvoke() / astream(); sleeping does not block the event loop. """
+
+    def __init__(self, limiter: TokenBucketLimiter, max_retries: int = 5, transport: httpx.AsyncBaseTransport = None):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.transport = transport or httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            response = await self.transport.handle_async_request(request)
+            self.limiter.sync_with_headers(response.headers)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.max_retries:
+                self.limiter.record_failure()
+                return response
+            delay = backoff_delay(attempt, response)
+            await response.aclose()
+            self.limiter.record_retry(delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> TokenBucketLimiter:
+    """ The limiter shared by every model built with make_groq_llm() in this process (one API key, one budget). """
+    with _shared_lock:
+        if "limiter" not in _shared:
+            _shared["limiter"] = TokenBucketLimiter(float(os.getenv("GROQ_RPM", "30")), float(os.getenv("GROQ_TPM", "12000")))
+        return _shared["limiter"]
+
+
+def _shared_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    limiter = shared_limiter()
+    max_retries = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+    with _shared_lock:
+        if "client" not in _shared:
+            _shared["client"] = httpx.Client(transport=RateLimitedTransport(limiter, max_retries), timeout=60)
+            _shared["async_client"] = httpx.AsyncClient(transport=AsyncRateLimitedTransport(limiter, max_retries), timeout=60)
+        return _shared["client"], _shared["async_client"]
+
+
+def answer_source(model: str) -> str:
+    """ Where the answers of make_groq_llm(model) really come from: "groq:<model>" for the Groq API, otherwise the
+    stand-in ("replay" / "scripted" cassettes, or "stub:<url>" when GROQ_API_BASE points somewhere else). Lets callers
+    keep answers of stand-ins out of anything that learns from LLM output. """
+    mode = cassette_mode()
+    if mode in ("replay", "scripted"):
+        return mode
+    base_url = os.getenv("GROQ_API_BASE")
+    if base_url and "api.groq.com" not in base_url:
+        return f"stub:{base_url}"
+    return f"groq:{model}"
+
+
+def make_groq_llm(model: str = "llama-3.3-70b-versatile", temperature: float = 0.7, **kwargs) -> ChatGroq:
+    """ Builds a ChatGroq that uses the shared connection pool, rate limiter and retry policy (and the response cache
+    when temperature is 0). Extra keyword arguments are passed to ChatGroq (e.g. base_url=... for a stub server). """
+    offline = offline_model(model)
+    if offline is not None: # LLM_CASSETTE_MODE=replay / scripted: no Groq client at all (see cassettes.py)
+        return offline
+    client, async_client = _shared_clients()
+    kwargs.setdefault("api_key", os.getenv("GROQ_API_KEY"))
+    llm = ChatGroq(model=model, temperature=temperature, http_client=client, http_async_client=async_client,
+                   max_retries=0, # retries happen in the transport, so they are not repeated by the groq client
+                   **kwargs)
+    return with_cassette(with_response_cache(llm)) # LLM_CASSETTE_MODE=record: the calls are recorded
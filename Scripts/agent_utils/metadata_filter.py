@@ -0,0 +1,201 @@
+# Metadata pre-filtering for the review retriever (rating and date).
+# A small rule-based parser pulls constraints such as "1-star", "4 stars or more", "March 2024", "before 2024-02" or
+# "on 2024-03-15" out of the question; an in-memory index over the rating / date metadata turns them into the set of matching review
+# IDs, and only those reviews are searched (dense + keyword). Questions without constraints are passed through.
+
+import bisect
+import calendar
+import re
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from agent_utils.bm25 import fuse_rankings
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+
+STAR = r"(?P<stars>[1-5]|one|two|three|four|five)[- ]?stars?"
+RATING_PATTERNS = [ # (pattern, comparison); the first matching pattern wins
+    (re.compile(rf"\b(?:at least|minimum of|min\.?) {STAR}", re.I), ">="),
+    (re.compile(rf"\b{STAR} (?:or|and) (?:more|above|higher|up|better)\b", re.I), ">="),
+    (re.compile(rf"\b{STAR}\+", re.I), ">="),
+    (re.compile(rf"\b(?:at most|maximum of|max\.?) {STAR}", re.I), "<="),
+    (re.compile(rf"\b{STAR} (?:or|and) (?:less|fewer|below|lower|under|worse)\b", re.I), "<="),
+    (re.compile(rf"\b(?:below|under|less than|fewer than|lower than) {STAR}", re.I), "<"),
+    (re.compile(rf"\b(?:above|over|more than|higher than) {STAR}", re.I), ">"),
+    (re.compile(rf"\b{STAR}", re.I), "=="),
+    (re.compile(r"\brated (?:a )?(?P<stars>[1-5])\b", re.I), "=="),
+]
+
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+DATE_PREFIX = r"(?:(?P<prefix>since|after|before|until|till|prior to)\s+)?"
+DATE_PATTERNS = [ # patterns producing a (first day, last day) period; a full date is a one-day period
+    re.compile(rf"\b{DATE_PREFIX}(?:on\s+)?(?P<year>(?:19|20)\d\d)-(?P<month_number>0[1-9]|1[0-2])-(?P<day>0[1-9]|[12]\d|3[01])\b", re.I),
+    re.compile(rf"\b{DATE_PREFIX}(?:in\s+)?(?P<month>{MONTH_NAMES})\.?,?\s+(?P<year>(?:19|20)\d\d)\b", re.I),
+    re.compile(rf"\b{DATE_PREFIX}(?:in\s+)?(?P<year>(?:19|20)\d\d)-(?P<month_number>0[1-9]|1[0-2])\b(?!-\d)", re.I),
+    re.compile(rf"\b{DATE_PREFIX}(?:in\s+)?(?P<year>(?:19|20)\d\d)\b(?!-)", re.I),
+]
+
+
+def _stars(value: str) -> int:
+    return NUMBER_WORDS.get(value.lower()) or int(value)
+
+
+def parse_constraints(question: str) -> tuple[dict, str]:
+    """ Returns ({"rating_min", "rating_max", "date_from", "date_to"} - only the keys that were found, inclusive bounds,
+    dates as "YYYY-MM-DD" strings), and the question with the matched phrases removed (for the semantic search). """
+    constraints = {}
+    text = question
+
+    for pattern, comparison in RATING_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            stars = _stars(match.group("stars"))
+            low, high = {"==": (stars, stars), ">=": (stars, 5), "<=": (1, stars), "<": (1, stars - 1), ">": (stars + 1, 5)}[comparison]
+            constraints["rating_min"], constraints["rating_max"] = low, high
+            text = text[:match.start()] + text[match.end():]
+            break
+
+    for pattern in DATE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        year = int(match.group("year"))
+        month_name = match.groupdict().get("month")
+        month_number = match.groupdict().get("month_number")
+        month = MONTHS[month_name.lower()] if month_name else int(month_number) if month_number else None
+        day = match.groupdict().get("day")
+        if day:
+            try:
+                first = last = date(year, month, int(day))
+            except ValueError: # e.g. 2024-02-30: no date constraint
+                continue
+        elif month:
+            first, last = date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+        else:
+            first, last = date(year, 1, 1), date(year, 12, 31)
+
+        prefix = (match.group("prefix") or "").lower()
+        if prefix == "since": # "from March 2024" is read as "in March 2024", like a bare period
+            constraints["date_from"] = first.isoformat()
+        elif prefix == "after":
+            constraints["date_from"] = (last + timedelta(days=1)).isoformat()
+        elif prefix in ("until", "till"):
+            constraints["date_to"] = last.isoformat()
+        elif prefix in ("before", "prior to"):
+            constraints["date_to"] = (first - timedelta(days=1)).isoformat()
+        else:
+            constraints["date_from"], constraints["date_to"] = first.isoformat(), last.isoformat()
+        text = text[:match.start()] + text[match.end():]
+        break
+
+    return constraints, " ".join(text.split())
+
+
+class MetadataIndex:
+    """ In-memory index over the rating and date metadata: rating -> set of IDs, and IDs sorted by date. """
+
+    def __init__(self):
+        self.by_rating = {}
+        self.dates = [] # sorted "YYYY-MM-DD" strings
+        self.date_ids = [] # the ID of the document with dates[i]
+
+    def __len__(self):
+        return len(self.date_ids)
+
+    @classmethod
+    def from_keyword_index(cls, keyword_index) -> "MetadataIndex":
+        """ Builds the index from the metadata a BM25Index already holds in memory (no extra reads from Chroma). """
+        index = cls()
+        dated = []
+        for doc_id, (_, metadata) in list(keyword_index.docs.items()):
+            if metadata.get("rating") is not None:
+                index.by_rating.setdefault(int(metadata["rating"]), set()).add(doc_id)
+            if metadata.get("date"):
+                dated.append((str(metadata["date"])[:10], doc_id))
+        dated.sort()
+        index.dates = [d for d, _ in dated]
+        index.date_ids = [i for _, i in dated]
+        return index
+
+    def candidates(self, constraints: dict) -> set:
+        """ IDs of the documents matching every constraint. """
+        result = None
+        if "rating_min" in constraints:
+            result = set()
+            for rating in range(constraints["rating_min"], constraints["rating_max"] + 1):
+                result |= self.by_rating.get(rating, set())
+        if "date_from" in constraints or "date_to" in constraints:
+            start = bisect.bisect_left(self.dates, constraints.get("date_from", ""))
+            end = bisect.bisect_right(self.dates, constraints.get("date_to", "~"))
+            in_range = set(self.date_ids[start:end])
+            result = in_range if result is None else result & in_range
+        return result if result is not None else set()
+
+
+class FilteredRetriever(BaseRetriever):
+    """ Searches only the documents matching the rating / date constraints found in the question. """
+
+    retriever: BaseRetriever # used unchanged for questions without constraints
+    vector_store: Any # the dense store of the hybrid search (Chroma, or its IVF / compressed snapshot)
+    keyword_index: Any # BM25Index over the same documents
+    metadata_index: Any # MetadataIndex over the same documents
+    k: int = 5
+    max_filtered_candidates: int = 20_000 # bigger candidate sets are searched normally and filtered afterwards
+    rrf_k: int = 60
+    verbose: bool = True # prints the constraints found and the number of candidates
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"queries": 0, "filtered": 0, "candidates": 0, "filtered_seconds": 0.0})
+
+    def _dense_among(self, query: str, ids: set) -> list[Document]:
+        """ Dense search restricted to the candidate documents, inside the store itself: the IVF / compressed snapshots
+        mask their rows by ID, Chroma (>= 1.0.9) restricts its query to the IDs. """
+        vector = self.vector_store.embeddings.embed_query(query)
+        if hasattr(self.vector_store, "search_among"):
+            return self.vector_store.search_among(vector, self.k * 4, ids)
+        return self.vector_store.similarity_search_by_vector(vector, k=self.k * 4, ids=sorted(ids))
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        constraints, text = parse_constraints(query)
+        with self._lock:
+            self._stats["queries"] += 1
+        if not constraints:
+            return self.retriever.invoke(query)
+
+        start = time.perf_counter()
+        ids = self.metadata_index.candidates(constraints)
+        text = text or query # e.g. the whole question was "1-star reviews"
+        if len(ids) > self.max_filtered_candidates: # most documents match anyway
+            docs = [d for d in self.retriever.invoke(query) if d.id in ids]
+        elif ids:
+            dense = self._dense_among(text, ids)
+            keyword = self.keyword_index.search(text, k=self.k * 4, allowed_ids=ids)
+            docs = fuse_rankings(dense, keyword, self.keyword_index, self.k, self.rrf_k)
+        else:
+            docs = []
+        if self.verbose:
+            print(f"[filter] {constraints} -> {len(ids)} candidate reviews")
+
+        with self._lock:
+            self._stats["filtered"] += 1
+            self._stats["candidates"] += len(ids)
+            self._stats["filtered_seconds"] += time.perf_counter() - start
+        return docs
+
+    def stats(self) -> dict:
+        """ How many questions had constraints, the average candidate set size and the filtered search latency. """
+        with self._lock:
+            s = dict(self._stats)
+        filtered = s["filtered"] or 1
+        s["avg_candidates"] = s.pop("candidates") / filtered
+        s["avg_filtered_ms"] = 1000 * s.pop("filtered_seconds") / filtered
+        return s
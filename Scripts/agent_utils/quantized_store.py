@@ -0,0 +1,246 @@
+# Compressed in-memory search over a Chroma collection.
+# Only small codes are kept in RAM (int8 = 1 byte per dimension, float16 = 2 bytes, instead of 4 for float32);
+# the full-precision vectors stay in a .npy file on disk and are memory-mapped. A query is scored approximately
+# against all codes, and only the best k * rescore_factor candidates are re-scored exactly from the disk vectors.
+# The snapshot is rebuilt from the Chroma collection whenever the ingestion manifest's generation changes.
+#
+# Documents (text + metadata) are still read from Chroma, so this store can replace the dense search of a
+# HybridRetriever without changing anything else.
+
+import json
+import os
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+CODE_DTYPES = ("int8", "float16")
+SCAN_BLOCK_ROWS = 65_536 # codes are converted to float32 block by block, so scoring never needs a full float32 copy
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """ Scales the rows (or a single vector) to unit length, so dot products are cosine similarities. """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def collection_size(vector_store) -> int:
+    return len(vector_store.get(include=[])["ids"])
+
+
+def iter_collection(vector_store, batch_size: int = 5000):
+    """ Yields (ids, float32 vectors) pages of a Chroma collection, so large collections are not loaded at once. """
+    offset = 0
+    while True:
+        page = vector_store.get(limit=batch_size, offset=offset, include=["embeddings"])
+        if not len(page["ids"]):
+            break
+        yield list(page["ids"]), np.asarray(page["embeddings"], dtype=np.float32)
+        offset += len(page["ids"])
+
+
+def reject_kwargs(store: str, kwargs: dict):
+    """ The snapshot stores have no metadata / document filters: arguments like filter= or where_document= are refused
+    instead of being ignored (which would silently return unfiltered results). """
+    if kwargs:
+        raise TypeError(f"{store} does not support {', '.join(sorted(kwargs))}; use the Chroma store "
+                        "(VECTOR_BACKEND=chroma) or a FilteredRetriever to filter the search")
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """ Positions of the k highest scores, best first. """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+class QuantizedVectorStore(VectorStore):
+    """ Read-only vector store with int8 / float16 codes in memory and exact re-scoring (cosine similarity). """
+
+    def __init__(self, embedding: Embeddings, source_store, path_prefix: str, rescore_factor: int = 4):
+        self._embedding = embedding
+        self.source_store = source_store # the Chroma store the snapshot was taken from (documents are read from it)
+        self.rescore_factor = rescore_factor
+        with np.load(path_prefix + ".codes.npz", allow_pickle=False) as data:
+            self.codes = data["codes"]
+            self.scales = data["scales"] # int8: per-dimension scale, so that code * scale / 127 ~ vector
+            self.ids = [str(i) for i in data["ids"]]
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)} # document ID -> snapshot row
+        with open(path_prefix + ".json", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self.code_dtype = self.info["code_dtype"]
+        self.vectors = np.load(path_prefix + ".f32.npy", mmap_mode="r") # full precision, paged in from disk on demand
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---- building the snapshot ----
+
+    @classmethod
+    def build(cls, source_store, embedding: Embeddings, path_prefix: str, code_dtype: str = "int8",
+              version: Any = None, batch_size: int = 5000) -> dict:
+        """ Writes the full-precision vectors to disk and the codes next to them. Returns the snapshot info. """
+        if code_dtype not in CODE_DTYPES:
+            raise ValueError(f"code_dtype must be one of {CODE_DTYPES}, not {code_dtype!r}")
+        n = collection_size(source_store)
+        if not n:
+            raise ValueError("The collection is empty; ingest documents before building a compressed snapshot.")
+        ids, vectors = [], None
+        row = 0
+        for page_ids, page in iter_collection(source_store, batch_size):
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(path_prefix + ".f32.tmp.npy", mode="w+", dtype=np.float32, shape=(n, page.shape[1]))
+            page = page[:n - row] # the collection could grow while it is being read
+            vectors[row:row + len(page)] = normalize(page)
+            ids.extend(page_ids[:len(page)])
+            row += len(page)
+        vectors = vectors[:row] # rows beyond this (if any were deleted while reading) are never referenced
+
+        # second pass over the (disk) vectors: int8 needs the largest absolute value of every dimension first
+        if code_dtype == "int8":
+            scales = np.zeros(vectors.shape[1], dtype=np.float32)
+            for start in range(0, row, SCAN_BLOCK_ROWS):
+                np.maximum(scales, np.abs(vectors[start:start + SCAN_BLOCK_ROWS]).max(axis=0), out=scales)
+            scales[scales == 0] = 1.0
+            codes = np.empty(vectors.shape, dtype=np.int8)
+            for start in range(0, row, SCAN_BLOCK_ROWS):
+                block = vectors[start:start + SCAN_BLOCK_ROWS] / scales * 127
+                codes[start:start + SCAN_BLOCK_ROWS] = np.clip(np.rint(block), -127, 127)
+        else:
+            scales = np.ones(vectors.shape[1], dtype=np.float32)
+            codes = np.asarray(vectors, dtype=np.float16)
+        vectors.flush()
+        del vectors
+
+        # temporary files first, then renamed, so a crash never leaves a half-written snapshot behind
+        np.savez(path_prefix + ".codes.tmp.npz", codes=codes, scales=scales, ids=np.array(ids, dtype=str))
+        info = {"code_dtype": code_dtype, "version": version, "count": row, "dim": int(codes.shape[1])}
+        with open(path_prefix + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(path_prefix + ".f32.tmp.npy", path_prefix + ".f32.npy")
+        os.replace(path_prefix + ".codes.tmp.npz", path_prefix + ".codes.npz")
+        os.replace(path_prefix + ".json.tmp", path_prefix + ".json") # written last: marks the snapshot as complete
+        return info
+
+    @classmethod
+    def load_or_build(cls, source_store, embedding: Embeddings, path_prefix: str, code_dtype: str = "int8",
+                      version: Any = None, rescore_factor: int = 4) -> "QuantizedVectorStore":
+        """ Loads the snapshot if it was built from the same collection version with the same code type, otherwise rebuilds it. """
+        info = None
+        if os.path.exists(path_prefix + ".json"):
+            with open(path_prefix + ".json", encoding="utf-8") as f:
+                info = json.load(f)
+        if info is None or info.get("code_dtype") != code_dtype or info.get("version") != version:
+            print(f"Building the {code_dtype} vector snapshot of the collection...")
+            cls.build(source_store, embedding, path_prefix, code_dtype, version)
+            store = cls(embedding, source_store, path_prefix, rescore_factor)
+            print(f"Snapshot recall against exact float32 search: {store.recall_at_k()}") # measured once per rebuild
+            return store
+        return cls(embedding, source_store, path_prefix, rescore_factor)
+
+    # ---- search ----
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        weights = (query * self.scales / 127).astype(np.float32) if self.code_dtype == "int8" else query
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_BLOCK_ROWS):
+            scores[start:start + SCAN_BLOCK_ROWS] = self.codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32) @ weights
+        return scores
+
+    def search_positions(self, query: np.ndarray, k: int, rescore: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """ Returns (row positions, cosine similarities) of the k best vectors, best first. """
+        if not len(self.ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = normalize(np.asarray(query, dtype=np.float32))
+        scores = self._approximate_scores(query)
+        if not rescore:
+            best = top_k(scores, k)
+            return best, scores[best]
+        candidates = np.sort(top_k(scores, k * self.rescore_factor)) # sorted positions read the memory map sequentially
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        best = top_k(exact, k)
+        return candidates[best], exact[best]
+
+    def search_among(self, embedding: list[float], k: int, allowed_ids) -> list[Document]:
+        """ Search restricted to the given document IDs: their codes are scored, the best k * rescore_factor re-scored exactly. """
+        positions = np.array(sorted(self.positions[i] for i in allowed_ids if i in self.positions), dtype=np.int64)
+        if not len(positions):
+            return []
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+        weights = (query * self.scales / 127).astype(np.float32) if self.code_dtype == "int8" else query
+        scores = self.codes[positions].astype(np.float32) @ weights
+        candidates = positions[np.sort(top_k(scores, k * self.rescore_factor))]
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        return self._documents(candidates[top_k(exact, k)])
+
+    def _documents(self, positions) -> list[Document]:
+        ids = [self.ids[p] for p in positions]
+        by_id = {doc.id: doc for doc in self.source_store.get_by_ids(ids)}
+        return [by_id[i] for i in ids if i in by_id] # an id can be missing if it was deleted after the snapshot was taken
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float], k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        reject_kwargs(type(self).__name__, kwargs)
+        positions, scores = self.search_positions(np.asarray(embedding), k)
+        score_of = {self.ids[p]: float(s) for p, s in zip(positions, scores)}
+        return [(doc, score_of[doc.id]) for doc in self._documents(positions)]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        reject_kwargs(type(self).__name__, kwargs) # before the query is embedded
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score # scores already are cosine similarities
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise TypeError("QuantizedVectorStore is a snapshot of a Chroma collection and cannot be built from texts: add them "
+                        "to the Chroma store, then use QuantizedVectorStore.load_or_build(chroma_store, embedding, path_prefix).")
+
+    # ---- reporting ----
+
+    def memory_report(self) -> dict:
+        """ Bytes held in RAM for the codes compared to keeping every vector in float32. """
+        float32_bytes = self.codes.size * 4
+        code_bytes = self.codes.nbytes + self.scales.nbytes
+        return {"vectors": len(self.ids), "code_dtype": self.code_dtype,
+                "in_memory_mb": round(code_bytes / 1e6, 2), "float32_mb": round(float32_bytes / 1e6, 2),
+                "saved_mb": round((float32_bytes - code_bytes) / 1e6, 2),
+                "saved_pct": round(100 * (1 - code_bytes / float32_bytes), 1) if float32_bytes else 0.0}
+
+    def recall_at_k(self, queries: Optional[np.ndarray] = None, k: int = 10, n_queries: int = 100, seed: int = 0) -> dict:
+        """ Recall@k of the approximate search (with and without re-scoring) against exact float32 search.
+        Without queries, pseudo-queries are made by averaging random pairs of stored vectors. """
+        if not len(self.ids):
+            return {"k": k, "queries": 0}
+        if queries is None:
+            rng = np.random.default_rng(seed)
+            pairs = rng.integers(0, len(self.ids), size=(n_queries, 2))
+            queries = np.asarray(self.vectors[pairs[:, 0]]) + np.asarray(self.vectors[pairs[:, 1]])
+        queries = normalize(np.asarray(queries, dtype=np.float32))
+
+        hits = {"approximate": 0, "rescored": 0}
+        for query in queries:
+            exact = np.empty(len(self.ids), dtype=np.float32)
+            for start in range(0, len(self.ids), SCAN_BLOCK_ROWS):
+                exact[start:start + SCAN_BLOCK_ROWS] = np.asarray(self.vectors[start:start + SCAN_BLOCK_ROWS]) @ query
+            truth = set(top_k(exact, k).tolist())
+            hits["approximate"] += len(truth & set(self.search_positions(query, k, rescore=False)[0].tolist()))
+            hits["rescored"] += len(truth & set(self.search_positions(query, k)[0].tolist()))
+        total = len(queries) * min(k, len(self.ids))
+        return {"k": k, "queries": len(queries),
+                "recall_approximate": round(hits["approximate"] / total, 4), "recall_rescored": round(hits["rescored"] / total, 4)}
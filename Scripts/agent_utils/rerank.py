@@ -0,0 +1,118 @@
+# Retrieval post-processing: over-fetch candidates, re-rank them with a small cross-encoder (one batched forward
+# pass on the CPU), pick a diverse subset with maximal marginal relevance (MMR), and stop at a relevance threshold
+# instead of always returning a fixed number of chunks. Fewer, better chunks mean shorter prompts and faster answers.
+
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from agent_utils.context import estimate_tokens
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2" # ~22M parameters, fast enough on a CPU
+
+
+class RerankingRetriever(BaseRetriever):
+    """ Re-ranks the candidates of another retriever with a cross-encoder, MMR and a relevance-score cutoff. """
+
+    retriever: BaseRetriever # over-fetching retriever (e.g. a HybridRetriever with k=20) which provides the candidates
+    embeddings: Embeddings # used for the MMR redundancy term (wrap it in CachedEmbeddings: the chunks are cache hits)
+    model_name: str = DEFAULT_CROSS_ENCODER
+    cross_encoder: Any = None # anything with predict(list of (query, text) pairs) -> scores; loaded from model_name if None
+    max_k: int = 4 # at most this many documents are returned
+    min_k: int = 1 # ... and at least this many (if there are candidates at all), even below the threshold
+    score_threshold: float = 0.1 # cross-encoder relevance (0..1) below which documents are dropped
+    mmr_lambda: float = 0.7 # 1 = pure relevance, 0 = pure diversity
+    scores_are_logits: Optional[bool] = None # None: decided once from the model's activation function (see _logits)
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"queries": 0, "candidates": 0, "returned": 0, "tokens": 0,
+                                                        "rerank_seconds": deque(maxlen=10_000)}) # recent latencies for the percentile
+
+    def load(self):
+        """ Loads the cross-encoder (called on the first query otherwise; call it during warm-up to keep it off the query path). """
+        with self._lock:
+            if self.cross_encoder is None:
+                from sentence_transformers import CrossEncoder # slow to import, only needed when re-ranking is used
+                self.cross_encoder = CrossEncoder(self.model_name, device="cpu")
+        return self.cross_encoder
+
+    def _logits(self, model) -> bool:
+        """ Whether the model's predict() returns raw logits. Decided once per model, never from the scores of a batch,
+        so every query's scores are on the same 0..1 scale. sentence-transformers applies the model's activation in
+        predict(): Sigmoid (the default for one label) gives 0..1 scores, Identity leaves logits. """
+        if self.scores_are_logits is not None:
+            return self.scores_are_logits
+        activation = getattr(model, "activation_fn", None) # sentence-transformers >= 4
+        if activation is None:
+            activation = getattr(model, "default_activation_function", None) # older versions
+        return activation is not None and type(activation).__name__ == "Identity"
+
+    def _relevance(self, query: str, docs: list[Document]) -> np.ndarray:
+        model = self.load()
+        scores = np.asarray(model.predict([(query, doc.page_content) for doc in docs], batch_size=len(docs)), dtype=np.float32)
+        if self._logits(model): # raw logits -> 0..1
+            scores = 1 / (1 + np.exp(-scores))
+        return scores
+
+    def _select(self, relevance: np.ndarray, vectors: np.ndarray) -> list[int]:
+        """ Greedy MMR: each step takes the candidate with the best relevance / redundancy trade-off. """
+        selected = []
+        remaining = list(np.argsort(-relevance))
+        similarity = vectors @ vectors.T
+        while remaining and len(selected) < self.max_k:
+            if selected:
+                redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+                mmr = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+                best = remaining[int(np.argmax(mmr))]
+            else:
+                best = remaining[0]
+            if relevance[best] < self.score_threshold and len(selected) >= self.min_k:
+                break # the remaining candidates are ranked by MMR, but none of them is relevant enough
+            selected.append(best)
+            remaining.remove(best)
+        return selected
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        candidates = self.retriever.invoke(query)
+        if not candidates:
+            return []
+
+        start = time.perf_counter()
+        relevance = self._relevance(query, candidates)
+        vectors = np.asarray(self.embeddings.embed_documents([doc.page_content for doc in candidates]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        selected = self._select(relevance, vectors)
+        elapsed = time.perf_counter() - start
+
+        docs = []
+        for i in selected:
+            doc = candidates[i]
+            docs.append(Document(page_content=doc.page_content, id=doc.id,
+                                 metadata={**doc.metadata, "relevance_score": round(float(relevance[i]), 4)}))
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["candidates"] += len(candidates)
+            self._stats["returned"] += len(docs)
+            self._stats["tokens"] += sum(estimate_tokens(doc.page_content) for doc in docs)
+            self._stats["rerank_seconds"].append(elapsed)
+        return docs
+
+    def stats(self) -> dict:
+        """ Average documents / tokens returned per query and the re-ranking latency (cross-encoder + MMR). """
+        with self._lock:
+            s = dict(self._stats)
+            latencies = list(s.pop("rerank_seconds"))
+        queries = s["queries"] or 1
+        s["avg_candidates"] = s.pop("candidates") / queries
+        s["avg_returned"] = s.pop("returned") / queries
+        s["avg_tokens_per_result"] = s.pop("tokens") / queries
+        s["avg_rerank_ms"] = 1000 * sum(latencies) / len(latencies) if latencies else 0.0
+        s["p95_rerank_ms"] = 1000 * float(np.percentile(latencies, 95)) if latencies else 0.0
+        return s
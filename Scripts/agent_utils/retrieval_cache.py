@@ -0,0 +1,137 @@
+# Query-result cache which can sit on top of any langchain retriever.
+# Tier 1 (exact): normalized query text -> documents, LRU with a time-to-live.
+# Tier 2 (semantic): if a new query's embedding is close enough (cosine similarity) to a cached query's embedding,
+# the cached documents are reused. Both tiers are cleared automatically when the collection's version changes.
+# An optional partition function splits the cache: queries with different partitions (e.g. different rating / date
+# constraints) never share results, however similar their embeddings are.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+
+def file_version(*paths: str) -> Callable[[], tuple]:
+    """ Version function based on the modification times of files (e.g. an ingestion manifest): any re-ingestion changes it. """
+    def version():
+        return tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in paths)
+    return version
+
+
+class CachedRetriever(BaseRetriever):
+    """ Retriever wrapper with an exact-match LRU+TTL tier and a semantic (embedding similarity) tier. """
+
+    retriever: BaseRetriever # the retriever doing the real search on a miss
+    embeddings: Embeddings # used for the semantic tier (wrap it in CachedEmbeddings so the inner retriever doesn't re-embed)
+    version_fn: Optional[Callable[[], Any]] = None # returns something that changes whenever the collection changes
+    max_entries: int = 256
+    ttl_seconds: float = 600.0
+    similarity_threshold: float = 0.95 # minimum cosine similarity for a semantic hit
+    partition_fn: Optional[Callable[[str], str]] = None # only queries with the same partition can hit each other's entries
+
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _exact: Any = PrivateAttr(default_factory=OrderedDict) # (partition, normalized query) -> (time stored, documents)
+    _semantic: Any = PrivateAttr(default_factory=OrderedDict) # (partition, normalized query) -> (time stored, unit vector, documents)
+    _version: Any = PrivateAttr(default=None)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0,
+                                                        "miss_seconds": 0.0, "hit_seconds": 0.0})
+
+    def invalidate(self):
+        """ Drops every cached result (called automatically when version_fn's value changes). """
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+            self._stats["invalidations"] += 1
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            if self._version is not None:
+                self.invalidate()
+            self._version = version
+
+    def _lookup_exact(self, key: tuple, now: float):
+        entry = self._exact.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl_seconds:
+            del self._exact[key] # expired
+            return None
+        self._exact.move_to_end(key)
+        return entry[1]
+
+    def _lookup_semantic(self, partition: str, vector: np.ndarray, now: float):
+        best_key, best_score = None, self.similarity_threshold
+        for key, (stored_at, cached_vector, _) in list(self._semantic.items()):
+            if now - stored_at > self.ttl_seconds:
+                del self._semantic[key]
+                continue
+            if key[0] != partition:
+                continue
+            score = float(cached_vector @ vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        self._semantic.move_to_end(best_key)
+        return self._semantic[best_key][2]
+
+    def _store(self, key: tuple, vector: np.ndarray, docs: list, now: float):
+        self._exact[key] = (now, docs)
+        self._semantic[key] = (now, vector, docs)
+        for cache in (self._exact, self._semantic):
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False) # evicting the least recently used query
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        start = time.perf_counter()
+        partition = self.partition_fn(query) if self.partition_fn is not None else ""
+        key = (partition, " ".join(query.lower().split()))
+
+        with self._lock:
+            self._check_version()
+            docs = self._lookup_exact(key, time.time())
+        if docs is not None:
+            self._record("exact_hits", start)
+            return list(docs)
+
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        vector /= (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            docs = self._lookup_semantic(partition, vector, time.time())
+            if docs is not None:
+                self._exact[key] = (time.time(), docs) # the next identical query becomes an exact hit
+        if docs is not None:
+            self._record("semantic_hits", start)
+            return list(docs)
+
+        docs = self.retriever.invoke(query)
+        with self._lock:
+            self._store(key, vector, docs, time.time())
+        self._record("misses", start)
+        return list(docs)
+
+    def _record(self, counter: str, start: float):
+        with self._lock:
+            self._stats[counter] += 1
+            self._stats["miss_seconds" if counter == "misses" else "hit_seconds"] += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        """ Hit rate and an estimate of the retrieval latency saved (average miss latency minus the time spent on hits). """
+        s = dict(self._stats)
+        hits = s["exact_hits"] + s["semantic_hits"]
+        total = hits + s["misses"]
+        avg_miss = s["miss_seconds"] / s["misses"] if s["misses"] else 0.0
+        s["hit_rate"] = hits / total if total else 0.0
+        s["avg_miss_ms"] = 1000 * avg_miss
+        s["latency_saved_ms"] = max(0.0, 1000 * (hits * avg_miss - s["hit_seconds"]))
+        return s
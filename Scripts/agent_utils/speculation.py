@@ -0,0 +1,87 @@
+# Speculative execution for two-step LLM pipelines (rewrite the question, then answer the rewrite).
+# The answer to the *original* question is started at the same time as the rewrite. Once the rewrite is known, a cheap
+# local similarity check decides: if the rewrite still asks the same thing, the speculative answer is kept (the two
+# calls overlapped, so one round trip is saved); otherwise the speculative call is cancelled and the rewrite answered.
+# The speculative call is streamed, so cancelling it closes the HTTP stream and the provider stops generating.
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from agent_utils.hashing import hashed_features
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+
+
+def text_similarity(a: str, b: str) -> float:
+    """ Cosine similarity of the hashed word features of two texts (0 - 1 for typical texts); microseconds, no model. """
+    fa, fb = hashed_features(a, dim=4096, bigrams=False), hashed_features(b, dim=4096, bigrams=False)
+    return max(0.0, sum(value * fb.get(bucket, 0.0) for bucket, value in fa.items()))
+
+
+class SpeculativeCall:
+    """ An LLM call streamed on a background thread, which can be waited for or cancelled. """
+
+    def __init__(self, llm, messages: list):
+        self.cancelled = threading.Event()
+        self.generated_chars = 0 # how much was generated (wasted, if the call ends up cancelled)
+        self.seconds = None
+        self.error = None # the exception, if the call failed
+        self._future = _executor.submit(contextvars.copy_context().run, self._run, llm, messages) # keeps the caller's callbacks (e.g. tracing)
+
+    def _run(self, llm, messages) -> str:
+        start = time.perf_counter()
+        parts = []
+        stream = llm.stream(messages)
+        try:
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    return None
+                parts.append(chunk.content)
+                self.generated_chars += len(chunk.content)
+        finally:
+            stream.close() # on cancellation this closes the HTTP response, so the rest is never generated
+            self.seconds = time.perf_counter() - start
+        return "".join(parts)
+
+    def result(self) -> str:
+        """ The answer, or None if the call was cancelled or failed (then the caller answers without it). """
+        try:
+            return self._future.result()
+        except Exception as e: # e.g. a rate limit or a dropped connection: the speculation is simply lost
+            self.error = e
+            return None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def join(self):
+        """ Waits for the background thread to stop (after cancel(), at the next chunk), so generated_chars and seconds are final. """
+        wait([self._future])
+        self.error = self._future.exception()
+
+
+class SpeculationStats:
+    """ How often the speculative answer was kept, and the end-to-end time saved compared to running serially. """
+
+    def __init__(self):
+        self.turns = 0
+        self.wins = 0
+        self.saved_seconds = 0.0
+        self.wasted_chars = 0
+        self.similarities = []
+
+    def record(self, won: bool, similarity: float, elapsed: float, serial_estimate: float, wasted_chars: int = 0):
+        """ serial_estimate: the time the two calls would have taken one after the other. """
+        self.turns += 1
+        self.wins += int(won)
+        self.saved_seconds += serial_estimate - elapsed
+        self.wasted_chars += wasted_chars
+        self.similarities.append(similarity)
+
+    def summary(self) -> dict:
+        return {"turns": self.turns, "wins": self.wins, "win_rate": round(self.wins / self.turns, 3) if self.turns else None,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "avg_saved_seconds": round(self.saved_seconds / self.turns, 2) if self.turns else None,
+                "wasted_chars": self.wasted_chars}
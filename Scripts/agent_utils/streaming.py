@@ -0,0 +1,78 @@
+# Token streaming for the interactive chat scripts, with per-turn latency measurements.
+# For LangGraph graphs, stream_mode="messages" yields the LLM's tokens as they are generated, even though the nodes
+# call llm.invoke(); tokens are printed immediately, so the user starts reading long before the answer is complete.
+# Every turn records the time-to-first-token (what the user perceives) and the total latency.
+
+import time
+
+from langchain_core.messages import AIMessageChunk
+
+
+class LatencyStats:
+    """ Collects per-turn time-to-first-token and total latency. """
+
+    def __init__(self):
+        self.turns = []
+
+    def record(self, first_token_s, total_s: float) -> dict:
+        timing = {"ttft_s": first_token_s, "total_s": total_s}
+        self.turns.append(timing)
+        ttft = f"{first_token_s:.2f}s" if first_token_s is not None else "n/a"
+        print(f"\n(time-to-first-token: {ttft}, total: {total_s:.2f}s)")
+        return timing
+
+    def summary(self) -> dict:
+        def median(values):
+            values = sorted(v for v in values if v is not None)
+            return round(values[len(values) // 2], 3) if values else None
+        return {"turns": len(self.turns), "median_ttft_s": median(t["ttft_s"] for t in self.turns),
+                "median_total_s": median(t["total_s"] for t in self.turns)}
+
+
+def stream_graph(graph, inputs: dict, headers: dict, stats: LatencyStats, config: dict = None) -> dict:
+    """ Runs the graph, printing the LLM tokens of the nodes in headers (node name -> label printed before its tokens)
+    as they arrive. LLM calls of other nodes (e.g. a router's classification) are not printed. Returns the final state. """
+    start = time.perf_counter()
+    first_token = None
+    current_node = None
+    state = None
+
+    for mode, payload in graph.stream(inputs, config=config, stream_mode=["messages", "values"]):
+        if mode == "values":
+            state = payload # the full state after every step; the last one is the final state
+            continue
+        chunk, metadata = payload
+        node = metadata.get("langgraph_node")
+        if node not in headers or not isinstance(chunk, AIMessageChunk) or not isinstance(chunk.content, str) or not chunk.content:
+            continue # only token chunks are printed (complete messages added to the state were already streamed)
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        if node != current_node:
+            print(f"\n{headers[node]}: ", end="", flush=True)
+            current_node = node
+        print(chunk.content, end="", flush=True)
+
+    print()
+    stats.record(first_token, time.perf_counter() - start)
+    return state
+
+
+def stream_chain(chain, inputs: dict, stats: LatencyStats, header: str = "") -> str:
+    """ Streams a langchain runnable (e.g. prompt | OllamaLLM) and returns the full text. """
+    start = time.perf_counter()
+    first_token = None
+    parts = []
+    if header:
+        print(f"\n{header}: ", end="", flush=True)
+    for chunk in chain.stream(inputs):
+        text = chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+        if not text:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        print(text, end="", flush=True)
+        parts.append(text)
+
+    print()
+    stats.record(first_token, time.perf_counter() - start)
+    return "".join(parts)
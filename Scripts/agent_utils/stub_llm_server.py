@@ -0,0 +1,160 @@
+# A local stand-in for the Groq chat completions API, for testing the LLM client without an API key or network.
+# It answers POST .../chat/completions (plain and streamed) with a short canned answer, and can simulate the failures
+# the client has to handle: its own rate limit (429 + Retry-After), random 503 errors and slow responses.
+#
+# Run it on its own:   python stub_llm_server.py --port 8008 --rpm 20 --error-rate 0.1
+# then point the scripts at it with GROQ_API_BASE=http://127.0.0.1:8008 (and any GROQ_API_KEY).
+
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    """ Options and counters of one stub server. """
+
+    def __init__(self, rpm: int = 0, window: float = 60.0, error_rate: float = 0.0, latency: float = 0.0, seed: int = 0):
+        self.rpm = rpm # requests allowed per window (0 = no limit)
+        self.window_seconds = window # shorter than a minute to test the client quickly
+        self.error_rate = error_rate
+        self.latency = latency # seconds before answering
+        self.random = random.Random(seed)
+        self.window = collections.deque() # arrival times of the accepted requests in the current window
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def admit(self) -> tuple[int, float]:
+        """ Returns (HTTP status, retry-after seconds) for a new request. """
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= self.window_seconds:
+                self.window.popleft()
+            if self.rpm and len(self.window) >= self.rpm:
+                self.counts["429"] += 1
+                return 429, self.window_seconds - (now - self.window[0])
+            if self.random.random() < self.error_rate:
+                self.counts["503"] += 1
+                return 503, 0.0
+            self.window.append(now)
+            self.counts["200"] += 1
+            return 200, 0.0
+
+    def remaining(self) -> tuple[int, float]:
+        """ (requests left, seconds until the window frees a slot), sent like Groq's x-ratelimit-*-requests headers. """
+        with self.lock:
+            if not self.rpm:
+                return 1_000_000, 0.0
+            reset = self.window_seconds - (time.monotonic() - self.window[0]) if self.window else 0.0
+            return max(0, self.rpm - len(self.window)), max(0.0, reset)
+
+
+def _answer(body: dict) -> str:
+    last = next((m.get("content") for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "") or ""
+    return f"Stub answer to: {str(last)[:80]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None # set per server by start_stub_server()
+    protocol_version = "HTTP/1.1" # keep-alive, so connection pooling is exercised
+
+    def log_message(self, format, *args):
+        pass # no access log on the console
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass # the client closed a pooled connection
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        status, retry_after = self.state.admit()
+        remaining, reset = self.state.remaining()
+        limit_headers = {"x-ratelimit-remaining-requests": str(remaining), "x-ratelimit-reset-requests": f"{reset:.2f}s"}
+        if status == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                            {**limit_headers, "retry-after": f"{retry_after:.2f}"})
+            return
+        if status == 503:
+            self._send_json(503, {"error": {"message": "Service unavailable", "type": "internal_server_error"}})
+            return
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        answer = _answer(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4, "completion_tokens": len(answer.split())}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        common = {"id": completion_id, "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            self._send_json(200, {**common, "object": "chat.completion", "usage": usage,
+                                  "choices": [{"index": 0, "finish_reason": "stop",
+                                               "message": {"role": "assistant", "content": answer}}]}, limit_headers)
+            return
+
+        # server-sent events, one word per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in limit_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+            chunk = {**common, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        final = {**common, "object": "chat.completion.chunk", "x_groq": {"usage": usage},
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start_stub_server(port: int = 0, **options) -> tuple[ThreadingHTTPServer, str]:
+    """ Starts a stub server in a background thread. Returns the server (server.state has the counters) and its URL. """
+    state = StubState(**options)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the Groq chat completions API.")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--rpm", type=int, default=0, help="requests per window before answering 429 (0 = no limit)")
+    parser.add_argument("--window", type=float, default=60.0, help="length of the rate limit window in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every answer")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, rpm=args.rpm, window=args.window, error_rate=args.error_rate, latency=args.latency)
+    print(f"Stub LLM server on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"Responses: {dict(server.state.counts)}")
@@ -0,0 +1,128 @@
+# Tool execution node for agents whose tools are (mostly) pure functions, used instead of langgraph's ToolNode.
+# A tool is declared pure with @pure (its result only depends on its arguments and it has no side effects). For the
+# tool calls of one model turn:
+#   - pure calls are looked up in a bounded LRU memo keyed by the tool name and its normalized arguments (the
+#     arguments as canonical JSON: key order and formatting do not matter, values and their types do),
+#   - the pure calls which are not memoized run in parallel on a small thread pool, and their results are memoized,
+#   - other tools run one after the other, in the order the model asked for them, after the pure ones.
+# The results are returned in the order of the tool calls, as ToolMessages like ToolNode returns them (errors included).
+# stats() reports the calls, memo hits and the latency of every tool.
+
+import contextvars
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.messages import ToolMessage
+
+
+def pure(tool):
+    """ Marks a langchain tool as pure (put it above @tool), so its results may be memoized and run in parallel. """
+    tool.metadata = {**(tool.metadata or {}), "pure": True}
+    return tool
+
+
+def is_pure(tool) -> bool:
+    return bool((tool.metadata or {}).get("pure"))
+
+
+def normalized_arguments(args: dict) -> str:
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class PureToolExecutor:
+    """ A graph node (call it with the state) running the tool calls of the last AI message. """
+
+    def __init__(self, tools: list, max_workers: int = 4, memo_size: int = 1024):
+        self.tools = {t.name: t for t in tools}
+        self.memo_size = memo_size
+        self._memo = OrderedDict() # (tool name, normalized arguments) -> ToolMessage, least recently used first
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pure_tools")
+        self._latency_ms = defaultdict(lambda: deque(maxlen=10_000)) # tool name -> latency of its executions
+        self.counts = {"calls": 0, "memo_hits": 0, "parallel_batches": 0, "errors": 0}
+
+    def _run(self, call: dict) -> ToolMessage:
+        """ Runs one tool call; errors are returned to the model, as ToolNode does. """
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return ToolMessage(content=f"Error: {call['name']} is not a valid tool, try one of [{', '.join(self.tools)}].",
+                               name=call["name"], tool_call_id=call["id"], status="error")
+        start = time.perf_counter()
+        try:
+            message = tool.invoke({**call, "type": "tool_call"})
+        except Exception as e:
+            message = ToolMessage(content=f"Error: {e!r}\n Please fix your mistakes.", name=call["name"], tool_call_id=call["id"], status="error")
+        with self._lock:
+            self._latency_ms[call["name"]].append(1000 * (time.perf_counter() - start))
+            self.counts["errors"] += message.status == "error"
+        return message
+
+    def _memo_get(self, key):
+        with self._lock:
+            message = self._memo.get(key)
+            if message is not None:
+                self._memo.move_to_end(key)
+            return message
+
+    def _memo_put(self, key, message: ToolMessage):
+        if message.status == "error": # errors are not remembered (e.g. a tool call with bad arguments)
+            return
+        with self._lock:
+            self._memo[key] = message
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def __call__(self, state: dict) -> dict:
+        calls = state["messages"][-1].tool_calls
+        results = [None] * len(calls)
+        misses = {} # memo key -> indices of the (identical) calls waiting for it
+
+        for i, call in enumerate(calls):
+            tool = self.tools.get(call["name"])
+            if tool is None or not is_pure(tool):
+                continue
+            key = (call["name"], normalized_arguments(call["args"]))
+            cached = self._memo_get(key)
+            if cached is not None:
+                results[i] = cached.model_copy(update={"tool_call_id": call["id"], "id": None})
+                with self._lock:
+                    self.counts["memo_hits"] += 1
+            else:
+                misses.setdefault(key, []).append(i)
+
+        if misses: # the pure calls not memoized yet, in parallel (each distinct call once), with the turn's context
+            with self._lock:
+                self.counts["parallel_batches"] += len(misses) > 1
+                self.counts["memo_hits"] += sum(len(indices) - 1 for indices in misses.values()) # repeats within the turn
+            if len(misses) == 1: # nothing to overlap with: no thread hand-off
+                messages = {key: self._run(calls[indices[0]]) for key, indices in misses.items()}
+            else:
+                jobs = {key: self._pool.submit(contextvars.copy_context().run, self._run, calls[indices[0]]) for key, indices in misses.items()}
+                messages = {key: job.result() for key, job in jobs.items()}
+            for key, message in messages.items():
+                self._memo_put(key, message)
+                for i in misses[key]:
+                    results[i] = message.model_copy(update={"tool_call_id": calls[i]["id"]})
+
+        for i, call in enumerate(calls): # the other tools, in order
+            if results[i] is None:
+                results[i] = self._run(call)
+
+        with self._lock:
+            self.counts["calls"] += len(calls)
+        return {"messages": results}
+
+    def stats(self) -> dict:
+        """ Calls, memo hit rate and the latency of every tool (p50 / p95, for the executions actually run). """
+        with self._lock:
+            s = {**self.counts, "memo_hit_rate": round(self.counts["memo_hits"] / self.counts["calls"], 3) if self.counts["calls"] else None,
+                 "memo_entries": len(self._memo)}
+            latency = {name: list(values) for name, values in self._latency_ms.items()}
+        s["tools"] = {name: {"runs": len(values), "p50_ms": round(float(np.percentile(values, 50)), 3),
+                             "p95_ms": round(float(np.percentile(values, 95)), 3)} for name, values in latency.items() if values}
+        return s
@@ -0,0 +1,246 @@
+# Opt-in per-node tracing for the LangGraph scripts (TRACING=1).
+# A langchain callback handler is passed with the run's config, so nothing in the graphs changes: langgraph reports
+# every node as a chain run, and the LLM and tool runs inside a node are attributed to it through their parent runs.
+# Per node execution it records the wall time, the LLM calls (time, prompt / completion tokens, retries done by the
+# shared Groq client) and the tool calls (time), plus the size of the state the node received. Per graph run it
+# records the total time and the graph overhead (total minus the time spent inside nodes).
+#
+# Every record is appended to a JSONL file (TRACE_PATH, default Scripts/traces/trace.jsonl); at exit a Prometheus
+# text summary with p50 / p95 per node is written next to it (trace.prom). When TRACING is not set, trace_config()
+# returns the config unchanged, so the scripts run exactly as before.
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_TRACE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "traces", "trace.jsonl") # Scripts/traces/
+
+
+def _retries_so_far() -> int:
+    """ Retries done by the shared Groq client so far (0 if it is not used by this script). """
+    try:
+        from agent_utils.llm_client import shared_limiter
+    except ImportError:
+        return 0
+    return shared_limiter().stats["retries"]
+
+
+def _state_bytes(state) -> int:
+    try:
+        return len(json.dumps(state, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _token_usage(response) -> tuple[int, int]:
+    """ (prompt tokens, completion tokens) of an LLMResult, from the message's usage metadata or the provider's llm_output. """
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+    if not prompt and not completion:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return prompt, completion
+
+
+class TraceWriter:
+    """ Appends records to the JSONL file and keeps what the Prometheus summary needs. Shared by all tracers. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.node_seconds = defaultdict(list) # (graph, node) -> wall times
+        self.node_totals = defaultdict(lambda: defaultdict(float)) # (graph, node) -> counter -> total
+        self.run_seconds = defaultdict(list) # graph -> wall times of whole runs
+        self.overhead_seconds = defaultdict(float)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        atexit.register(self.close)
+
+    def write(self, record: dict):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            if record["type"] == "node":
+                key = (record["graph"], record["node"])
+                self.node_seconds[key].append(record["seconds"])
+                for counter in ("llm_calls", "llm_seconds", "prompt_tokens", "completion_tokens", "retries", "tool_calls", "tool_seconds"):
+                    self.node_totals[key][counter] += record[counter]
+            elif record["type"] == "run":
+                self.run_seconds[record["graph"]].append(record["seconds"])
+                self.overhead_seconds[record["graph"]] += record["overhead_seconds"]
+
+    def prometheus(self) -> str:
+        """ Prometheus text exposition format: summaries of node / run wall time, and counters per node. """
+        lines = ["# HELP langgraph_node_seconds Wall time of one node execution.", "# TYPE langgraph_node_seconds summary"]
+        for (graph, node), values in sorted(self.node_seconds.items()):
+            labels = f'graph="{graph}",node="{node}"'
+            for quantile in (0.5, 0.95):
+                lines.append(f'langgraph_node_seconds{{{labels},quantile="{quantile}"}} {np.percentile(values, quantile * 100):.6f}')
+            lines.append(f"langgraph_node_seconds_sum{{{labels}}} {sum(values):.6f}")
+            lines.append(f"langgraph_node_seconds_count{{{labels}}} {len(values)}")
+        for counter, help_text in (("llm_calls", "LLM calls made inside the node."), ("llm_seconds", "Time spent in LLM calls."),
+                                   ("prompt_tokens", "Prompt tokens sent by the node."), ("completion_tokens", "Completion tokens received."),
+                                   ("retries", "Retried LLM requests (429 / 5xx)."), ("tool_calls", "Tool calls made inside the node."),
+                                   ("tool_seconds", "Time spent in tool calls.")):
+            lines += [f"# HELP langgraph_node_{counter}_total {help_text}", f"# TYPE langgraph_node_{counter}_total counter"]
+            for (graph, node), totals in sorted(self.node_totals.items()):
+                lines.append(f'langgraph_node_{counter}_total{{graph="{graph}",node="{node}"}} {totals[counter]:g}')
+        lines += ["# HELP langgraph_run_seconds Wall time of one graph run.", "# TYPE langgraph_run_seconds summary"]
+        for graph, values in sorted(self.run_seconds.items()):
+            for quantile in (0.5, 0.95):
+                lines.append(f'langgraph_run_seconds{{graph="{graph}",quantile="{quantile}"}} {np.percentile(values, quantile * 100):.6f}')
+            lines.append(f'langgraph_run_seconds_sum{{graph="{graph}"}} {sum(values):.6f}')
+            lines.append(f'langgraph_run_seconds_count{{graph="{graph}"}} {len(values)}')
+        lines += ["# HELP langgraph_overhead_seconds_total Run time spent outside the nodes.", "# TYPE langgraph_overhead_seconds_total counter"]
+        for graph, total in sorted(self.overhead_seconds.items()):
+            lines.append(f'langgraph_overhead_seconds_total{{graph="{graph}"}} {total:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.close()
+        if self.node_seconds:
+            prom_path = os.path.splitext(self.path)[0] + ".prom"
+            with open(prom_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            print(f"Trace written to {self.path} (per-node summary: {prom_path})")
+
+
+class GraphTracer(BaseCallbackHandler):
+    """ Callback handler turning langgraph's chain / LLM / tool callbacks into per-node and per-run records. """
+
+    def __init__(self, graph_name: str, writer: TraceWriter):
+        self.graph_name = graph_name
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.parents = {} # run id -> parent run id, for every run seen
+        self.nodes = {} # run id of a node execution -> its record (while it runs)
+        self.runs = {} # run id of a whole graph run -> {"start", "node_seconds"}
+        self.calls = {} # run id of an LLM / tool call -> (node run id, start time, retries so far)
+
+    def _node_of(self, run_id):
+        """ The node execution a run belongs to (its closest ancestor which is a node). """
+        while run_id is not None and run_id not in self.nodes:
+            run_id = self.parents.get(run_id)
+        return run_id
+
+    def _graph_run_of(self, run_id):
+        while run_id is not None and run_id not in self.runs:
+            run_id = self.parents.get(run_id)
+        return run_id
+
+    # ---- graph runs and nodes ----
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        with self.lock:
+            self.parents[run_id] = parent_run_id
+            node = (metadata or {}).get("langgraph_node")
+            if parent_run_id is None:
+                self.runs[run_id] = {"start": time.perf_counter(), "node_seconds": 0.0}
+            elif node is not None and kwargs.get("name") == node and self._node_of(parent_run_id) is None:
+                self.nodes[run_id] = {"type": "node", "graph": self.graph_name, "node": node, "start": time.perf_counter(),
+                                      "run": str(self._graph_run_of(parent_run_id)), "state_bytes": _state_bytes(inputs),
+                                      "llm_calls": 0, "llm_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                                      "retries": 0, "tool_calls": 0, "tool_seconds": 0.0}
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_chain(run_id, error=None)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_chain(run_id, error=error)
+
+    def _end_chain(self, run_id, error):
+        now = time.perf_counter()
+        with self.lock:
+            record = self.nodes.pop(run_id, None)
+            graph_run = self.runs.pop(run_id, None)
+            if record is not None:
+                record["seconds"] = now - record.pop("start")
+                record["error"] = repr(error) if error else None
+                parent_run = self.runs.get(self._graph_run_of(self.parents.get(run_id)))
+                if parent_run is not None:
+                    parent_run["node_seconds"] += record["seconds"]
+            self.parents.pop(run_id, None)
+        if record is not None:
+            self.writer.write(record)
+        if graph_run is not None:
+            seconds = now - graph_run["start"]
+            self.writer.write({"type": "run", "graph": self.graph_name, "run": str(run_id), "seconds": seconds,
+                               "node_seconds": graph_run["node_seconds"],
+                               "overhead_seconds": max(0.0, seconds - graph_run["node_seconds"]), "error": repr(error) if error else None})
+
+    # ---- LLM and tool calls inside the nodes ----
+
+    def _start_call(self, run_id, parent_run_id):
+        with self.lock:
+            self.parents[run_id] = parent_run_id
+            self.calls[run_id] = (self._node_of(parent_run_id), time.perf_counter(), _retries_so_far())
+
+    def _end_call(self, run_id, kind: str, response=None):
+        with self.lock:
+            node_run, start, retries = self.calls.pop(run_id, (None, None, 0))
+            self.parents.pop(run_id, None)
+            record = self.nodes.get(node_run)
+            if record is None or start is None:
+                return
+            record[f"{kind}_calls"] += 1
+            record[f"{kind}_seconds"] += time.perf_counter() - start
+            if kind == "llm":
+                record["retries"] += _retries_so_far() - retries
+                if response is not None:
+                    prompt, completion = _token_usage(response)
+                    record["prompt_tokens"] += prompt
+                    record["completion_tokens"] += completion
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start_call(run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start_call(run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end_call(run_id, "llm", response)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end_call(run_id, "llm")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start_call(run_id, parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end_call(run_id, "tool")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_call(run_id, "tool")
+
+
+_tracers = {}
+_tracers_lock = threading.Lock()
+
+
+def trace_config(graph_name: str, config: dict = None) -> dict:
+    """ The config to run a graph with: unchanged when TRACING is off, otherwise with the graph's tracer added. """
+    if os.getenv("TRACING", "0") != "1":
+        return config
+    with _tracers_lock:
+        if graph_name not in _tracers:
+            if "writer" not in _tracers:
+                _tracers["writer"] = TraceWriter(os.getenv("TRACE_PATH", DEFAULT_TRACE_PATH))
+            _tracers[graph_name] = GraphTracer(graph_name, _tracers["writer"])
+        tracer = _tracers[graph_name]
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [tracer]
+    return config
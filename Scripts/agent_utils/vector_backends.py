@@ -0,0 +1,29 @@
+# Choice of the store used for the dense part of retrieval. Ingestion always writes to Chroma (the source of truth);
+# the other backends are snapshots of the Chroma collection, rebuilt when the ingestion manifest's generation changes.
+#   chroma              - query Chroma directly (default)
+#   chroma + int8/fp16  - compressed codes in memory, exact re-scoring from disk (quantized_store.py)
+#   ivf                 - in-process IVF index over NumPy arrays, no Chroma call per query (ann_index.py)
+
+from agent_utils.ann_index import IVFVectorStore
+from agent_utils.quantized_store import QuantizedVectorStore
+
+BACKENDS = ("chroma", "ivf")
+
+
+def open_dense_store(vector_store, embeddings, path_prefix: str, version, backend: str = "chroma", compressed: str = ""):
+    """ Returns the vector store to search. path_prefix: where snapshots are saved (a suffix is added per backend). """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend == "ivf":
+        if compressed:
+            raise ValueError("COMPRESSED_VECTORS only applies to the chroma backend")
+        store = IVFVectorStore.load_or_build(vector_store, embeddings, path_prefix + "_ivf.npz", version=version)
+        print(f"IVF index: {len(store)} vectors, {len(store.index.centroids)} clusters, nprobe {store.index.nprobe}")
+        return store
+
+    if compressed:
+        store = QuantizedVectorStore.load_or_build(vector_store, embeddings, f"{path_prefix}_{compressed}", compressed, version=version)
+        print(f"Compressed vectors: {store.memory_report()}")
+        return store
+    return vector_store
@@ -0,0 +1,105 @@
+# Offline benchmark of the agent graphs themselves: the LLM is replaced by the scripted fake chat model
+# (agent_utils/cassettes.py, LLM_CASSETTE_MODE=scripted) answering with the tool-call sequences in llm_scripts/,
+# so every run takes the same path through the graph and only the graph and tool overhead is measured.
+# No API key, network or model server is needed (RAG still needs its embedding model and vector store for the tool).
+#
+# Reported per agent: turns/s, p50/p95/p99 turn latency, LLM and tool calls per turn, and the overhead per turn
+# (turn time minus the injected LLM latency). With TRACING=1 the per-node breakdown is traced as well
+# (agent_utils/tracing.py, graphs "bench_<agent>").
+#
+# Usage (from this folder):
+#     python graph_overhead_benchmark.py [--agents react,rag,drafter] [--turns 200] [--llm-latency 0] [--out overhead.json]
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+scripts_dir = os.path.join(script_dir, "..")
+sys.path.append(scripts_dir) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.tracing import trace_config
+from langchain_core.messages import HumanMessage, ToolMessage
+
+# name -> (script, graph to run, user message of every turn)
+AGENTS = {
+    "react": ("Langgraph/AI Agents/ReAct_agent.py", "app", "What is (3 + 4) * 2^5, minus 7 * 2?"),
+    "rag": ("Langgraph/AI Agents/RAG_agent.py", "rag_agent", "What topics does the session cover, and how is volatility defined?"),
+    "drafter": ("Langgraph/AI Agents/Drafter_agent.py", "turn_graph", "Write a note that the meeting moved to Friday."),
+}
+
+
+def import_script(name: str, path: str):
+    """ Imports a script by path (the folder names contain spaces, so they are not importable packages). """
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_agent(name: str, turns: int, llm_latency: float, warm_up_turns: int = 3) -> dict:
+    script, graph_name, question = AGENTS[name]
+    os.environ["LLM_CASSETTE_MODE"] = "scripted" # read when the script builds its model (make_groq_llm)
+    os.environ["LLM_SCRIPT"] = os.path.join(script_dir, "llm_scripts", f"{name}.json")
+    os.environ["LLM_REPLAY_LATENCY"] = str(llm_latency)
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")): # the scripts print every step
+        module = import_script(name, os.path.join(scripts_dir, script))
+        if name == "rag": # the retriever tool needs the index (not timed)
+            module.warm_up()
+            if module.warm_up_error is not None:
+                return {"agent": name, "error": f"the vector store could not be loaded: {module.warm_up_error}"}
+        if name == "drafter": # the document lives in a context variable; files are saved into a temporary folder
+            module.current_document.set({"content": "", "save_dir": tempfile.mkdtemp(prefix="drafter_bench_")})
+
+        graph = getattr(module, graph_name)
+        if not hasattr(graph, "invoke"): # the Drafter's turn_graph is not compiled by the script
+            graph = graph.compile()
+        model = module.llm_ # the ScriptedChatModel (module.llm is it with the tools bound)
+        config = trace_config(f"bench_{name}")
+        for _ in range(warm_up_turns):
+            graph.invoke({"messages": [HumanMessage(content=question)]})
+        seconds, tool_calls = [], 0
+        calls_before = model.calls
+        for _ in range(turns):
+            start = time.perf_counter()
+            result = graph.invoke({"messages": [HumanMessage(content=question)]}, config=config)
+            seconds.append(time.perf_counter() - start)
+            tool_calls += sum(isinstance(m, ToolMessage) for m in result["messages"])
+
+    llm_calls_per_turn = (model.calls - calls_before) / turns
+    ms = 1000 * np.array(seconds)
+    return {"agent": name, "turns": turns, "turns_per_s": round(turns / sum(seconds), 1),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2), "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2), "llm_calls_per_turn": round(llm_calls_per_turn, 2),
+            "tool_calls_per_turn": round(tool_calls / turns, 2),
+            "overhead_ms_per_turn": round(float(ms.mean()) - 1000 * llm_latency * llm_calls_per_turn, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the graph and tool overhead of the agents with a scripted LLM.")
+    parser.add_argument("--agents", default="react,rag,drafter", help="comma-separated, from: " + ", ".join(AGENTS))
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds added to every (fake) LLM call")
+    parser.add_argument("--out", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.agents.split(","):
+        result = run_agent(name, args.turns, args.llm_latency)
+        results.append(result)
+        print(json.dumps(result))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Exercises the shared Groq client (agent_utils/llm_client.py) against the local stub server, without an API key.
+# The stub allows --stub-rpm requests per --window seconds and fails a fraction of requests with 503; the client is
+# configured with a higher limit than the stub, so it runs into 429s and has to back off and retry.
+# Reported: answered / failed requests, wall time, the limiter's waits and retries, and the stub's response counts.
+#
+# Usage (from this folder):
+#     python llm_client_check.py [--requests 40] [--threads 8] [--stub-rpm 10] [--window 2] [--error-rate 0.1] [--stream]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.stub_llm_server import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the shared LLM client's rate limiting and retries against a stub server.")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--stub-rpm", type=int, default=10, help="requests the stub accepts per window")
+    parser.add_argument("--window", type=float, default=2.0, help="the stub's rate limit window in seconds")
+    parser.add_argument("--client-rpm", type=int, default=600, help="the client's GROQ_RPM (set above the stub's rate on purpose)")
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--stream", action="store_true", help="use llm.stream() instead of llm.invoke()")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(rpm=args.stub_rpm, window=args.window, error_rate=args.error_rate)
+    os.environ["GROQ_RPM"] = str(args.client_rpm) # read when the shared limiter is created
+    os.environ.setdefault("GROQ_TPM", "1000000")
+    os.environ["GROQ_MAX_RETRIES"] = "8"
+    from agent_utils.llm_client import make_groq_llm, shared_limiter
+
+    llm = make_groq_llm(api_key="stub", base_url=url)
+
+    def ask(i):
+        question = f"question number {i}"
+        try:
+            if args.stream:
+                return "".join(chunk.content for chunk in llm.stream(question))
+            return llm.invoke(question).content
+        except Exception as e: # raised once the retries are used up
+            return e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(ask, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if isinstance(r, Exception)]
+    wrong = [r for i, r in enumerate(results) if not isinstance(r, Exception) and not r.endswith(f"question number {i}")]
+    print(f"Answered {len(results) - len(failed)}/{len(results)} requests in {elapsed:.2f}s "
+          f"(the stub allows {args.stub_rpm / args.window:.1f} requests/s)")
+    if failed:
+        print(f"Failed: {len(failed)}, e.g. {failed[0]!r}")
+    if wrong:
+        print(f"Unexpected answers: {wrong[:3]}")
+    print(f"Limiter: {shared_limiter().summary()}")
+    print(f"Stub responses: {dict(server.state.counts)}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
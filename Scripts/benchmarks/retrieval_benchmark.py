@@ -0,0 +1,237 @@
+# Offline retrieval benchmark for the two Chroma collections used by the scripts:
+#   reviews - realistic_restaurant_reviews.csv, as indexed by Langchain/vector.py ("restaurant_reviews")
+#   skillx  - SkillX_Quant_Finance_Session1.pdf, as indexed by Langgraph/AI Agents/RAG_agent.py ("skillx_session_info")
+# Both are ingested into a fresh scratch directory with deterministic hashing embeddings (no Ollama, no model download,
+# no network), then the fixed query sets in queries/ are run against every retrieval variant.
+#
+# Reported per suite: ingest throughput, index size on disk, p50/p95/p99 query latency, recall@k and MRR@k,
+# and a head-to-head of Chroma against the in-process IVF index (throughput, overlap of the results, ANN recall).
+# Results are written as JSON, so runs can be compared (--compare previous.json prints the differences).
+# Absolute quality numbers are not comparable with the real embedding models; differences between runs are.
+#
+# Usage (from this folder):
+#     python retrieval_benchmark.py [--suite reviews|skillx|all] [--k 5] [--repeat 5] [--out results.json] [--compare old.json]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.ann_index import IVFVectorStore
+from agent_utils.bm25 import BM25Index, HybridRetriever
+from agent_utils.hashing import HashingEmbeddings
+from agent_utils.ingestion import IngestionManifest, sync_pdf
+from agent_utils.metadata_filter import FilteredRetriever, MetadataIndex
+from agent_utils.quantized_store import QuantizedVectorStore
+
+csv_path = os.path.join(script_dir, "..", "Langchain", "realistic_restaurant_reviews.csv")
+pdf_path = os.path.join(script_dir, "..", "Langgraph", "AI Agents", "SkillX_Quant_Finance_Session1.pdf")
+
+# the same settings as the scripts, so the indexes have the same shape as the real ones
+pdf_chunk_size = 800 # RAG_agent.py
+pdf_chunk_overlap = 150
+review_batch_size = 64 # vector.py
+
+
+def ingest_reviews(vector_store, keyword_index) -> dict:
+    """ Indexes the reviews CSV like vector.py does (same documents and batches), but keyed by row number instead of
+     vector.py's content hash (review_key), because the labels in queries/reviews.json are row numbers. """
+    import pandas as pd
+    from langchain_core.documents import Document
+
+    start = time.perf_counter()
+    rows = 0
+    for df in pd.read_csv(csv_path, chunksize=10_000):
+        documents = [Document(page_content=row["Title"] + "" + row["Review"], metadata={"rating": row["Rating"], "date": row["Date"]},
+                              id=str(rows + i)) for i, (_, row) in enumerate(df.iterrows())]
+        rows += len(df)
+        for start_pos in range(0, len(documents), review_batch_size):
+            batch = documents[start_pos:start_pos + review_batch_size]
+            vector_store.add_documents(documents=batch, ids=[d.id for d in batch])
+            keyword_index.add_documents(batch, [d.id for d in batch])
+    elapsed = time.perf_counter() - start
+    return {"documents": rows, "seconds": round(elapsed, 3), "documents_per_s": round(rows / max(elapsed, 1e-9), 1)}
+
+
+def ingest_skillx(vector_store, keyword_index, workdir: str) -> dict:
+    """ Indexes the PDF exactly like RAG_agent.py does (same splitter settings, same chunk IDs). """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=pdf_chunk_size, chunk_overlap=pdf_chunk_overlap)
+    manifest = IngestionManifest(os.path.join(workdir, "manifest.json"))
+    params = {"chunk_size": pdf_chunk_size, "chunk_overlap": pdf_chunk_overlap, "embedding_model": "hashing"}
+    start = time.perf_counter()
+    stats = sync_pdf(pdf_path, vector_store, manifest, splitter, params, keyword_index=keyword_index)
+    elapsed = time.perf_counter() - start
+    return {"documents": stats["chunks_upserted"], "pages": stats["pages_upserted"], "seconds": round(elapsed, 3),
+            "documents_per_s": round(stats["chunks_upserted"] / max(elapsed, 1e-9), 1),
+            "pages_per_s": round(stats["pages_upserted"] / max(elapsed, 1e-9), 1)}
+
+
+SUITES = {
+    "reviews": {"collection": "restaurant_reviews", "queries": "reviews.json", "ingest": lambda vs, ki, wd: ingest_reviews(vs, ki)},
+    "skillx": {"collection": "skillx_session_info", "queries": "skillx.json", "ingest": ingest_skillx},
+}
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def label_of(doc, label: str):
+    return doc.id if label == "id" else doc.metadata.get(label)
+
+
+def evaluate(search, queries: list, label: str, k: int, repeat: int) -> dict:
+    """ Runs every query `repeat` times through search(query) -> documents; quality is scored on the first run. """
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for item in queries:
+        for run in range(repeat):
+            start = time.perf_counter()
+            docs = search(item["query"])
+            latencies.append(time.perf_counter() - start)
+            if run:
+                continue
+            relevant = set(item["relevant"])
+            labels = [label_of(doc, label) for doc in docs[:k]]
+            recalls.append(len(relevant & set(labels)) / len(relevant))
+            rank = next((i + 1 for i, value in enumerate(labels) if value in relevant), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3),
+            f"recall@{k}": round(float(np.mean(recalls)), 4), f"mrr@{k}": round(float(np.mean(reciprocal_ranks)), 4)}
+
+
+def run_suite(name: str, workdir: str, k: int, repeat: int, embedding_dim: int) -> dict:
+    from langchain_chroma import Chroma
+
+    suite = SUITES[name]
+    with open(os.path.join(script_dir, "queries", suite["queries"]), encoding="utf-8") as f:
+        query_set = json.load(f)
+
+    suite_dir = os.path.join(workdir, name)
+    embeddings = HashingEmbeddings(dim=embedding_dim)
+    vector_store = Chroma(collection_name=suite["collection"], persist_directory=os.path.join(suite_dir, "chroma"),
+                          embedding_function=embeddings)
+    keyword_index = BM25Index()
+    ingest = suite["ingest"](vector_store, keyword_index, suite_dir)
+    keyword_index_path = os.path.join(suite_dir, "bm25.pkl")
+    keyword_index.save(keyword_index_path)
+
+    quantized = QuantizedVectorStore.load_or_build(vector_store, embeddings, os.path.join(suite_dir, "int8"), "int8")
+    ivf_path = os.path.join(suite_dir, "ivf.npz")
+    ivf = IVFVectorStore.load_or_build(vector_store, embeddings, ivf_path)
+    variants = {
+        "dense": lambda q: vector_store.similarity_search(q, k=k),
+        "dense_int8": lambda q: quantized.similarity_search(q, k=k),
+        "dense_ivf": lambda q: ivf.similarity_search(q, k=k),
+        "bm25": lambda q: [keyword_index.document(doc_id) for doc_id, _ in keyword_index.search(q, k=k)],
+        "hybrid": HybridRetriever(vector_store=vector_store, keyword_index=keyword_index, k=k).invoke,
+    }
+    if name == "reviews": # rating / date constraints in the question pre-filter the candidates (as in vector.py)
+        variants["hybrid_filtered"] = FilteredRetriever(
+            retriever=HybridRetriever(vector_store=vector_store, keyword_index=keyword_index, k=k), vector_store=vector_store,
+            keyword_index=keyword_index, metadata_index=MetadataIndex.from_keyword_index(keyword_index), k=k, verbose=False).invoke
+    results = {variant: evaluate(search, query_set["queries"], query_set["label"], k, repeat) for variant, search in variants.items()}
+
+    # head-to-head on the raw vector search (queries embedded beforehand): Chroma one query at a time vs. IVF batched
+    query_vectors = [embeddings.embed_query(item["query"]) for item in query_set["queries"]]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chroma_results = [vector_store.similarity_search_by_vector(v, k=k) for v in query_vectors]
+    chroma_seconds = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ivf_results = ivf.search_vectors(query_vectors, k)
+    ivf_seconds = (time.perf_counter() - start) / repeat
+    agreement = np.mean([len({d.id for d in c} & {d.id for d, _ in i}) / max(len(c), 1) for c, i in zip(chroma_results, ivf_results)])
+    head_to_head = {"chroma_queries_per_s": round(len(query_vectors) / chroma_seconds, 1),
+                    "ivf_batch_queries_per_s": round(len(query_vectors) / ivf_seconds, 1),
+                    f"ivf_overlap_with_chroma@{k}": round(float(agreement), 4),
+                    "ivf_recall_vs_brute_force": ivf.recall_at_k(k=k)["recall"]}
+
+    return {
+        "ingest": ingest,
+        "index_bytes": {"chroma": directory_bytes(os.path.join(suite_dir, "chroma")),
+                        "keyword_index": os.path.getsize(keyword_index_path),
+                        "int8_codes": os.path.getsize(os.path.join(suite_dir, "int8.codes.npz")),
+                        "ivf": os.path.getsize(ivf_path)},
+        "queries": len(query_set["queries"]),
+        "retrieval": results,
+        "ann_head_to_head": head_to_head,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=script_dir, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict):
+    """ Prints the change of every latency / quality number between two result files. """
+    for name, suite in current["suites"].items():
+        old_suite = previous.get("suites", {}).get(name)
+        if old_suite is None:
+            continue
+        print(f"\n{name}: ingest {old_suite['ingest']['documents_per_s']} -> {suite['ingest']['documents_per_s']} documents/s")
+        for variant, metrics in suite["retrieval"].items():
+            old = old_suite["retrieval"].get(variant)
+            if old is None:
+                continue
+            changes = ", ".join(f"{metric} {old[metric]} -> {value}" for metric, value in metrics.items() if metric in old and old[metric] != value)
+            print(f"  {variant}: {changes or 'no change'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark (deterministic embeddings, no network).")
+    parser.add_argument("--suite", choices=[*SUITES, "all"], default="all")
+    parser.add_argument("--k", type=int, default=5, help="number of results scored for recall@k / MRR@k")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every query for the latency percentiles")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--out", default="benchmark_results.json", help="where the JSON results are written")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--workdir", help="scratch directory for the indexes (default: a temporary directory, deleted afterwards)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="retrieval_benchmark_")
+    try:
+        suites = {}
+        for name in (SUITES if args.suite == "all" else [args.suite]):
+            print(f"Running the {name} suite...")
+            suites[name] = run_suite(name, workdir, args.k, args.repeat, args.embedding_dim)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": git_commit(), "python": platform.python_version(),
+                 "embeddings": f"hashing-{args.embedding_dim}", "k": args.k, "repeat": args.repeat},
+        "suites": suites,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(suites, indent=2))
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Offline evaluation of the local router used by Assignment_2/Assn2_Q3.py (agent_utils/fast_router.py).
+# k-fold cross-validation over the labelled examples: for every confidence threshold, the share of questions the
+# local classifier routes by itself (the rest would go to the LLM), its accuracy on those, and the local latency.
+#
+# Usage (from this folder):
+#     python router_benchmark.py [--folds 5] [--thresholds 0.6,0.7,0.8,0.9] [--log ../Langgraph/AI\ Agents/Assignment_2/router_decisions.jsonl]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.fast_router import HashedLogisticRouter, load_examples
+
+examples_path = os.path.join(script_dir, "..", "Langgraph", "AI Agents", "Assignment_2", "router_examples.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate the local question router.")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.9")
+    parser.add_argument("--log", default=None, help="decision log whose LLM labels are added to the examples")
+    args = parser.parse_args()
+
+    questions, labels = load_examples(examples_path, args.log)
+    order = list(range(len(questions)))
+    random.Random(0).shuffle(order)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    predictions = [] # (true label, predicted label, confidence) for every held-out question
+    fit_seconds, predict_ms = [], []
+    for fold in range(args.folds):
+        test = set(order[fold::args.folds])
+        train = [i for i in order if i not in test]
+        start = time.perf_counter()
+        router = HashedLogisticRouter().fit([questions[i] for i in train], [labels[i] for i in train])
+        fit_seconds.append(time.perf_counter() - start)
+        for i in test:
+            start = time.perf_counter()
+            label, confidence = router.predict(questions[i])
+            predict_ms.append(1000 * (time.perf_counter() - start))
+            predictions.append((labels[i], label, confidence))
+
+    print(f"{len(questions)} examples, {args.folds}-fold cross-validation; training {np.mean(fit_seconds) * 1000:.1f} ms, "
+          f"routing p50 {np.percentile(predict_ms, 50):.3f} ms / p95 {np.percentile(predict_ms, 95):.3f} ms")
+    print(f"accuracy without the LLM fallback: {np.mean([t == p for t, p, _ in predictions]):.3f}")
+    for threshold in thresholds:
+        local = [(t, p) for t, p, c in predictions if c >= threshold]
+        accuracy = np.mean([t == p for t, p in local]) if local else float("nan")
+        print(f"threshold {threshold:.2f}: routed locally {len(local) / len(predictions):.0%} "
+              f"(accuracy {accuracy:.3f}), LLM call rate {1 - len(local) / len(predictions):.0%}")
+
+
+if __name__ == "__main__":
+    main()
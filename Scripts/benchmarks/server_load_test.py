@@ -0,0 +1,144 @@
+# Load test of the agent HTTP server (Scripts/server/agent_server.py) against the stub LLM server, so it measures the
+# server itself (sessions, concurrency limit, backpressure) without an API key, network or rate limits.
+# Every simulated user opens a session and sends --turns messages one after the other; --users of them run at once.
+# Reported per agent: sessions/s, turns/s, p50/p95/p99 turn latency, and how many requests were refused (503)
+# or failed. The stub answers after --llm-latency seconds, like a (fast) hosted model would.
+# The router's decisions go to a temporary log, so a run never touches router_decisions.jsonl (the router's training data).
+#
+# Usage (from this folder):
+#     python server_load_test.py [--agents router,react,drafter] [--users 50] [--turns 3] [--max-concurrent 16]
+#                                [--max-queue 64] [--llm-latency 0.2] [--stream] [--out load_results.json]
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, "..")) # so that the shared helpers in Scripts/agent_utils can be imported
+sys.path.append(os.path.join(script_dir, "..", "server"))
+from agent_utils.stub_llm_server import start_stub_server
+
+QUESTIONS = {
+    "router": ["How do Python decorators work?", "Who painted the Mona Lisa?", "What does a list comprehension return?"],
+    "react": ["What is 12 plus 30?", "Multiply 7 by 6 and then add 3.", "What is 2 to the power 10?"],
+    "drafter": ["Write a two-line note that the meeting moved to Friday.", "Make it more formal.", "Save it as note."],
+    "rag": ["What topics does the session cover?", "How is volatility defined?", "What is the Sharpe ratio?"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_agent_server(agent_names: list, max_concurrent: int, max_queue: int):
+    """ Runs the FastAPI app with uvicorn on a background thread; returns its URL once it accepts requests. """
+    import uvicorn
+    from agent_server import create_app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(agent_names, max_concurrent, max_queue), host="127.0.0.1", port=port,
+                                           log_level="warning", limit_concurrency=max_concurrent + max_queue + 1000))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def user_session(client: httpx.AsyncClient, url: str, agent: str, turns: int, stream: bool, results: list):
+    session_id = None
+    for turn in range(turns):
+        body = {"message": QUESTIONS[agent][turn % len(QUESTIONS[agent])], "session_id": session_id}
+        start = time.perf_counter()
+        first_token = None
+        if stream:
+            async with client.stream("POST", f"{url}/agents/{agent}/stream", json=body) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if line.startswith("event: token") and first_token is None:
+                        first_token = time.perf_counter() - start
+                    elif line.startswith("event: error"):
+                        status = 500
+                    elif line.startswith("data: ") and '"session_id"' in line:
+                        session_id = json.loads(line[6:])["session_id"]
+        else:
+            response = await client.post(f"{url}/agents/{agent}/chat", json=body)
+            status = response.status_code
+            if status == 200:
+                session_id = response.json()["session_id"]
+        results.append({"status": status, "seconds": time.perf_counter() - start, "ttft": first_token})
+        if status != 200:
+            return # a refused / failed session stops, like a user who gives up
+
+
+async def run_agent(url: str, agent: str, users: int, turns: int, stream: bool) -> dict:
+    results = []
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user_session(client, url, agent, turns, stream, results) for _ in range(users)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r["seconds"] for r in results if r["status"] == 200]
+    ttft = [r["ttft"] for r in results if r["status"] == 200 and r["ttft"] is not None]
+    completed_sessions = users - sum(r["status"] != 200 for r in results) # one failed turn ends a session
+    report = {"users": users, "turns_per_user": turns, "seconds": round(elapsed, 2),
+              "sessions_per_second": round(completed_sessions / elapsed, 2), "turns_per_second": round(len(ok) / elapsed, 2),
+              "refused_503": sum(r["status"] == 503 for r in results),
+              "failed": sum(r["status"] not in (200, 503) for r in results)}
+    if ok:
+        report.update({f"p{p}_ms": round(1000 * float(np.percentile(ok, p)), 1) for p in (50, 95, 99)})
+    if ttft:
+        report["p50_ttft_ms"] = round(1000 * float(np.percentile(ttft, 50)), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the agent HTTP server against a stub LLM.")
+    parser.add_argument("--agents", default="router,react,drafter", help="rag needs the embedding model and the PDF index")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--max-concurrent", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--stream", action="store_true", help="use the server-sent events endpoint")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    console = sys.stdout
+    sys.stdout = open(os.devnull, "w") # the agents print every step; only the results are shown
+    stub, stub_url = start_stub_server(latency=args.llm_latency)
+    os.environ.update({"GROQ_API_BASE": stub_url, "GROQ_API_KEY": "stub", "GROQ_RPM": "1000000", "GROQ_TPM": "1000000000",
+                       "LLM_CACHE": "0", "STREAMING": "0", # measuring the server, not the cache or the rate limit
+                       "ROUTER_LOG": os.path.join(tempfile.mkdtemp(prefix="load_test_"), "router_decisions.jsonl")})
+    agent_names = args.agents.split(",")
+    server, url = start_agent_server(agent_names, args.max_concurrent, args.max_queue)
+
+    results = {"settings": vars(args), "agents": {}}
+    for agent in agent_names:
+        report = asyncio.run(run_agent(url, agent, args.users, args.turns, args.stream))
+        results["agents"][agent] = report
+        print(f"{agent:8s} {report}", file=console)
+    results["server"] = httpx.get(f"{url}/health").json()
+    results["stub_responses"] = dict(stub.state.counts)
+    print(f"Server: {results['server']}", file=console)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    server.should_exit = True
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
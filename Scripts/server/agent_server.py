@@ -0,0 +1,333 @@
+# Async HTTP front end for the LangGraph agents, so one process can serve many users at the same time.
+# The compiled graphs are imported from the scripts (their input() loops only run when they are started directly),
+# recompiled with a MemorySaver checkpointer, and run with ainvoke / astream. Every session is one checkpointer
+# thread, so each user gets their own conversation history (and, for the Drafter, their own document).
+#
+# Concurrency is bounded: at most SERVER_MAX_CONCURRENT turns run at once, at most SERVER_MAX_QUEUE more wait for a
+# slot, and further requests are refused straight away with 503 + Retry-After instead of piling up (backpressure).
+# A session can only run one turn at a time (a second request for it gets 409).
+# Sessions are bounded too: a session idle for SERVER_SESSION_TTL seconds, or the least recently used one once an agent
+# has more than SERVER_MAX_SESSIONS, is forgotten (its checkpointer thread and, for the Drafter, its document).
+#
+# Endpoints:
+#   POST   /agents/{agent}/chat     {"message": "...", "session_id": optional}  -> {"session_id", "answer", "seconds", ...}
+#   POST   /agents/{agent}/stream   the same, answered as server-sent events (token events, then a "done" event)
+#   DELETE /agents/{agent}/sessions/{session_id}
+#   GET    /health                  the loaded agents, their session counts, running / waiting turns and counters
+#
+# Usage (from this folder):   python agent_server.py [--port 8000] [--agents react,rag,router,drafter]
+
+import argparse
+import asyncio
+import contextvars
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from pydantic import BaseModel
+
+scripts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(scripts_dir) # so that the shared helpers in Scripts/agent_utils can be imported
+from agent_utils.tracing import trace_config
+
+# name -> (script, the StateGraph to compile, the nodes whose LLM output is the answer)
+AGENTS = {
+    "react": ("Langgraph/AI Agents/ReAct_agent.py", "graph", {"agent"}),
+    "rag": ("Langgraph/AI Agents/RAG_agent.py", "graph", {"LLM_agent"}),
+    "router": ("Langgraph/AI Agents/Assignment_2/Assn2_Q3.py", "graph", {"Python Expert", "General Expert"}),
+    "drafter": ("Langgraph/AI Agents/Drafter_agent.py", "turn_graph", {"drafter_agent"}),
+}
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: str | None = None
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionControl:
+    """ A semaphore for the running turns, plus a bound on how many requests may wait for it. """
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.waiting = 0
+        self.counts = {"completed": 0, "rejected": 0, "failed": 0, "timed_out": 0}
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            self.counts["rejected"] += 1
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+
+class LoadedAgent:
+    """ One script's graph, compiled with its own checkpointer, and the per-session state kept next to it. """
+
+    def __init__(self, name: str, script: str, graph_name: str, answer_nodes: set):
+        self.name = name
+        self.answer_nodes = answer_nodes
+        self.module = _import_script(name, os.path.join(scripts_dir, script))
+        self.checkpointer = MemorySaver()
+        self.app = getattr(self.module, graph_name).compile(checkpointer=self.checkpointer)
+        self.busy = set() # sessions with a turn in progress
+        self.last_used = OrderedDict() # session_id -> time of its last turn, least recently used first
+        self.documents = {} # Drafter only: session_id -> that session's document
+        self.save_dir = tempfile.mkdtemp(prefix="drafter_sessions_") if name == "drafter" else None
+
+    def context(self, session_id: str) -> contextvars.Context:
+        """ The context the turn runs in; the Drafter's tools find the session's document through it. """
+        context = contextvars.copy_context()
+        document_var = getattr(self.module, "current_document", None)
+        if document_var is not None:
+            document = self.documents.setdefault(session_id, {"content": "", "save_dir": os.path.join(self.save_dir, session_id)})
+            os.makedirs(document["save_dir"], exist_ok=True)
+            context.run(document_var.set, document)
+        return context
+
+    def touch(self, session_id: str):
+        self.last_used[session_id] = time.monotonic()
+        self.last_used.move_to_end(session_id)
+
+    def forget(self, session_id: str):
+        self.checkpointer.delete_thread(session_id)
+        self.last_used.pop(session_id, None)
+        document = self.documents.pop(session_id, None)
+        if document is not None:
+            shutil.rmtree(document["save_dir"], ignore_errors=True)
+
+    def evict(self, max_sessions: int, idle_seconds: float) -> int:
+        """ Forgets the sessions idle for longer than idle_seconds, and the least recently used ones beyond max_sessions
+        (never a session with a turn in progress). Returns the number of sessions forgotten. """
+        now = time.monotonic()
+        evicted = 0
+        for session_id, used in list(self.last_used.items()): # oldest first
+            if len(self.last_used) <= max_sessions and now - used <= idle_seconds:
+                break # every later session was used more recently
+            if session_id not in self.busy:
+                self.forget(session_id)
+                evicted += 1
+        return evicted
+
+
+def _import_script(name: str, path: str):
+    """ Imports a script by path (the folder names contain spaces, so they are not importable packages). """
+    spec = importlib.util.spec_from_file_location(f"served_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+async def _run_turn(agent: LoadedAgent, session_id: str, message: str, on_token=None) -> str:
+    """ Streams one turn through the graph and returns the answer: the last non-empty message written by one of the
+    answer nodes. on_token(node, text) is awaited for every token, for the streaming endpoint. """
+    config = trace_config(f"server_{agent.name}", {"configurable": {"thread_id": session_id}}) # TRACING=1: per-node trace
+    texts = {} # message id -> text so far, in the order the messages appeared
+    async for chunk, metadata in agent.app.astream({"messages": [HumanMessage(content=message)]}, config=config, stream_mode="messages"):
+        node = metadata.get("langgraph_node")
+        if node not in agent.answer_nodes or not isinstance(chunk, AIMessage) or not isinstance(chunk.content, str):
+            continue
+        if isinstance(chunk, AIMessageChunk):
+            texts[chunk.id] = texts.get(chunk.id, "") + chunk.content
+            if on_token is not None and chunk.content:
+                await on_token(node, chunk.content)
+        elif chunk.id not in texts: # a whole message which was not streamed token by token (e.g. a cached response)
+            texts[chunk.id] = chunk.content
+            if on_token is not None and chunk.content:
+                await on_token(node, chunk.content)
+    return next((text for text in reversed(list(texts.values())) if text.strip()), "")
+
+
+def create_app(agent_names: list = None, max_concurrent: int = 8, max_queue: int = 32, turn_timeout: float = 120.0,
+               max_sessions: int = 1000, session_ttl: float = 3600.0) -> FastAPI:
+    agent_names = agent_names or list(AGENTS)
+    unknown = [n for n in agent_names if n not in AGENTS]
+    if unknown:
+        raise ValueError(f"Unknown agents {unknown}, expected some of {list(AGENTS)}")
+    agents = {}
+    admission = AdmissionControl(max_concurrent, max_queue)
+    session_counts = {"evicted": 0}
+
+    def evict_sessions():
+        for agent in agents.values():
+            session_counts["evicted"] += agent.evict(max_sessions, session_ttl)
+
+    async def sweep_sessions(): # idle sessions are dropped even when no new requests come in
+        while True:
+            await asyncio.sleep(min(60.0, session_ttl))
+            evict_sessions()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # the nodes call the (sync) LLM clients, so they run on the event loop's default thread pool: it is sized
+        # to the number of concurrent turns (plus the threads a turn's tool calls may need)
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_concurrent * 4))
+        for name in agent_names:
+            agents[name] = LoadedAgent(name, *AGENTS[name])
+            warm_up = getattr(agents[name].module, "warm_up", None)
+            if warm_up is not None: # RAG: the index is opened in the background, its tool waits for it
+                threading.Thread(target=warm_up, daemon=True).start()
+        print(f"Serving agents: {', '.join(agents)} (max {max_concurrent} concurrent turns, {max_queue} waiting)")
+        sweeper = asyncio.create_task(sweep_sessions())
+        yield
+        sweeper.cancel()
+
+    app = FastAPI(title="LangGraph agents", lifespan=lifespan)
+
+    def get_agent(name: str) -> LoadedAgent:
+        if name not in agents:
+            raise HTTPException(404, f"Unknown agent {name!r}, available: {list(agents)}")
+        return agents[name]
+
+    def claim_session(agent: LoadedAgent, session_id: str):
+        if session_id in agent.busy:
+            raise HTTPException(409, "This session already has a turn in progress.")
+        agent.busy.add(session_id)
+        agent.touch(session_id)
+        evict_sessions() # cheap: stops at the first session which is neither idle nor beyond the cap
+
+    def overloaded() -> HTTPException:
+        return HTTPException(503, "Too many requests in progress, retry shortly.", headers={"Retry-After": "1"})
+
+    async def guarded_turn(agent: LoadedAgent, session_id: str, message: str, on_token=None) -> str:
+        """ Runs a turn in the session's context, with the timeout; updates the counters. """
+        context = agent.context(session_id)
+        task = asyncio.get_running_loop().create_task(_run_turn(agent, session_id, message, on_token), context=context)
+        try:
+            answer = await asyncio.wait_for(task, turn_timeout)
+        except asyncio.TimeoutError:
+            admission.counts["timed_out"] += 1
+            raise
+        except Exception:
+            admission.counts["failed"] += 1
+            raise
+        admission.counts["completed"] += 1
+        return answer
+
+    def reply(agent: LoadedAgent, session_id: str, answer: str, start: float) -> dict:
+        result = {"session_id": session_id, "answer": answer, "seconds": round(time.perf_counter() - start, 3)}
+        if session_id in agent.documents:
+            result["document"] = agent.documents[session_id]["content"]
+        return result
+
+    @app.post("/agents/{name}/chat")
+    async def chat(name: str, request: ChatRequest):
+        agent = get_agent(name)
+        session_id = request.session_id or uuid.uuid4().hex
+        claim_session(agent, session_id)
+        start = time.perf_counter()
+        try:
+            async with admission.slot():
+                answer = await guarded_turn(agent, session_id, request.message)
+        except Overloaded:
+            raise overloaded()
+        except asyncio.TimeoutError:
+            raise HTTPException(504, f"The turn took longer than {turn_timeout}s.")
+        finally:
+            agent.busy.discard(session_id)
+        return reply(agent, session_id, answer, start)
+
+    @app.post("/agents/{name}/stream")
+    async def stream(name: str, request: ChatRequest):
+        agent = get_agent(name)
+        session_id = request.session_id or uuid.uuid4().hex
+        if admission.semaphore.locked() and admission.waiting >= admission.max_queue: # refuse before the response starts
+            admission.counts["rejected"] += 1
+            raise overloaded()
+        claim_session(agent, session_id)
+
+        async def events():
+            queue = asyncio.Queue()
+
+            async def on_token(node, text):
+                await queue.put(("token", {"node": node, "text": text}))
+
+            async def run():
+                start = time.perf_counter()
+                try:
+                    async with admission.slot():
+                        answer = await guarded_turn(agent, session_id, request.message, on_token)
+                    await queue.put(("done", reply(agent, session_id, answer, start)))
+                except Overloaded:
+                    await queue.put(("error", {"status": 503, "detail": "Too many requests in progress, retry shortly."}))
+                except asyncio.TimeoutError:
+                    await queue.put(("error", {"status": 504, "detail": f"The turn took longer than {turn_timeout}s."}))
+                except Exception as e:
+                    await queue.put(("error", {"status": 500, "detail": str(e)}))
+                finally:
+                    agent.busy.discard(session_id)
+
+            task = asyncio.create_task(run())
+            try:
+                while True:
+                    event, data = await queue.get()
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                    if event in ("done", "error"):
+                        break
+            finally:
+                if not task.done(): # the client went away: the turn is cancelled and its slot freed
+                    task.cancel()
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.delete("/agents/{name}/sessions/{session_id}")
+    async def delete_session(name: str, session_id: str):
+        get_agent(name).forget(session_id)
+        return {"deleted": session_id}
+
+    @app.get("/health")
+    async def health():
+        return {"agents": list(agents), "sessions": {name: len(agent.last_used) for name, agent in agents.items()},
+                "max_sessions": max_sessions, "session_ttl": session_ttl, "sessions_evicted": session_counts["evicted"],
+                "running": admission.running, "waiting": admission.waiting,
+                "max_concurrent": admission.max_concurrent, "max_queue": admission.max_queue, **admission.counts}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the LangGraph agents over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--agents", default=os.getenv("SERVER_AGENTS", ",".join(AGENTS)), help="comma-separated, from: " + ", ".join(AGENTS))
+    parser.add_argument("--max-concurrent", type=int, default=int(os.getenv("SERVER_MAX_CONCURRENT", "8")))
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("SERVER_MAX_QUEUE", "32")))
+    parser.add_argument("--turn-timeout", type=float, default=float(os.getenv("SERVER_TURN_TIMEOUT", "120")))
+    parser.add_argument("--max-sessions", type=int, default=int(os.getenv("SERVER_MAX_SESSIONS", "1000")), help="per agent")
+    parser.add_argument("--session-ttl", type=float, default=float(os.getenv("SERVER_SESSION_TTL", "3600")), help="idle seconds")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.agents.split(","), args.max_concurrent, args.max_queue, args.turn_timeout,
+                           args.max_sessions, args.session_ttl), host=args.host, port=args.port)
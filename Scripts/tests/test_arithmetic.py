@@ -0,0 +1,36 @@
+# Tests of the ReAct agent's local arithmetic fast path (agent_utils/arithmetic.py).
+# Run from the Scripts folder:   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # so that Scripts/agent_utils can be imported
+from agent_utils.arithmetic import ArithmeticFastPath
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("what is (3+4)*2^5?", "(3 + 4) * 2 ^ 5 = 224"),
+    ("What is 12 plus 30?", "12 + 30 = 42"),
+    ("2^-1", "2 ^ (-1) = 0.5"),
+])
+def test_arithmetic_is_answered_locally(question, answer):
+    assert ArithmeticFastPath().answer(question) == answer
+
+
+@pytest.mark.parametrize("question", [
+    "what is (10^400)^(10^400)?", # the exponent does not fit in a float
+    "what is 10^999 * 10^999 * 10^999 * 10^999 * 10^999?", # no single power is too big, the product is
+    "what is 10^(-(10^400))?",
+    "what is 9^9^9",
+    "what is 0^-1",
+    "what is (-8)^0.5",
+    "what is 10/2",
+    "what is 5?",
+    "what is the capital of France?",
+])
+def test_other_questions_fall_through_to_the_llm(question):
+    fast_path = ArithmeticFastPath()
+    assert fast_path.answer(question) is None
+    assert fast_path.stats()["answered_locally"] == 0
@@ -0,0 +1,90 @@
+# Tests of the keyword index and the rank fusion of the hybrid search (agent_utils/bm25.py).
+# Run from the Scripts folder:   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # so that Scripts/agent_utils can be imported
+from agent_utils.bm25 import BM25Index, fuse_rankings, tokenize
+
+REVIEWS = {
+    "1": "The gluten-free crust was crispy and the staff knew about celiac disease.",
+    "2": "Vegan pizza with cashew cheese, surprisingly good.",
+    "3": "Slow service, cold pizza, the crust was soggy.",
+    "4": "Great wine list and a friendly sommelier.",
+}
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(list(REVIEWS), list(REVIEWS.values()), [{"rating": int(i)} for i in REVIEWS])
+    return index
+
+
+def test_tokenize_lowercases_and_splits_on_punctuation():
+    assert tokenize("Gluten-free CRUST!") == ["gluten", "free", "crust"]
+
+
+@pytest.mark.parametrize("query, best", [
+    ("gluten free crust for celiac", "1"),
+    ("cashew cheese", "2"),
+    ("soggy crust", "3"),
+    ("wine", "4"),
+])
+def test_search_ranks_the_matching_review_first(index, query, best):
+    assert index.search(query, k=2)[0][0] == best
+
+
+def test_search_without_matching_terms_is_empty(index):
+    assert index.search("sushi") == []
+    assert BM25Index().search("pizza") == []
+
+
+def test_search_among_allowed_ids(index):
+    assert [doc_id for doc_id, _ in index.search("pizza crust", allowed_ids={"2", "4"})] == ["2"]
+
+
+def test_remove_drops_the_document_and_its_postings(index):
+    index.remove(["2", "missing"])
+    assert len(index) == 3
+    assert "cashew" not in index.postings
+    assert index.search("cashew cheese") == []
+    assert index.total_length == sum(index.lengths.values())
+
+
+def test_add_replaces_an_existing_document(index):
+    index.add(["3"], ["Fast service and a hot pizza."])
+    assert len(index) == 4
+    assert index.search("soggy") == []
+    assert index.search("hot")[0][0] == "3"
+    assert index.total_length == sum(index.lengths.values())
+
+
+def test_document_returns_the_text_metadata_and_id(index):
+    doc = index.document("4")
+    assert (doc.id, doc.page_content, doc.metadata) == ("4", REVIEWS["4"], {"rating": 4})
+
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    index.save(path)
+    assert not index.dirty
+    loaded = BM25Index.load_or_build(path, vector_store=None) # the saved file is used, the store is not touched
+    assert loaded.search("cashew cheese") == index.search("cashew cheese")
+
+
+def test_fuse_rankings_prefers_documents_found_by_both(index):
+    dense = [Document(page_content=REVIEWS[i], id=i) for i in ("4", "1", "2")]
+    keyword = [("1", 3.0), ("3", 2.0)]
+    fused = fuse_rankings(dense, keyword, index, k=4)
+    assert [d.id for d in fused] == ["1", "4", "3", "2"] # "1" is in both; "3" comes from the keyword index only
+    assert fused[2].page_content == REVIEWS["3"]
+
+
+def test_fuse_rankings_matches_documents_without_an_id_by_content(index):
+    dense = [Document(page_content="no id"), Document(page_content="no id")]
+    assert [d.page_content for d in fuse_rankings(dense, [], index, k=5)] == ["no id"]
@@ -0,0 +1,138 @@
+# Tests of the LRU + time-to-live eviction of the retrieval cache (agent_utils/retrieval_cache.py) and of the
+# persistent LLM response cache (agent_utils/llm_cache.py). The clocks are replaced, so nothing sleeps.
+# Run from the Scripts folder:   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.outputs import Generation
+from langchain_core.retrievers import BaseRetriever
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # so that Scripts/agent_utils can be imported
+from agent_utils import llm_cache, retrieval_cache
+from agent_utils.hashing import HashingEmbeddings
+from agent_utils.llm_cache import SQLiteLLMCache
+from agent_utils.retrieval_cache import CachedRetriever
+
+
+class CountingRetriever(BaseRetriever):
+    """ Returns one document naming the query, and counts the searches. """
+
+    calls: list = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list[Document]:
+        self.calls.append(query)
+        return [Document(page_content=f"result for {query}")]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(retrieval_cache.time, "time", lambda: now[0]) # the same time module as llm_cache's
+    return now
+
+
+def cached_retriever(**kwargs) -> CachedRetriever:
+    return CachedRetriever(retriever=CountingRetriever(calls=[]), embeddings=HashingEmbeddings(dim=64), **kwargs)
+
+
+def test_repeated_and_reworded_queries_hit_the_cache(clock):
+    cache = cached_retriever()
+    cache.invoke("gluten free crust")
+    cache.invoke("  Gluten FREE crust ") # same normalized text: exact hit
+    assert cache.retriever.calls == ["gluten free crust"]
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = cached_retriever(ttl_seconds=60)
+    cache.invoke("vegan pizza")
+    clock[0] += 59
+    cache.invoke("vegan pizza")
+    clock[0] += 61 # past the TTL of the entry stored 120 s ago; a hit does not renew it
+    cache.invoke("vegan pizza")
+    assert cache.retriever.calls == ["vegan pizza", "vegan pizza"]
+
+
+def test_the_least_recently_used_query_is_evicted(clock):
+    cache = cached_retriever(max_entries=2, similarity_threshold=1.01) # exact tier only
+    for query in ("wine list", "cold pizza", "wine list", "slow service"): # "cold pizza" is the least recently used
+        cache.invoke(query)
+    assert [key[1] for key in cache._exact] == ["wine list", "slow service"]
+    cache.invoke("cold pizza")
+    assert cache.retriever.calls == ["wine list", "cold pizza", "slow service", "cold pizza"]
+
+
+def test_partitions_never_share_results(clock):
+    cache = cached_retriever(similarity_threshold=-1.0, # any query of the same partition is a semantic hit
+                             partition_fn=lambda query: "5-star" if "5-star" in query else "")
+    cache.invoke("crust")
+    cache.invoke("pizza")
+    cache.invoke("5-star crust")
+    assert cache.retriever.calls == ["crust", "5-star crust"]
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_a_new_collection_version_clears_the_cache(clock):
+    version = [1]
+    cache = cached_retriever(version_fn=lambda: version[0])
+    cache.invoke("wine")
+    version[0] = 2
+    cache.invoke("wine")
+    assert cache.retriever.calls == ["wine", "wine"]
+    assert cache.stats()["invalidations"] == 1
+
+
+LLM_STRING = "[('model_name', 'llama-3.3-70b-versatile'), ('temperature', 0.0)]"
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"), ttl_seconds=3600, max_bytes=10 * 1024 * 1024)
+    yield cache
+    cache._conn.close()
+
+
+def test_llm_cache_round_trip(sqlite_cache):
+    assert sqlite_cache.lookup("prompt", LLM_STRING) is None
+    sqlite_cache.update("prompt", LLM_STRING, [Generation(text="answer")])
+    assert [g.text for g in sqlite_cache.lookup("prompt", LLM_STRING)] == ["answer"]
+    assert sqlite_cache.lookup("prompt", LLM_STRING.replace("0.0", "0.5")) is None # other parameters: another entry
+    assert sqlite_cache.stats()["hits"] == 1 and sqlite_cache.stats()["misses"] == 2
+
+
+def test_llm_cache_entries_expire(sqlite_cache, clock):
+    sqlite_cache.update("prompt", LLM_STRING, [Generation(text="answer")])
+    clock[0] += 3601
+    assert sqlite_cache.lookup("prompt", LLM_STRING) is None
+    assert sqlite_cache.stats()["expired"] == 1 and sqlite_cache.stats()["entries"] == 0
+
+
+def test_llm_cache_evicts_the_least_recently_used_entries(sqlite_cache, clock):
+    answer = [Generation(text="x" * 1000)]
+    sqlite_cache.update("first", LLM_STRING, answer)
+    entry_bytes = sqlite_cache._total_bytes
+    sqlite_cache.max_bytes = int(2.5 * entry_bytes) # room for two entries
+    clock[0] += 1
+    sqlite_cache.update("second", LLM_STRING, answer)
+    clock[0] += 1
+    sqlite_cache.lookup("first", LLM_STRING) # "second" is now the least recently used
+    clock[0] += 1
+    sqlite_cache.update("third", LLM_STRING, answer)
+    assert sqlite_cache.lookup("second", LLM_STRING) is None
+    assert sqlite_cache.lookup("first", LLM_STRING) is not None and sqlite_cache.lookup("third", LLM_STRING) is not None
+    assert sqlite_cache.stats()["evictions"] == 1
+
+
+def test_llm_cache_size_is_kept_across_restarts(sqlite_cache):
+    sqlite_cache.update("prompt", LLM_STRING, [Generation(text="answer")])
+    reopened = SQLiteLLMCache(sqlite_cache.path)
+    assert reopened._total_bytes == sqlite_cache._total_bytes > 0
+    reopened._conn.close()
+
+
+def test_llm_cache_stores_the_model_name():
+    assert llm_cache._model_name(LLM_STRING) == "llama-3.3-70b-versatile"
+    assert llm_cache._model_name("[('temperature', 0.0)]") == "unknown"
@@ -0,0 +1,106 @@
+# Tests of the incremental ingestion (agent_utils/ingestion.py) against an in-memory Chroma collection.
+# The hashing embeddings stand in for the real model, so no model is downloaded and nothing goes over the network.
+# Run from the Scripts folder:   python -m pytest tests
+
+import os
+import sys
+import uuid
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # so that Scripts/agent_utils can be imported
+from agent_utils.bm25 import BM25Index
+from agent_utils.hashing import HashingEmbeddings
+from agent_utils.ingestion import IngestionManifest, chunk_id, remove_untracked, save_progress, sync_pages
+
+PARAMS = {"chunk_size": 60, "chunk_overlap": 0, "embedding_model": "hashing"}
+PAGES = [
+    "Volatility is the standard deviation of returns. It is usually annualised with the square root of time.",
+    "The Sharpe ratio divides the excess return by the volatility of the portfolio.",
+    "Mean reversion strategies bet that prices return to an average after moving away from it.",
+]
+
+
+@pytest.fixture
+def store():
+    # a fresh collection per test: the in-memory client is shared by the whole process
+    store = Chroma(collection_name=f"test_{uuid.uuid4().hex}", embedding_function=HashingEmbeddings(dim=64))
+    yield store
+    store.delete_collection()
+
+
+def sync(store, manifest, pages, keyword_index=None, params=PARAMS):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=params["chunk_size"], chunk_overlap=params["chunk_overlap"])
+    documents = [Document(page_content=text, metadata={"page": i}) for i, text in enumerate(pages)]
+    return sync_pages(store, manifest, "session.pdf", "digest", documents, splitter, params,
+                      keyword_index=keyword_index, window_pages=2, progress_every=0)
+
+
+def stored_ids(store) -> set:
+    return set(store.get(include=[])["ids"])
+
+
+def test_a_second_sync_of_the_same_pages_writes_nothing(store, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    first = sync(store, manifest, PAGES)
+    assert first["pages_upserted"] == 3 and first["chunks_upserted"] > 3
+    assert stored_ids(store) == manifest.tracked_ids()
+
+    second = sync(store, manifest, PAGES)
+    assert (second["pages_skipped"], second["pages_upserted"], second["chunks_upserted"], second["chunks_deleted"]) == (3, 0, 0, 0)
+    assert len(stored_ids(store)) == first["chunks_upserted"]
+
+
+def test_only_changed_pages_are_rewritten_and_stale_chunks_deleted(store, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    keyword_index = BM25Index()
+    sync(store, manifest, PAGES, keyword_index)
+
+    stats = sync(store, manifest, [PAGES[0], "Sharpe ratio: excess return over volatility."], keyword_index)
+    assert (stats["pages_skipped"], stats["pages_upserted"], stats["pages_deleted"]) == (1, 1, 1)
+    assert stored_ids(store) == manifest.tracked_ids() == set(keyword_index.docs)
+    assert chunk_id("session.pdf", 1, 0) in stored_ids(store)
+    assert not any(i.startswith("session.pdf:p2:") for i in stored_ids(store))
+    assert keyword_index.search("mean reversion") == []
+
+
+def test_changed_parameters_redo_every_page(store, tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    sync(store, manifest, PAGES)
+    stats = sync(store, manifest, PAGES, params={**PARAMS, "chunk_size": 200})
+    assert (stats["pages_skipped"], stats["pages_upserted"]) == (0, 3)
+    assert stored_ids(store) == manifest.tracked_ids() # the longer chunks replace the short ones, none are left behind
+
+
+def test_the_manifest_survives_a_restart(store, tmp_path):
+    path = str(tmp_path / "manifest.json")
+    keyword_path = str(tmp_path / "bm25.pkl")
+    manifest, keyword_index = IngestionManifest(path), BM25Index()
+    assert manifest.is_new
+    sync(store, manifest, PAGES, keyword_index)
+    save_progress(manifest, keyword_index, keyword_path)
+    assert os.path.exists(keyword_path) and not keyword_index.dirty
+
+    reopened = IngestionManifest(path)
+    assert not reopened.is_new and reopened.generation == 1
+    assert reopened.is_fresh("session.pdf", "digest", PARAMS)
+    assert not reopened.is_fresh("session.pdf", "other digest", PARAMS)
+    assert sync(store, reopened, PAGES)["pages_skipped"] == 3
+
+
+def test_an_unreadable_manifest_starts_from_scratch(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json")
+    manifest = IngestionManifest(str(path))
+    assert manifest.is_new and manifest.files == {}
+
+
+def test_remove_untracked_deletes_chunks_from_before_the_manifest(store, tmp_path):
+    store.add_texts(["an old copy with a random ID"], ids=["legacy-1"])
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    sync(store, manifest, PAGES)
+    assert remove_untracked(store, manifest) == 1
+    assert stored_ids(store) == manifest.tracked_ids()
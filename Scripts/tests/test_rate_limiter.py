@@ -0,0 +1,86 @@
+# Tests of the Groq rate limiter (agent_utils/llm_client.py): the token buckets and the rate-limit headers.
+# The clock is replaced, so nothing sleeps and no request is sent.
+# Run from the Scripts folder:   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # so that Scripts/agent_utils can be imported
+from agent_utils import llm_client
+from agent_utils.llm_client import TokenBucketLimiter, parse_duration
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("2m59.56s", 179.56),
+    ("7.66s", 7.66),
+    ("450ms", 0.45),
+    ("1h2m", 3720.0),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_unreadable_durations_are_none(value):
+    assert parse_duration(value) is None
+
+
+def test_requests_only_wait_once_the_bucket_is_empty(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=2, tokens_per_minute=1_000_000)
+    assert limiter.reserve(10) == 0
+    assert limiter.reserve(10) == 0
+    assert limiter.reserve(10) == pytest.approx(30) # one request short, refilled at 2 per minute
+    clock[0] += 60
+    assert limiter.reserve(10) == pytest.approx(0)
+    assert limiter.summary()["waits"] == 1
+
+
+def test_tokens_are_refilled_continuously(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    assert limiter.reserve(600) == 0
+    assert limiter.reserve(300) == pytest.approx(30) # 300 tokens short, refilled at 10 per second
+    clock[0] += 30
+    assert limiter.reserve(0) == pytest.approx(0)
+
+
+def test_a_request_bigger_than_the_bucket_does_not_wait_forever(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=100)
+    assert limiter.reserve(10_000) == 0
+
+
+def test_remaining_tokens_lower_the_token_bucket(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter.sync_with_headers({"x-ratelimit-remaining-tokens": "0"}) # another client used this minute's tokens
+    assert limiter.reserve(60) == pytest.approx(6)
+
+
+def test_remaining_requests_are_a_daily_budget_not_a_per_minute_one(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=30, tokens_per_minute=1_000_000)
+    limiter.sync_with_headers({"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "2h"})
+    assert [limiter.reserve(10) for _ in range(5)] == [0] * 5 # a low daily remainder does not empty the minute's bucket
+    assert limiter.summary()["daily_requests_left"] == 0
+
+
+def test_an_exhausted_daily_budget_waits_for_its_reset(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=30, tokens_per_minute=1_000_000)
+    limiter.sync_with_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2m30s"})
+    assert limiter.reserve(10) == pytest.approx(150)
+    clock[0] += 150
+    assert limiter.reserve(10) == 0 # the reset time has passed
+
+
+def test_missing_or_unreadable_headers_change_nothing(clock):
+    limiter = TokenBucketLimiter(requests_per_minute=30, tokens_per_minute=600)
+    limiter.sync_with_headers({"x-ratelimit-remaining-tokens": "n/a"})
+    limiter.sync_with_headers({})
+    assert limiter.reserve(600) == 0
+    assert "daily_requests_left" not in limiter.summary()